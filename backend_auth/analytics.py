@@ -7,18 +7,54 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from datetime import datetime, timedelta
-from flask import request
+from datetime import timedelta
+from flask import Response, request
+import base64
 import hashlib
 import json
 
-# Try to import requests for IP geolocation
+from geoip import get_geoip_database
+from analytics_ingest import LocationBackfill, WriteBehindBuffer, VisitorCoalescer
+from analytics_live import LiveFeed
+from analytics_rollups import ROLLUP_COLLECTION, RollupWriter, read_rollup_stats, stats_windows
+from location_resolver import ASYNC_LOCATION, PENDING_LOCATION, LocationResolver, is_pending
+from swr_cache import SWRCache
+from timestamps import parse_timestamp, to_iso, utc_now
+from user_agents import cache_stats as user_agent_cache_stats, parse_user_agent
+
+# Dashboard stats are served from a short-TTL cache, refreshed in the background
+STATS_TTL_SECONDS = float(os.getenv('ANALYTICS_STATS_TTL_SECONDS', 30))
+STATS_MAX_STALE_SECONDS = float(os.getenv('ANALYTICS_STATS_MAX_STALE_SECONDS', 300))
+RECENT_VIEWS_LIMIT = 10
+
+# /visitors: page size, returnable fields and the cap on array fields
+VISITORS_MAX_LIMIT = 200
+VISITOR_FIELDS = (
+    'visitor_id', 'ip', 'location', 'device', 'browser', 'os',
+    'first_visit', 'last_visit', 'visit_count', 'pages_visited'
+)
+VISITOR_ARRAY_FIELDS = ('pages_visited',)
+VISITORS_ARRAY_LIMIT = 20
+VISITORS_MAX_ARRAY_LIMIT = 200
+
+# /track/batch: events per request, and how far back a client event timestamp is trusted
+TRACK_BATCH_MAX_EVENTS = int(os.getenv('ANALYTICS_TRACK_BATCH_MAX_EVENTS', 50))
+TRACK_BATCH_MAX_AGE_SECONDS = float(os.getenv('ANALYTICS_TRACK_BATCH_MAX_AGE_SECONDS', 600))
+
+# Try to import requests for IP geolocation (fallback when no local GeoIP database exists)
 try:
     import requests as http_requests
     HAS_REQUESTS = True
 except ImportError:
     HAS_REQUESTS = False
 
+UNKNOWN_LOCATION = {
+    'city': 'Unknown',
+    'region': 'Unknown',
+    'country': 'Unknown',
+    'country_code': 'UN'
+}
+
 def get_client_ip():
     """Get the real client IP address"""
     # Check for forwarded headers (behind proxy/load balancer)
@@ -29,9 +65,13 @@ def get_client_ip():
     else:
         return request.remote_addr
 
-def get_location_from_ip(ip_address):
-    """Get location info from IP address using free API"""
-    if not HAS_REQUESTS or ip_address in ['127.0.0.1', 'localhost', '::1']:
+def lookup_location(ip_address):
+    """
+    Get location info from IP address, or None when it can't be resolved.
+    Uses the local memory-mapped GeoIP database (geoip.py) when it exists,
+    otherwise falls back to the free ip-api.com service.
+    """
+    if ip_address in ['127.0.0.1', 'localhost', '::1']:
         return {
             'city': 'Local',
             'region': 'Local',
@@ -39,6 +79,13 @@ def get_location_from_ip(ip_address):
             'country_code': 'LC'
         }
     
+    geoip_db = get_geoip_database()
+    if geoip_db is not None:
+        return geoip_db.lookup(ip_address)
+    
+    if not HAS_REQUESTS:
+        return None
+    
     try:
         # Using ip-api.com (free, no API key needed)
         response = http_requests.get(
@@ -57,65 +104,143 @@ def get_location_from_ip(ip_address):
     except Exception as e:
         print(f"Geolocation error: {e}")
     
-    return {
-        'city': 'Unknown',
-        'region': 'Unknown',
-        'country': 'Unknown',
-        'country_code': 'UN'
-    }
+    return None
 
-def parse_user_agent(user_agent_string):
-    """Parse user agent string to get device and browser info"""
-    ua = user_agent_string.lower() if user_agent_string else ''
-    
-    # Detect device type
-    if 'mobile' in ua or 'android' in ua or 'iphone' in ua:
-        device = 'Mobile'
-    elif 'tablet' in ua or 'ipad' in ua:
-        device = 'Tablet'
-    else:
-        device = 'Desktop'
-    
-    # Detect browser
-    if 'edg' in ua:
-        browser = 'Edge'
-    elif 'chrome' in ua and 'chromium' not in ua:
-        browser = 'Chrome'
-    elif 'firefox' in ua:
-        browser = 'Firefox'
-    elif 'safari' in ua and 'chrome' not in ua:
-        browser = 'Safari'
-    elif 'opera' in ua or 'opr' in ua:
-        browser = 'Opera'
-    else:
-        browser = 'Other'
-    
-    # Detect OS
-    if 'windows' in ua:
-        os_name = 'Windows'
-    elif 'mac' in ua:
-        os_name = 'macOS'
-    elif 'linux' in ua:
-        os_name = 'Linux'
-    elif 'android' in ua:
-        os_name = 'Android'
-    elif 'iphone' in ua or 'ipad' in ua:
-        os_name = 'iOS'
-    else:
-        os_name = 'Other'
-    
-    return {
-        'device': device,
-        'browser': browser,
-        'os': os_name,
-        'raw': user_agent_string[:200] if user_agent_string else ''
-    }
+def get_location_from_ip(ip_address):
+    """Get location info from IP address (UNKNOWN_LOCATION when unresolved)"""
+    return lookup_location(ip_address) or dict(UNKNOWN_LOCATION)
 
 def generate_visitor_id(ip, user_agent):
     """Generate a unique but anonymous visitor ID"""
     data = f"{ip}:{user_agent}"
     return hashlib.sha256(data.encode()).hexdigest()[:16]
 
+def parse_event_batch(body):
+    """
+    Events of a /track/batch body: a JSON array, or {"events": [...]}.
+    Bodies sent with navigator.sendBeacon() arrive as text/plain, so the
+    content type is not checked. Raises ValueError for anything else.
+    """
+    try:
+        data = json.loads(body or 'null')
+    except ValueError:
+        raise ValueError('Body must be JSON')
+    if isinstance(data, dict):
+        data = data.get('events')
+    if not isinstance(data, list) or not data:
+        raise ValueError('events must be a non-empty list')
+    if len(data) > TRACK_BATCH_MAX_EVENTS:
+        raise ValueError(f'At most {TRACK_BATCH_MAX_EVENTS} events per batch')
+    invalid = [i for i, event in enumerate(data) if not isinstance(event, dict)]
+    if invalid:
+        raise ValueError(f'Events must be objects (positions {invalid[:10]})')
+    return data
+
+def event_timestamp(value, now):
+    """Client timestamp of a batched event, if recent and not in the future; otherwise now"""
+    timestamp = parse_timestamp(value, assume_utc=True) if value else None
+    if timestamp is None or timestamp > now or (now - timestamp).total_seconds() > TRACK_BATCH_MAX_AGE_SECONDS:
+        return now
+    return timestamp
+
+def encode_visitor_cursor(visitor):
+    """Opaque cursor pointing after a visitor in (last_visit, visitor_id) descending order"""
+    raw = json.dumps([to_iso(visitor['last_visit']), visitor['visitor_id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_visitor_cursor(cursor):
+    """(last_visit, visitor_id) of a cursor; raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        last_visit, visitor_id = json.loads(raw)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    last_visit = parse_timestamp(last_visit)
+    if last_visit is None or not isinstance(visitor_id, str):
+        raise ValueError('Invalid cursor')
+    return last_visit, visitor_id
+
+def visitor_projection(fields, array_limit):
+    """
+    find() projection for a comma-separated field list (all VISITOR_FIELDS
+    when empty); array fields keep only their array_limit most recent items.
+    The sort keys are always included, so the next cursor can be built.
+    Raises ValueError for unknown fields.
+    """
+    wanted = [f.strip() for f in (fields or '').split(',') if f.strip()] or list(VISITOR_FIELDS)
+    unknown = [f for f in wanted if f not in VISITOR_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    projection = {'_id': 0, 'last_visit': 1, 'visitor_id': 1}
+    for field in wanted:
+        # Items are appended as pages are visited: keep the latest
+        projection[field] = {'$slice': -array_limit} if field in VISITOR_ARRAY_FIELDS else 1
+    return projection
+
+def _facet_count(rows):
+    """Value of a {'$count': 'n'} facet (empty when nothing matched)"""
+    return rows[0]['n'] if rows else 0
+
+def compute_raw_stats(visitors_collection, page_views_collection, now=None, recent_limit=0):
+    """
+    Dashboard counts straight from the raw collections (used before rollups exist).
+    One $facet aggregation per collection, so two round trips in total.
+    """
+    now = now or utc_now()
+    windows = stats_windows(now)
+    today_start = windows['today']
+    week_start = windows['week']
+    month_start = windows['month']
+    
+    # Visitor counts and breakdowns
+    visitor_facets = next(visitors_collection.aggregate([{'$facet': {
+        'total': [{'$count': 'n'}],
+        'today': [{'$match': {'last_visit': {'$gte': today_start}}}, {'$count': 'n'}],
+        'week': [{'$match': {'last_visit': {'$gte': week_start}}}, {'$count': 'n'}],
+        'month': [{'$match': {'last_visit': {'$gte': month_start}}}, {'$count': 'n'}],
+        'devices': [{'$group': {'_id': '$device', 'count': {'$sum': 1}}}],
+        'browsers': [{'$group': {'_id': '$browser', 'count': {'$sum': 1}}}],
+        'countries': [
+            {'$group': {'_id': '$location.country', 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1}},
+            {'$limit': 10}
+        ]
+    }}]))
+    
+    # Page view counts (and the most recent views, without IPs)
+    view_facets = {
+        'total': [{'$count': 'n'}],
+        'today': [{'$match': {'timestamp': {'$gte': today_start}}}, {'$count': 'n'}],
+        'week': [{'$match': {'timestamp': {'$gte': week_start}}}, {'$count': 'n'}]
+    }
+    if recent_limit:
+        view_facets['recent'] = [
+            {'$sort': {'timestamp': -1}},
+            {'$limit': recent_limit},
+            {'$project': {'_id': 0, 'ip': 0}}
+        ]
+    view_results = next(page_views_collection.aggregate([{'$facet': view_facets}]))
+    
+    stats = {
+        'visitors': {
+            'total': _facet_count(visitor_facets['total']),
+            'today': _facet_count(visitor_facets['today']),
+            'this_week': _facet_count(visitor_facets['week']),
+            'this_month': _facet_count(visitor_facets['month'])
+        },
+        'page_views': {
+            'total': _facet_count(view_results['total']),
+            'today': _facet_count(view_results['today']),
+            'this_week': _facet_count(view_results['week'])
+        },
+        'devices': {item['_id']: item['count'] for item in visitor_facets['devices']},
+        'browsers': {item['_id']: item['count'] for item in visitor_facets['browsers']},
+        'countries': {item['_id']: item['count'] for item in visitor_facets['countries']}
+    }
+    if recent_limit:
+        stats['recent_views'] = view_results['recent']
+    return stats
+
 def register_analytics_routes(app, db):
     """Register all analytics-related routes"""
     from auth import token_required
@@ -123,24 +248,98 @@ def register_analytics_routes(app, db):
     visitors_collection = db.visitors
     page_views_collection = db.page_views
     
-    @app.route('/api/analytics/track', methods=['POST'])
-    def track_visit():
-        """Track a page visit (called from frontend)"""
-        try:
-            data = request.get_json() or {}
-            
-            ip = get_client_ip()
-            user_agent = request.headers.get('User-Agent', '')
-            visitor_id = generate_visitor_id(ip, user_agent)
-            
-            # Parse user agent
-            ua_info = parse_user_agent(user_agent)
-            
-            # Get location (async would be better but keeping simple)
-            location = get_location_from_ip(ip)
-            
-            # Prepare visit data
-            visit_data = {
+    rollups_collection = db[ROLLUP_COLLECTION]
+    rollup_writer = RollupWriter(rollups_collection)
+    
+    # Locations are looked up in the background; events stored while a
+    # lookup runs get PENDING_LOCATION and are backfilled once it finishes
+    location_resolver = LocationResolver(lookup_location, UNKNOWN_LOCATION)
+    location_backfill = LocationBackfill(page_views_collection, visitors_collection, rollups=rollup_writer)
+    
+    def backfill_pending(items, add):
+        """Queue (ip, key) pairs stored with a pending location for backfill once resolved"""
+        keys_by_ip = {}
+        for ip, key in items:
+            keys_by_ip.setdefault(ip, []).append(key)
+        for ip, keys in keys_by_ip.items():
+            location_resolver.resolve(ip, lambda location, keys=keys: add(keys, location))
+    
+    def page_views_written(documents):
+        rollup_writer.record_page_views(documents)
+        backfill_pending(
+            [(doc['ip'], doc) for doc in documents if is_pending(doc.get('location'))],
+            location_backfill.add_page_views
+        )
+    
+    def visitors_written(applied):
+        backfill_pending(
+            [(state['insert']['ip'], visitor_id) for visitor_id, state in applied
+             if is_pending(state['location'])],
+            location_backfill.add_visitors
+        )
+    
+    # Page views are written in batches by a background thread
+    page_view_buffer = WriteBehindBuffer(
+        page_views_collection, name='page_views', on_written=page_views_written
+    )
+    # Visitor updates are merged per visitor and upserted once per flush window
+    visitor_updates = VisitorCoalescer(
+        visitors_collection, name='visitors', rollups=rollup_writer, on_written=visitors_written
+    )
+    
+    def compute_stats():
+        """Full dashboard stats: rollups when built, otherwise raw $facet counts"""
+        now = utc_now()
+        stats = read_rollup_stats(rollups_collection, now)
+        if stats is None:
+            return compute_raw_stats(
+                visitors_collection, page_views_collection, now, recent_limit=RECENT_VIEWS_LIMIT
+            )
+        
+        # Recent page views (last 10)
+        stats['recent_views'] = list(page_views_collection.find(
+            {},
+            {'_id': 0, 'ip': 0}  # Don't expose IP
+        ).sort('timestamp', -1).limit(RECENT_VIEWS_LIMIT))
+        return stats
+    
+    # Concurrent dashboard loads share one computation; stale results are
+    # served while a single background refresh runs
+    stats_cache = SWRCache(
+        compute_stats, STATS_TTL_SECONDS, STATS_MAX_STALE_SECONDS, name='analytics-stats'
+    )
+    
+    # Recent page views and rolling counters for the live dashboard stream
+    live_feed = LiveFeed()
+    
+    def record_visits(events, batched=False):
+        """
+        Record page views sent by the current client. IP, user agent,
+        visitor_id and location are resolved once for all events; the page
+        views are queued together and the visits fold into one visitor upsert.
+        """
+        ip = get_client_ip()
+        user_agent = request.headers.get('User-Agent', '')
+        visitor_id = generate_visitor_id(ip, user_agent)
+        
+        # Parse user agent
+        ua_info = parse_user_agent(user_agent)
+        
+        # Get location: cached, or pending until the background lookup finishes
+        if ASYNC_LOCATION:
+            location = location_resolver.cached(ip)
+            if location is None:
+                location = dict(PENDING_LOCATION)
+                location_resolver.resolve(ip)
+        else:
+            location = location_resolver.get(ip)
+        
+        # Prepare visit data (timestamps are UTC datetimes)
+        now = utc_now()
+        documents = []
+        for data in events:
+            timestamp = event_timestamp(data.get('timestamp'), now) if batched else now
+            documents.append({
                 'visitor_id': visitor_id,
                 'ip': ip,
                 'location': location,
@@ -149,73 +348,101 @@ def register_analytics_routes(app, db):
                 'os': ua_info['os'],
                 'page': data.get('page', '/'),
                 'referrer': data.get('referrer', request.headers.get('Referer', 'Direct')),
-                'timestamp': datetime.now().isoformat(),
-                'session_start': data.get('session_start', datetime.now().isoformat())
+                'timestamp': timestamp,
+                'session_start': parse_timestamp(data.get('session_start'), assume_utc=True) or timestamp
+            })
+        
+        # Record page views (queued, written in batches)
+        page_view_buffer.submit_many(documents)
+        
+        # Update or create visitor record (coalesced single upsert per flush)
+        visitor_updates.record_many(
+            visitor_id,
+            [(doc['timestamp'], doc['page']) for doc in documents],
+            location=location,
+            insert_fields={
+                'ip': ip,
+                'device': ua_info['device'],
+                'browser': ua_info['browser'],
+                'os': ua_info['os'],
+                'first_visit': min(doc['timestamp'] for doc in documents)
             }
-            
-            # Record page view
-            page_views_collection.insert_one(visit_data)
-            
-            # Update or create visitor record
-            existing_visitor = visitors_collection.find_one({'visitor_id': visitor_id})
-            
-            if existing_visitor:
-                # Update existing visitor
-                visitors_collection.update_one(
-                    {'visitor_id': visitor_id},
-                    {
-                        '$set': {
-                            'last_visit': datetime.now().isoformat(),
-                            'location': location
-                        },
-                        '$inc': {'visit_count': 1},
-                        '$addToSet': {'pages_visited': data.get('page', '/')}
-                    }
-                )
-            else:
-                # Create new visitor
-                new_visitor = {
-                    'visitor_id': visitor_id,
-                    'ip': ip,
-                    'location': location,
-                    'device': ua_info['device'],
-                    'browser': ua_info['browser'],
-                    'os': ua_info['os'],
-                    'first_visit': datetime.now().isoformat(),
-                    'last_visit': datetime.now().isoformat(),
-                    'visit_count': 1,
-                    'pages_visited': [data.get('page', '/')]
-                }
-                visitors_collection.insert_one(new_visitor)
-            
+        )
+        
+        live_feed.publish(documents)
+        return visitor_id
+    
+    @app.route('/api/analytics/track', methods=['POST'])
+    def track_visit():
+        """Track a page visit (called from frontend)"""
+        try:
+            data = request.get_json() or {}
+            visitor_id = record_visits([data])
             return {'success': True, 'visitor_id': visitor_id}
         
         except Exception as e:
             print(f"Analytics tracking error: {e}")
             return {'success': False, 'error': str(e)}, 500
     
+    @app.route('/api/analytics/track/batch', methods=['POST'])
+    def track_visit_batch():
+        """Track several page visits of one client (JSON or sendBeacon text/plain body)"""
+        try:
+            events = parse_event_batch(request.get_data(as_text=True))
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}, 400
+        
+        try:
+            visitor_id = record_visits(events, batched=True)
+            return {'success': True, 'visitor_id': visitor_id, 'count': len(events)}
+        
+        except Exception as e:
+            print(f"Analytics tracking error: {e}")
+            return {'success': False, 'error': str(e)}, 500
+    
     @app.route('/api/analytics/visitors', methods=['GET'])
     @token_required
     def get_visitors():
-        """Get visitor list (admin only)"""
+        """
+        Get visitor list (admin only), newest first, one page at a time.
+        Query params: days, limit, cursor (next_cursor of the previous page),
+        fields (comma-separated) and max_array (items kept per array field).
+        """
         try:
-            # Get query params
             days = int(request.args.get('days', 7))
-            limit = int(request.args.get('limit', 50))
+            limit = min(max(int(request.args.get('limit', 50)), 1), VISITORS_MAX_LIMIT)
+            array_limit = min(max(int(request.args.get('max_array', VISITORS_ARRAY_LIMIT)), 0),
+                              VISITORS_MAX_ARRAY_LIMIT)
+            projection = visitor_projection(request.args.get('fields'), array_limit)
             
             # Calculate date range
-            start_date = (datetime.now() - timedelta(days=days)).isoformat()
+            start_date = utc_now() - timedelta(days=days)
+            query = {'last_visit': {'$gte': start_date}}
             
-            # Get recent visitors
-            visitors = list(visitors_collection.find(
-                {'last_visit': {'$gte': start_date}},
-                {'_id': 0}  # Exclude MongoDB _id
-            ).sort('last_visit', -1).limit(limit))
+            # Keyset pagination: continue strictly after the cursor's (last_visit, visitor_id)
+            cursor = request.args.get('cursor')
+            if cursor:
+                last_visit, visitor_id = decode_visitor_cursor(cursor)
+                query = {'$and': [query, {'$or': [
+                    {'last_visit': {'$lt': last_visit}},
+                    {'last_visit': last_visit, 'visitor_id': {'$lt': visitor_id}}
+                ]}]}
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}, 400
+        
+        try:
+            # One extra document tells whether there is a next page
+            visitors = list(visitors_collection.find(query, projection).sort(
+                [('last_visit', -1), ('visitor_id', -1)]
+            ).limit(limit + 1))
+            next_cursor = encode_visitor_cursor(visitors[limit - 1]) if len(visitors) > limit else None
+            visitors = visitors[:limit]
             
             return {
                 'success': True,
                 'count': len(visitors),
-                'visitors': visitors
+                'visitors': visitors,
+                'next_cursor': next_cursor
             }
         
         except Exception as e:
@@ -226,78 +453,47 @@ def register_analytics_routes(app, db):
     def get_analytics_stats():
         """Get analytics statistics (admin only)"""
         try:
-            now = datetime.now()
-            today_start = now.replace(hour=0, minute=0, second=0).isoformat()
-            week_start = (now - timedelta(days=7)).isoformat()
-            month_start = (now - timedelta(days=30)).isoformat()
-            
-            # Count visitors
-            total_visitors = visitors_collection.count_documents({})
-            today_visitors = visitors_collection.count_documents({
-                'last_visit': {'$gte': today_start}
-            })
-            week_visitors = visitors_collection.count_documents({
-                'last_visit': {'$gte': week_start}
-            })
-            month_visitors = visitors_collection.count_documents({
-                'last_visit': {'$gte': month_start}
-            })
-            
-            # Count page views
-            total_views = page_views_collection.count_documents({})
-            today_views = page_views_collection.count_documents({
-                'timestamp': {'$gte': today_start}
-            })
-            week_views = page_views_collection.count_documents({
-                'timestamp': {'$gte': week_start}
-            })
-            
-            # Device breakdown
-            device_stats = list(visitors_collection.aggregate([
-                {'$group': {'_id': '$device', 'count': {'$sum': 1}}}
-            ]))
-            
-            # Browser breakdown  
-            browser_stats = list(visitors_collection.aggregate([
-                {'$group': {'_id': '$browser', 'count': {'$sum': 1}}}
-            ]))
-            
-            # Top countries
-            country_stats = list(visitors_collection.aggregate([
-                {'$group': {'_id': '$location.country', 'count': {'$sum': 1}}},
-                {'$sort': {'count': -1}},
-                {'$limit': 10}
-            ]))
-            
-            # Recent page views (last 10)
-            recent_views = list(page_views_collection.find(
-                {},
-                {'_id': 0, 'ip': 0}  # Don't expose IP
-            ).sort('timestamp', -1).limit(10))
+            stats, age = stats_cache.get()
             
             return {
                 'success': True,
-                'stats': {
-                    'visitors': {
-                        'total': total_visitors,
-                        'today': today_visitors,
-                        'this_week': week_visitors,
-                        'this_month': month_visitors
-                    },
-                    'page_views': {
-                        'total': total_views,
-                        'today': today_views,
-                        'this_week': week_views
-                    },
-                    'devices': {item['_id']: item['count'] for item in device_stats},
-                    'browsers': {item['_id']: item['count'] for item in browser_stats},
-                    'countries': {item['_id']: item['count'] for item in country_stats},
-                    'recent_views': recent_views
-                }
+                'stats': stats,
+                'age_seconds': round(age, 1)
             }
         
         except Exception as e:
             return {'success': False, 'error': str(e)}, 500
     
+    @app.route('/api/analytics/live', methods=['GET'])
+    @token_required
+    def live_analytics():
+        """New page views and rolling counters pushed as Server-Sent Events (admin only)"""
+        if not live_feed.acquire_client():
+            return {'success': False, 'error': 'Too many live analytics streams'}, 503
+        
+        response = Response(
+            live_feed.stream(request.headers.get('Last-Event-ID')),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        # Runs when the stream ends or the client disconnects
+        response.call_on_close(live_feed.release_client)
+        return response
+    
+    @app.route('/api/analytics/ingest/stats', methods=['GET'])
+    @token_required
+    def get_ingest_stats():
+        """Write-behind queue depth and flush latency (admin only)"""
+        return {
+            'success': True,
+            'page_views': page_view_buffer.metrics(),
+            'visitors': visitor_updates.metrics(),
+            'location_lookups': location_resolver.metrics(),
+            'location_backfill': location_backfill.metrics(),
+            'user_agent_cache': user_agent_cache_stats(),
+            'live': live_feed.metrics(),
+            'stats_cache': stats_cache.stats()
+        }
+    
     print("✅ Analytics module loaded - Visitor tracking enabled!")
     return True
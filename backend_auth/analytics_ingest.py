@@ -0,0 +1,516 @@
+"""
+Write-behind ingestion for analytics events
+Tracking writes are collected in memory and flushed by a background thread
+whenever the batch size or the flush interval is reached, instead of one
+or two round trips per hit.
+- WriteBehindBuffer: page views, written with insert_many(ordered=False)
+- VisitorCoalescer: visitor updates merged per visitor_id and written as one
+  bulk_write upsert per visitor per flush window
+- Backpressure: when a buffer is full the request thread flushes a batch
+  itself before enqueueing (events are only dropped if that flush fails)
+- Pending writes are flushed at interpreter exit (worker shutdown)
+- Written batches are passed on to the analytics rollups (analytics_rollups.py)
+- LocationBackfill: sets the location of events stored while their IP lookup
+  was still running (location_resolver.py)
+- metrics() reports queue depth and flush latency
+"""
+import atexit
+import os
+import threading
+import time
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from location_resolver import PENDING_LOCATION
+from timestamps import parse_timestamp, utc_now
+
+BATCH_SIZE = int(os.getenv('ANALYTICS_BATCH_SIZE', 200))
+FLUSH_INTERVAL_SECONDS = float(os.getenv('ANALYTICS_FLUSH_INTERVAL_SECONDS', 2))
+MAX_QUEUE = int(os.getenv('ANALYTICS_MAX_QUEUE', 10000))
+
+
+def _notify(name, callback, written):
+    """Run a post-write hook; its failure must not make the batch look unwritten"""
+    if callback is None or not written:
+        return
+    try:
+        callback(written)
+    except Exception as e:
+        print(f"Analytics {name} post-write hook error: {e}")
+
+
+class _PartialWrite(Exception):
+    """Raised by _write when it failed after writing part of its batch"""
+
+    def __init__(self, error, written, unwritten):
+        super().__init__(str(error))
+        self.error = error
+        self.written = written
+        self.unwritten = unwritten
+
+
+class _BackgroundFlusher:
+    """Shared thread, backpressure and metrics handling for the buffers below"""
+
+    def __init__(self, collection, name, batch_size, flush_interval, max_queue):
+        self.collection = collection
+        self.name = name or collection.name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._worker_pid = None
+        self._closed = False
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.backpressure_waits = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+        atexit.register(self.close)
+
+    # Implemented by subclasses; called with self._lock held unless noted
+    def _pending_count(self):
+        raise NotImplementedError
+
+    def _reset_pending(self):
+        raise NotImplementedError
+
+    def _take_batch(self):
+        raise NotImplementedError
+
+    def _write(self, batch):
+        """
+        Write a batch (no lock held); return the number of items written.
+        Raise _PartialWrite if it fails partway, so only the rest is requeued.
+        """
+        raise NotImplementedError
+
+    def _requeue(self, batch):
+        """Put a failed batch back; return how many items did not fit"""
+        raise NotImplementedError
+
+    def _submit(self, add, count=1):
+        """Run add() (adding count items) under the lock; it returns False when the buffer is full"""
+        self._ensure_worker()
+        with self._lock:
+            if add():
+                self.enqueued += count
+                if self._pending_count() >= self.batch_size:
+                    self._wakeup.notify()
+                return True
+
+        # Buffer full: the caller pays for one batch instead of growing memory
+        # (the background thread drains the rest)
+        self.backpressure_waits += 1
+        self.flush(max_batches=1)
+        with self._lock:
+            if add():
+                self.enqueued += count
+                return True
+
+        self.dropped += count
+        return False
+
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._worker_pid == pid:
+            return
+        with self._lock:
+            if self._worker_pid == pid:
+                return
+            if self._worker_pid is not None:
+                # Forked child: pending writes belong to the parent
+                self._reset_pending()
+            self._worker_pid = pid
+            thread = threading.Thread(target=self._run, name=f'write-behind-{self.name}', daemon=True)
+            thread.start()
+
+    def _run(self):
+        while not self._closed:
+            with self._lock:
+                if self._pending_count() < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+            self.flush()
+
+    def flush(self, max_batches=None):
+        """Write pending items in batches (at most max_batches); returns the number written"""
+        written = 0
+        batches = 0
+        with self._flush_lock:
+            while max_batches is None or batches < max_batches:
+                batches += 1
+                with self._lock:
+                    batch = self._take_batch()
+                if not batch:
+                    break
+
+                start = time.perf_counter()
+                try:
+                    written += self._write(batch)
+                except Exception as e:
+                    if isinstance(e, _PartialWrite):
+                        written += e.written
+                        batch, e = e.unwritten, e.error
+                    # Put the batch back (space permitting) so a transient outage loses nothing
+                    self.failed_flushes += 1
+                    with self._lock:
+                        self.dropped += self._requeue(batch)
+                    print(f"Analytics {self.name} flush error: {e}")
+                    break
+                finally:
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    self.flushes += 1
+                    self.last_flush_ms = elapsed_ms
+                    self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+                    self._total_flush_ms += elapsed_ms
+
+                if len(batch) < self.batch_size:
+                    break
+        self.written += written
+        return written
+
+    def close(self):
+        """Flush everything that is still pending (registered with atexit)"""
+        self._closed = True
+        with self._lock:
+            self._wakeup.notify_all()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Analytics {self.name} final flush error: {e}")
+
+    def metrics(self):
+        with self._lock:
+            depth = self._pending_count()
+        return {
+            'queue_depth': depth,
+            'max_queue': self.max_queue,
+            'batch_size': self.batch_size,
+            'flush_interval_seconds': self.flush_interval,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'backpressure_waits': self.backpressure_waits,
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes,
+            'last_flush_ms': round(self.last_flush_ms, 2),
+            'max_flush_ms': round(self.max_flush_ms, 2),
+            'avg_flush_ms': round(self._total_flush_ms / self.flushes, 2) if self.flushes else 0.0
+        }
+
+
+class WriteBehindBuffer(_BackgroundFlusher):
+    """Batches documents for one collection and inserts them in the background"""
+
+    def __init__(self, collection, name=None, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL_SECONDS, max_queue=MAX_QUEUE, on_written=None):
+        self._queue = []
+        self.on_written = on_written
+        super().__init__(collection, name, batch_size, flush_interval, max_queue)
+
+    def submit(self, document):
+        """Queue one document; applies backpressure when the queue is full"""
+        return self.submit_many([document])
+
+    def submit_many(self, documents):
+        """Queue documents together, so they are written in the same insert_many (batch size permitting)"""
+        def add():
+            if len(self._queue) + len(documents) > self.max_queue:
+                return False
+            self._queue.extend(documents)
+            return True
+        return self._submit(add, len(documents))
+
+    def _pending_count(self):
+        return len(self._queue)
+
+    def _reset_pending(self):
+        self._queue = []
+
+    def _take_batch(self):
+        batch = self._queue[:self.batch_size]
+        del self._queue[:self.batch_size]
+        return batch
+
+    def _requeue(self, batch):
+        room = max(self.max_queue - len(self._queue), 0)
+        self._queue[:0] = batch[:room]
+        return len(batch) - min(room, len(batch))
+
+    def _write(self, batch):
+        try:
+            self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Unordered: everything except the rejected documents was written
+            failed = {error['index'] for error in e.details.get('writeErrors', [])}
+            self.dropped += len(failed)
+            self.failed_flushes += 1
+            print(f"Analytics {self.name} bulk write error: {len(failed)} documents rejected")
+            batch = [doc for i, doc in enumerate(batch) if i not in failed]
+        _notify(self.name, self.on_written, batch)
+        return len(batch)
+
+
+class VisitorCoalescer(_BackgroundFlusher):
+    """
+    Merges visitor updates per visitor_id and flushes them as upserts:
+    $setOnInsert for first-visit fields, $inc visit_count, $max last_visit,
+    $set location and updated_at, and $addToSet pages_visited.
+    max_queue bounds the number of distinct pending visitors.
+    """
+
+    def __init__(self, collection, name=None, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL_SECONDS, max_queue=MAX_QUEUE, rollups=None, on_written=None):
+        self._pending = {}   # visitor_id -> merged state
+        self.operations = 0
+        self.rollups = rollups
+        self.on_written = on_written
+        super().__init__(collection, name, batch_size, flush_interval, max_queue)
+
+    def record(self, visitor_id, timestamp, page, location, insert_fields):
+        """
+        Record one visit. insert_fields are only written when the visitor
+        document is created (ip, device, browser, os, first_visit...).
+        """
+        return self.record_many(visitor_id, [(timestamp, page)], location, insert_fields)
+
+    def record_many(self, visitor_id, visits, location, insert_fields):
+        """Record several (timestamp, page) visits of one visitor at once"""
+        def add():
+            state = self._pending.get(visitor_id)
+            if state is None:
+                if len(self._pending) >= self.max_queue:
+                    return False
+                state = self._pending[visitor_id] = {
+                    'count': 0,
+                    'last_visit': visits[0][0],
+                    'pages': {},
+                    'location': location,
+                    'insert': insert_fields
+                }
+            for timestamp, page in visits:
+                state['count'] += 1
+                if timestamp > state['last_visit']:
+                    state['last_visit'] = timestamp
+                state['pages'][page] = True
+            state['location'] = location
+            return True
+        return self._submit(add, len(visits))
+
+    def _pending_count(self):
+        return len(self._pending)
+
+    def _reset_pending(self):
+        self._pending = {}
+
+    def _take_batch(self):
+        batch = []
+        for visitor_id in list(self._pending)[:self.batch_size]:
+            batch.append((visitor_id, self._pending.pop(visitor_id)))
+        return batch
+
+    def _requeue(self, batch):
+        lost = 0
+        for visitor_id, state in batch:
+            current = self._pending.get(visitor_id)
+            if current is None:
+                if len(self._pending) >= self.max_queue:
+                    lost += state['count']
+                    continue
+                self._pending[visitor_id] = state
+                continue
+            # Newer visits arrived meanwhile: fold the failed ones into them
+            current['count'] += state['count']
+            current['last_visit'] = max(current['last_visit'], state['last_visit'])
+            for page in state['pages']:
+                current['pages'].setdefault(page, True)
+            current['insert'] = state['insert']
+        return lost
+
+    def _write(self, batch):
+        # Rollups need each visitor's previous last_visit and country: one read per flush, not per hit
+        previous = {}
+        if self.rollups is not None:
+            cursor = self.collection.find(
+                {'visitor_id': {'$in': [visitor_id for visitor_id, _ in batch]}},
+                {'_id': 0, 'visitor_id': 1, 'last_visit': 1, 'location.country': 1}
+            )
+            previous = {
+                doc['visitor_id']: (doc.get('last_visit'), (doc.get('location') or {}).get('country'))
+                for doc in cursor
+            }
+
+        # updated_at tells a rollup rebuild which visitors changed during its scan
+        now = utc_now()
+        operations = []
+        for visitor_id, state in batch:
+            query = {'visitor_id': visitor_id}
+            if self.rollups is not None:
+                # Only apply the update if the document still holds what was read above,
+                # so two workers flushing the same visitor can't both move its rollup
+                # buckets. Otherwise the upsert hits the unique visitor_id index and the
+                # visitor is retried (and re-read) on the next flush.
+                if visitor_id in previous:
+                    last_visit, country = previous[visitor_id]
+                    query.update({'last_visit': last_visit, 'location.country': country})
+                else:
+                    query['last_visit'] = {'$exists': False}
+            operations.append(UpdateOne(
+                query,
+                {
+                    '$setOnInsert': state['insert'],
+                    '$inc': {'visit_count': state['count']},
+                    '$max': {'last_visit': state['last_visit']},
+                    '$set': {'location': state['location'], 'updated_at': now},
+                    '$addToSet': {'pages_visited': {'$each': list(state['pages'])}}
+                },
+                upsert=True
+            ))
+
+        failed = set()
+        try:
+            result = self.collection.bulk_write(operations, ordered=False)
+            inserted = set(result.upserted_ids)
+        except BulkWriteError as e:
+            # Retry only the failed upserts (a duplicate key from a concurrent
+            # write in another worker); the rest are applied
+            failed = {error['index'] for error in e.details.get('writeErrors', [])}
+            inserted = {item['index'] for item in e.details.get('upserted', [])}
+            self.failed_flushes += 1
+            with self._lock:
+                self.dropped += self._requeue([batch[i] for i in sorted(failed)])
+
+        applied = [(i, item) for i, item in enumerate(batch) if i not in failed]
+        self.operations += len(applied)
+
+        if self.rollups is not None:
+            new_visitors = []
+            moves = []
+            for i, (visitor_id, state) in applied:
+                before, before_country = previous.get(visitor_id, (None, None))
+                # Documents not yet backfilled still hold ISO strings (see migrate_timestamps.py)
+                before = parse_timestamp(before) if before else None
+                moves.append((
+                    before,
+                    max(before, state['last_visit']) if before else state['last_visit'],
+                    before_country,
+                    (state['location'] or {}).get('country')
+                ))
+                if i in inserted:
+                    new_visitors.append(dict(state['insert'], location=state['location']))
+            _notify(self.name, lambda _: self.rollups.record_visitors(new_visitors, moves), applied)
+        _notify(self.name, self.on_written, [item for _, item in applied])
+
+        return sum(state['count'] for _, (_, state) in applied)
+
+    def metrics(self):
+        stats = super().metrics()
+        stats['pending_visitors'] = stats.pop('queue_depth')
+        stats['operations'] = self.operations
+        stats['visits_per_operation'] = round(self.written / self.operations, 2) if self.operations else 0.0
+        return stats
+
+
+class LocationBackfill(_BackgroundFlusher):
+    """
+    Replaces PENDING_LOCATION on written events once their IP is resolved:
+    page views by _id, visitors by visitor_id, one update_many per location
+    per flush. Only documents still pending are updated, and the rollup
+    country counts move from the pending country to the resolved one by the
+    number of documents actually modified.
+    """
+
+    def __init__(self, page_views, visitors, name='location_backfill', batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL_SECONDS, max_queue=MAX_QUEUE, rollups=None):
+        self._queue = []   # ('view', _id, timestamp, location) / ('visitor', visitor_id, None, location)
+        self.visitors = visitors
+        self.rollups = rollups
+        super().__init__(page_views, name, batch_size, flush_interval, max_queue)
+
+    def _add(self, item):
+        def add():
+            if len(self._queue) >= self.max_queue:
+                return False
+            self._queue.append(item)
+            return True
+        return self._submit(add)
+
+    def add_page_views(self, documents, location):
+        """Queue written page view documents (with their _id) for backfill"""
+        for doc in documents:
+            self._add(('view', doc['_id'], doc.get('timestamp'), location))
+
+    def add_visitors(self, visitor_ids, location):
+        for visitor_id in visitor_ids:
+            self._add(('visitor', visitor_id, None, location))
+
+    def _pending_count(self):
+        return len(self._queue)
+
+    def _reset_pending(self):
+        self._queue = []
+
+    def _take_batch(self):
+        batch = self._queue[:self.batch_size]
+        del self._queue[:self.batch_size]
+        return batch
+
+    def _requeue(self, batch):
+        room = max(self.max_queue - len(self._queue), 0)
+        self._queue[:0] = batch[:room]
+        return len(batch) - min(room, len(batch))
+
+    def _write(self, batch):
+        # Group by (kind, location): every item of a group gets the same $set
+        groups = {}
+        for item in batch:
+            kind, key, timestamp, location = item
+            group = groups.setdefault((kind, tuple(sorted(location.items()))), (location, {}, []))
+            group[1][key] = timestamp
+            group[2].append(item)
+
+        pending_country = PENDING_LOCATION['country']
+        view_moves = []
+        visitor_moves = []
+        modified = 0
+        groups = list(groups.items())
+        try:
+            for done, ((kind, _), (location, keys, _)) in enumerate(groups):
+                if kind == 'view':
+                    collection, field, changes = self.collection, '_id', {'location': location}
+                else:
+                    collection, field, changes = self.visitors, 'visitor_id', {'location': location, 'updated_at': utc_now()}
+                try:
+                    result = collection.update_many(
+                        {field: {'$in': list(keys)}, 'location.pending': True},
+                        {'$set': changes}
+                    )
+                except Exception as e:
+                    # Earlier groups are written (and their moves recorded below): requeue the rest only
+                    unwritten = [item for _, (_, _, items) in groups[done:] for item in items]
+                    raise _PartialWrite(e, modified, unwritten)
+                modified += result.modified_count
+                country = location.get('country')
+                if kind == 'visitor':
+                    visitor_moves.append((pending_country, country, result.modified_count))
+                elif result.modified_count == len(keys):
+                    view_moves.extend((timestamp, pending_country, country, 1) for timestamp in keys.values())
+                elif result.modified_count:
+                    # Someone else (a sweep) backfilled part of the group: which part is unknown
+                    print(f"⚠️ Analytics {self.name}: {len(keys) - result.modified_count} page views "
+                          f"backfilled elsewhere; rebuild the rollups to recount countries")
+        finally:
+            if self.rollups is not None:
+                _notify(self.name, lambda _: self.rollups.record_location_backfill(view_moves, visitor_moves),
+                        view_moves or [move for move in visitor_moves if move[2]])
+        return modified
@@ -0,0 +1,198 @@
+"""
+Live analytics feed for /api/analytics/live (Server-Sent Events)
+Tracked page views are published to an in-process ring buffer as they
+arrive, next to rolling counters (by arrival time):
+- active visitors: distinct visitors seen in the last LIVE_ACTIVE_WINDOW_SECONDS
+- views per minute over the last LIVE_MINUTES minutes
+Streams wait on a condition variable and push new views as they are
+tracked, so the dashboard gets updates without any database query.
+Each worker process keeps its own feed: with several workers, a stream
+only sees the views tracked by the worker that serves it. Event ids are
+'<boot id>-<seq>', the boot id being random per process, so a client that
+reconnects to another worker (or a restarted one) gets a snapshot instead
+of that worker's views after an unrelated sequence number.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict, deque
+from datetime import timedelta
+
+from timestamps import to_iso, utc_now
+
+LIVE_BUFFER_SIZE = int(os.getenv('ANALYTICS_LIVE_BUFFER_SIZE', 500))
+LIVE_ACTIVE_WINDOW_SECONDS = 300
+LIVE_MINUTES = 15
+LIVE_RECENT_EVENTS = 10
+LIVE_HEARTBEAT_SECONDS = float(os.getenv('ANALYTICS_LIVE_HEARTBEAT_SECONDS', 15))
+# Streams end after this long; EventSource-style clients reconnect (and re-authenticate)
+LIVE_MAX_STREAM_SECONDS = float(os.getenv('ANALYTICS_LIVE_MAX_STREAM_SECONDS', 600))
+LIVE_MAX_CLIENTS = int(os.getenv('ANALYTICS_LIVE_MAX_CLIENTS', 8))
+LIVE_RETRY_MS = 5000
+
+
+def live_event(document):
+    """What the dashboard sees of a page view (no IP, no visitor_id)"""
+    location = document.get('location') or {}
+    return {
+        'timestamp': to_iso(document.get('timestamp')),
+        'page': document.get('page'),
+        'device': document.get('device'),
+        'browser': document.get('browser'),
+        'os': document.get('os'),
+        'location': {'city': location.get('city'), 'country': location.get('country')}
+    }
+
+
+def sse(event, data, event_id=None):
+    """One Server-Sent Events message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+
+class LiveFeed:
+    """Ring buffer of recent page views plus rolling counters, shared by all streams"""
+
+    def __init__(self, capacity=LIVE_BUFFER_SIZE, active_window_seconds=LIVE_ACTIVE_WINDOW_SECONDS,
+                 minutes=LIVE_MINUTES, max_clients=LIVE_MAX_CLIENTS):
+        self.active_window = timedelta(seconds=active_window_seconds)
+        self.minutes = minutes
+        self.max_clients = max_clients
+
+        self._events = deque(maxlen=capacity)   # (seq, event), oldest first
+        self._seq = 0
+        self._last_seen = OrderedDict()         # visitor_id -> arrival time, oldest first
+        self._per_minute = OrderedDict()        # minute start -> views, oldest first
+        self._changed = threading.Condition()
+        self._boot_pid = None
+        self._boot_id = None
+
+        self.clients = 0
+        self.published = 0
+
+    @property
+    def boot_id(self):
+        """Random id of this process's feed (a forked worker gets its own)"""
+        pid = os.getpid()
+        if self._boot_pid != pid:
+            self._boot_id = os.urandom(4).hex()
+            self._boot_pid = pid
+        return self._boot_id
+
+    def event_id(self, seq):
+        return f'{self.boot_id}-{seq}'
+
+    def parse_event_id(self, event_id):
+        """seq of an id this process sent, None for anything else"""
+        boot_id, _, seq = (event_id or '').partition('-')
+        if boot_id != self.boot_id or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def _prune(self, now):
+        cutoff = now - self.active_window
+        while self._last_seen and next(iter(self._last_seen.values())) < cutoff:
+            self._last_seen.popitem(last=False)
+        first_minute = now.replace(second=0, microsecond=0) - timedelta(minutes=self.minutes - 1)
+        while self._per_minute and next(iter(self._per_minute)) < first_minute:
+            self._per_minute.popitem(last=False)
+
+    def publish(self, documents):
+        """Add tracked page view documents and wake every stream"""
+        now = utc_now()
+        minute = now.replace(second=0, microsecond=0)
+        with self._changed:
+            for doc in documents:
+                self._seq += 1
+                self._events.append((self._seq, live_event(doc)))
+                self._last_seen[doc.get('visitor_id')] = now
+                self._last_seen.move_to_end(doc.get('visitor_id'))
+            self._per_minute[minute] = self._per_minute.get(minute, 0) + len(documents)
+            self._prune(now)
+            self.published += len(documents)
+            self._changed.notify_all()
+
+    def counters(self):
+        now = utc_now()
+        current = now.replace(second=0, microsecond=0)
+        with self._changed:
+            self._prune(now)
+            active = len(self._last_seen)
+            series = []
+            for i in range(self.minutes - 1, -1, -1):
+                minute = current - timedelta(minutes=i)
+                series.append({'minute': to_iso(minute), 'views': self._per_minute.get(minute, 0)})
+        return {'active_visitors': active, 'views_per_minute': series}
+
+    def since(self, seq):
+        """(events after seq, latest seq); None for the events if seq fell out of the buffer"""
+        with self._changed:
+            # seq ahead of this feed or older than the buffer
+            if seq > self._seq or (self._events and seq < self._events[0][0] - 1):
+                return None, self._seq
+            return [event for s, event in self._events if s > seq], self._seq
+
+    def recent(self, count):
+        with self._changed:
+            return [event for _, event in list(self._events)[-count:]], self._seq
+
+    def wait(self, seq, timeout):
+        """Block until an event newer than seq is published or timeout expires"""
+        with self._changed:
+            self._changed.wait_for(lambda: self._seq > seq, timeout)
+
+    def acquire_client(self):
+        with self._changed:
+            if self.clients >= self.max_clients:
+                return False
+            self.clients += 1
+            return True
+
+    def release_client(self):
+        with self._changed:
+            self.clients -= 1
+
+    def stream(self, last_event_id=None, heartbeat_seconds=LIVE_HEARTBEAT_SECONDS,
+               max_seconds=LIVE_MAX_STREAM_SECONDS):
+        """
+        SSE messages for one subscriber: a snapshot, or the views missed since
+        Last-Event-ID (when this process sent it), then 'views' as they come
+        and 'counters' on every quiet heartbeat. The caller holds a client
+        slot (acquire_client) and releases it when the response is closed.
+        """
+        yield f'retry: {LIVE_RETRY_MS}\n\n'
+        last_seq = self.parse_event_id(last_event_id)
+        missed, seq = self.since(last_seq) if last_seq is not None else (None, 0)
+        if missed is None:
+            events, seq = self.recent(LIVE_RECENT_EVENTS)
+            yield sse('snapshot', {'events': events, 'counters': self.counters()}, self.event_id(seq))
+        elif missed:
+            yield sse('views', {'events': missed, 'counters': self.counters()}, self.event_id(seq))
+
+        deadline = utc_now() + timedelta(seconds=max_seconds)
+        while utc_now() < deadline:
+            self.wait(seq, heartbeat_seconds)
+            events, latest = self.since(seq)
+            if events is None:
+                # This stream fell behind the ring buffer: start over from a snapshot
+                events, latest = self.recent(LIVE_RECENT_EVENTS)
+                yield sse('snapshot', {'events': events, 'counters': self.counters()}, self.event_id(latest))
+            elif events:
+                yield sse('views', {'events': events, 'counters': self.counters()}, self.event_id(latest))
+            else:
+                yield sse('counters', self.counters())
+            seq = latest
+
+    def metrics(self):
+        with self._changed:
+            return {
+                'clients': self.clients,
+                'max_clients': self.max_clients,
+                'published': self.published,
+                'buffered': len(self._events),
+                'capacity': self._events.maxlen
+            }
@@ -0,0 +1,402 @@
+"""
+Pre-aggregated analytics rollups
+The analytics_rollups collection holds one document per hour, one per day
+and a running total, so /api/analytics/stats reads a few dozen small
+documents instead of counting the raw visitors and page_views collections.
+
+  hour:YYYY-MM-DDTHH / day:YYYY-MM-DD
+      views, active_visitors (visitors whose last_visit falls in the bucket),
+      views_by.device / .browser / .country / .page
+  total
+      views, visitors, devices, browsers, countries, pages, built_at
+
+Rollups are updated at ingest time by the write-behind buffers and can be
+rebuilt from the raw collections at any time (compaction):
+
+Usage: python backend_auth/analytics_rollups.py --rebuild | --verify
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from location_resolver import PENDING_LOCATION
+from timestamps import utc_now
+
+ROLLUP_COLLECTION = 'analytics_rollups'
+TOTAL_ID = 'total'
+TOP_COUNTRIES = 10
+
+# How far before a rebuild starts its cutoff is taken (see rebuild_rollups)
+REBUILD_CUTOFF_MARGIN_SECONDS = float(os.getenv('ANALYTICS_REBUILD_CUTOFF_MARGIN_SECONDS', 60))
+
+
+def _time_string(value):
+    """ISO string for a stored timestamp (ISO string or datetime)"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value or ''
+
+
+def hour_key(value):
+    return 'hour:' + _time_string(value)[:13]
+
+
+def day_key(value):
+    return 'day:' + _time_string(value)[:10]
+
+
+def encode_field(name):
+    """MongoDB field names can't contain '.' or start with '$'"""
+    name = str(name if name is not None else 'Unknown').replace('.', '．')
+    return '＄' + name[1:] if name.startswith('$') else name
+
+
+def decode_field(name):
+    name = name.replace('．', '.')
+    return '$' + name[1:] if name.startswith('＄') else name
+
+
+def _decode_counts(counts):
+    """Decoded names and counts, without the zeros left by moves and rebuild replays"""
+    return {decode_field(k): v for k, v in (counts or {}).items() if v}
+
+
+def floor_to_hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class RollupWriter:
+    """Applies ingest-time increments to the rollup collection"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def _apply(self, increments):
+        operations = [
+            UpdateOne({'_id': key}, {'$inc': inc}, upsert=True)
+            for key, inc in increments.items() if inc
+        ]
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+    def record_page_views(self, documents):
+        """Count a batch of written page views"""
+        increments = {}
+        for doc in documents:
+            location = doc.get('location') or {}
+            fields = {
+                'views': 1,
+                'views_by.device.' + encode_field(doc.get('device')): 1,
+                'views_by.browser.' + encode_field(doc.get('browser')): 1,
+                'views_by.country.' + encode_field(location.get('country')): 1,
+                'views_by.page.' + encode_field(doc.get('page')): 1,
+            }
+            for key in (hour_key(doc['timestamp']), day_key(doc['timestamp'])):
+                bucket = increments.setdefault(key, {})
+                for field, amount in fields.items():
+                    bucket[field] = bucket.get(field, 0) + amount
+            total = increments.setdefault(TOTAL_ID, {})
+            for field in ('views', 'pages.' + encode_field(doc.get('page'))):
+                total[field] = total.get(field, 0) + 1
+        self._apply(increments)
+
+    def record_visitors(self, new_visitors, moves):
+        """
+        new_visitors: insert-time fields of visitor documents just created
+        moves: (previous_last_visit, new_last_visit, previous_country, new_country)
+               per updated visitor; previous values are None for new visitors
+        """
+        increments = {}
+
+        def bump(key, field, amount):
+            bucket = increments.setdefault(key, {})
+            bucket[field] = bucket.get(field, 0) + amount
+
+        for visitor in new_visitors:
+            location = visitor.get('location') or {}
+            bump(TOTAL_ID, 'visitors', 1)
+            bump(TOTAL_ID, 'devices.' + encode_field(visitor.get('device')), 1)
+            bump(TOTAL_ID, 'browsers.' + encode_field(visitor.get('browser')), 1)
+            bump(TOTAL_ID, 'countries.' + encode_field(location.get('country')), 1)
+
+        for previous, current, previous_country, country in moves:
+            # Visitor location is overwritten on every visit, so its country can move
+            if previous is not None and previous_country != country:
+                bump(TOTAL_ID, 'countries.' + encode_field(previous_country), -1)
+                bump(TOTAL_ID, 'countries.' + encode_field(country), 1)
+
+            if previous is not None:
+                if hour_key(previous) == hour_key(current):
+                    continue
+                bump(hour_key(previous), 'active_visitors', -1)
+                if day_key(previous) != day_key(current):
+                    bump(day_key(previous), 'active_visitors', -1)
+                    bump(day_key(current), 'active_visitors', 1)
+            else:
+                bump(day_key(current), 'active_visitors', 1)
+            bump(hour_key(current), 'active_visitors', 1)
+
+        # Drop zero increments from moves that cancelled out
+        for key in list(increments):
+            increments[key] = {f: v for f, v in increments[key].items() if v}
+        self._apply(increments)
+
+    def record_location_backfill(self, view_moves, visitor_moves):
+        """
+        Move country counts of events whose location was filled in after they were counted
+        view_moves: (timestamp, previous_country, country, count) per page view
+        visitor_moves: (previous_country, country, count)
+        """
+        increments = {}
+
+        def move(key, prefix, previous_country, country, count):
+            bucket = increments.setdefault(key, {})
+            for name, amount in ((previous_country, -count), (country, count)):
+                field = prefix + encode_field(name)
+                bucket[field] = bucket.get(field, 0) + amount
+
+        for timestamp, previous_country, country, count in view_moves:
+            for key in (hour_key(timestamp), day_key(timestamp)):
+                move(key, 'views_by.country.', previous_country, country, count)
+        for previous_country, country, count in visitor_moves:
+            move(TOTAL_ID, 'countries.', previous_country, country, count)
+
+        for key in list(increments):
+            increments[key] = {f: v for f, v in increments[key].items() if v}
+        self._apply(increments)
+
+
+def _window_keys(start, now):
+    """Hour buckets for the rest of start's day, then day buckets up to today"""
+    keys = []
+    hour = floor_to_hour(start)
+    next_day = (hour + timedelta(days=1)).replace(hour=0)
+    if hour.hour == 0:
+        keys.append(day_key(hour))
+    else:
+        while hour < next_day and hour <= now:
+            keys.append(hour_key(hour))
+            hour += timedelta(hours=1)
+    day = next_day
+    while day <= now:
+        keys.append(day_key(day))
+        day += timedelta(days=1)
+    return keys
+
+
+def stats_windows(now):
+    """Window starts shared by the rollup and raw stats paths (hour-aligned)"""
+    return {
+        'today': now.replace(hour=0, minute=0, second=0, microsecond=0),
+        'week': floor_to_hour(now - timedelta(days=7)),
+        'month': floor_to_hour(now - timedelta(days=30)),
+    }
+
+
+def read_rollup_stats(collection, now=None):
+    """
+    Build the dashboard stats from rollups in one query, or return None if
+    the rollups were never built (run --rebuild once).
+    """
+    now = now or utc_now()
+    windows = stats_windows(now)
+    window_keys = {name: _window_keys(start, now) for name, start in windows.items()}
+
+    wanted = {TOTAL_ID}
+    for keys in window_keys.values():
+        wanted.update(keys)
+    docs = {doc['_id']: doc for doc in collection.find({'_id': {'$in': list(wanted)}})}
+
+    total = docs.get(TOTAL_ID)
+    if total is None or 'built_at' not in total:
+        return None
+
+    def window_sum(name, field):
+        return sum(docs.get(key, {}).get(field, 0) for key in window_keys[name])
+
+    # Countries every visitor moved away from (e.g. 'Pending') stay behind with 0
+    countries = sorted(
+        (item for item in _decode_counts(total.get('countries')).items() if item[1] > 0),
+        key=lambda item: -item[1]
+    )
+    return {
+        'visitors': {
+            'total': total.get('visitors', 0),
+            'today': window_sum('today', 'active_visitors'),
+            'this_week': window_sum('week', 'active_visitors'),
+            'this_month': window_sum('month', 'active_visitors')
+        },
+        'page_views': {
+            'total': total.get('views', 0),
+            'today': window_sum('today', 'views'),
+            'this_week': window_sum('week', 'views')
+        },
+        'devices': _decode_counts(total.get('devices')),
+        'browsers': _decode_counts(total.get('browsers')),
+        'countries': dict(countries[:TOP_COUNTRIES])
+    }
+
+
+def _view_fields(view):
+    """(rollup key, field) pairs a page view counts towards"""
+    if not view.get('timestamp'):
+        return ()
+    country = (view.get('location') or {}).get('country')
+    fields = [(TOTAL_ID, 'views'), (TOTAL_ID, 'pages.' + encode_field(view.get('page')))]
+    for key in (hour_key(view['timestamp']), day_key(view['timestamp'])):
+        fields.extend((
+            (key, 'views'),
+            (key, 'views_by.device.' + encode_field(view.get('device'))),
+            (key, 'views_by.browser.' + encode_field(view.get('browser'))),
+            (key, 'views_by.country.' + encode_field(country)),
+            (key, 'views_by.page.' + encode_field(view.get('page'))),
+        ))
+    return tuple(fields)
+
+
+def _visitor_fields(visitor):
+    """(rollup key, field) pairs a visitor counts towards: totals and the bucket of their last visit"""
+    fields = [
+        (TOTAL_ID, 'visitors'),
+        (TOTAL_ID, 'devices.' + encode_field(visitor.get('device'))),
+        (TOTAL_ID, 'browsers.' + encode_field(visitor.get('browser'))),
+        (TOTAL_ID, 'countries.' + encode_field((visitor.get('location') or {}).get('country'))),
+    ]
+    if visitor.get('last_visit'):
+        fields.append((hour_key(visitor['last_visit']), 'active_visitors'))
+        fields.append((day_key(visitor['last_visit']), 'active_visitors'))
+    return tuple(fields)
+
+
+def _nest(key, counts):
+    """Rollup document from {'a.b': n} counts (encoded names contain no '.')"""
+    doc = {'_id': key}
+    for path, amount in counts.items():
+        if not amount:
+            continue
+        *parents, name = path.split('.')
+        target = doc
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[name] = amount
+    return doc
+
+
+VIEW_FIELDS = {'timestamp': 1, 'device': 1, 'browser': 1, 'location.country': 1, 'page': 1}
+VISITOR_FIELDS = {'last_visit': 1, 'device': 1, 'browser': 1, 'location.country': 1}
+
+
+def rebuild_rollups(db, cutoff_margin=REBUILD_CUTOFF_MARGIN_SECONDS):
+    """
+    Recompute every rollup from the raw collections and swap them in atomically.
+
+    Ingest keeps incrementing the live collection during the scan, and those
+    increments are dropped by the swap, so the raw changes behind them are
+    replayed instead. The cutoff is taken before the scan:
+    - page views with an _id past the cutoff are skipped by the scan and
+      counted by the replay, as are views the scan saw with a pending location
+    - visitors updated past the cutoff (updated_at, set on every upsert and
+      location backfill) are re-read by the replay
+    What each of these documents contributed is remembered, so the replay
+    only applies differences. It runs once before the staging documents are
+    written and once more right before the swap; a write landing between that
+    last read and the rename is still lost (run --rebuild again, or --verify).
+    The margin covers clock skew between workers and this process.
+    """
+    started = utc_now()
+    cutoff = started - timedelta(seconds=cutoff_margin)
+    cutoff_id = ObjectId.from_datetime(cutoff.replace(tzinfo=timezone.utc))
+
+    buckets = {}
+    counted = {}   # document key -> (key, field) pairs it contributed
+
+    def count(fields, sign, target):
+        for key, field in fields:
+            bucket = target.setdefault(key, {})
+            bucket[field] = bucket.get(field, 0) + sign
+
+    def recount(doc_key, fields, target):
+        """Replace a document's earlier contribution with its current one"""
+        before = counted.get(doc_key, ())
+        if before != fields:
+            count(before, -1, target)
+            count(fields, 1, target)
+            counted[doc_key] = fields
+
+    # Page views, streamed once with only the fields the rollups need
+    pending_views = []
+    for view in db.page_views.find({'_id': {'$lt': cutoff_id}}, VIEW_FIELDS):
+        fields = _view_fields(view)
+        count(fields, 1, buckets)
+        if (view.get('location') or {}).get('country') == PENDING_LOCATION['country']:
+            # Its location may be backfilled during the rebuild
+            pending_views.append(view['_id'])
+            counted[('view', view['_id'])] = fields
+
+    for visitor in db.visitors.find({}, VISITOR_FIELDS):
+        fields = _visitor_fields(visitor)
+        count(fields, 1, buckets)
+        counted[('visitor', visitor['_id'])] = fields
+
+    def replay(target):
+        for view in db.page_views.find(
+            {'$or': [{'_id': {'$gte': cutoff_id}}, {'_id': {'$in': pending_views}}]}, VIEW_FIELDS
+        ):
+            recount(('view', view['_id']), _view_fields(view), target)
+        for visitor in db.visitors.find({'updated_at': {'$gte': cutoff}}, VISITOR_FIELDS):
+            recount(('visitor', visitor['_id']), _visitor_fields(visitor), target)
+
+    replay(buckets)
+    buckets.setdefault(TOTAL_ID, {}).setdefault('visitors', 0)
+
+    staging = db[ROLLUP_COLLECTION + '_rebuild']
+    staging.drop()
+    documents = [_nest(key, counts) for key, counts in buckets.items()]
+    # Marks the rollups as complete; until then the stats endpoint counts raw data
+    next(doc for doc in documents if doc['_id'] == TOTAL_ID)['built_at'] = started
+    staging.insert_many(documents)
+
+    # Changes that arrived while the staging documents were written
+    late = {}
+    replay(late)
+    RollupWriter(staging)._apply({key: {f: v for f, v in counts.items() if v} for key, counts in late.items()})
+
+    staging.rename(ROLLUP_COLLECTION, dropTarget=True)
+    return len(documents)
+
+
+if __name__ == '__main__':
+    import argparse
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    from database_architecture.connection import get_database
+    from analytics import compute_raw_stats
+
+    parser = argparse.ArgumentParser(description='Rebuild or verify analytics rollups')
+    parser.add_argument('--rebuild', action='store_true', help='recompute rollups from raw data')
+    parser.add_argument('--verify', action='store_true', help='compare rollup stats with raw stats')
+    args = parser.parse_args()
+
+    db = get_database()
+    if args.rebuild:
+        count = rebuild_rollups(db)
+        print(f"✅ Rebuilt {count} rollup documents")
+    if args.verify or not args.rebuild:
+        now = utc_now()
+        from_rollups = read_rollup_stats(db[ROLLUP_COLLECTION], now)
+        from_raw = compute_raw_stats(db.visitors, db.page_views, now)
+        if from_rollups is None:
+            print("❌ No rollups found - run with --rebuild")
+            sys.exit(1)
+        mismatches = [key for key in from_raw if from_raw[key] != from_rollups.get(key)]
+        if mismatches:
+            for key in mismatches:
+                print(f"❌ {key}: raw={from_raw[key]} rollups={from_rollups.get(key)}")
+            sys.exit(1)
+        print("✅ Rollups match raw data")
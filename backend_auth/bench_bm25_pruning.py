@@ -0,0 +1,82 @@
+"""
+Recall / latency benchmark for the chatbot BM25 pass on large corpora
+Compares PrunedBM25Scorer (prefix-term candidates + exact re-scoring)
+against the exhaustive BM25Scorer at several corpus sizes. Recall is the
+share of messages for which both return the same question (or both none);
+the pruned pass is exact, so anything below 100% is a bug.
+
+Usage: python backend_auth/bench_bm25_pruning.py [--sizes 10000,100000,300000] [--messages 500]
+"""
+import argparse
+import random
+import time
+
+from bench_phrase_matcher import WORDS
+from qa_index import MIN_SCORE
+from qa_scoring import BM25Scorer, PrunedBM25Scorer, tokenize
+
+
+def make_vocabulary(count, rng):
+    """Portfolio words plus pseudo-words, so large corpora stay diverse"""
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = set(WORDS)
+    while len(words) < count:
+        words.add(''.join(rng.choice(letters) for _ in range(rng.randint(3, 9))))
+    return sorted(words)
+
+
+def make_questions(count, vocabulary, rng):
+    """Questions of 2-7 words, common words more likely (Zipf-like)"""
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    return [' '.join(rng.choices(vocabulary, weights, k=rng.randint(2, 7))) for _ in range(count)]
+
+
+def make_messages(count, questions, rng):
+    """A stored question reworded: filler words added, sometimes a word dropped"""
+    messages = []
+    for _ in range(count):
+        words = rng.choice(questions).split()
+        if len(words) > 2 and rng.random() < 0.3:
+            words.pop(rng.randrange(len(words)))
+        for _ in range(rng.randint(0, 4)):
+            words.insert(rng.randint(0, len(words)), rng.choice(WORDS))
+        messages.append(' '.join(words))
+    return messages
+
+
+def timed(scorer, messages):
+    start = time.perf_counter()
+    results = [scorer.best(tokenize(message), MIN_SCORE) for message in messages]
+    return results, (time.perf_counter() - start) / len(messages) * 1000
+
+
+def run(sizes, message_count):
+    rng = random.Random(42)
+    print(f"{'questions':>9} {'build s':>8} {'exact ms':>9} {'pruned ms':>10} "
+          f"{'speedup':>8} {'recall':>7} {'candidates':>11}")
+    for size in sizes:
+        vocabulary = make_vocabulary(max(2000, size // 10), rng)
+        questions = make_questions(size, vocabulary, rng)
+        messages = make_messages(message_count, questions, rng)
+        bm25 = BM25Scorer([(i, tokenize(q)) for i, q in enumerate(questions)])
+
+        start = time.perf_counter()
+        pruned = PrunedBM25Scorer(bm25, MIN_SCORE)
+        build_seconds = time.perf_counter() - start
+
+        exact, exact_ms = timed(bm25, messages)
+        approximate, pruned_ms = timed(pruned, messages)
+        same = sum((e is None and p is None) or (e is not None and p is not None and e[0] == p[0])
+                   for e, p in zip(exact, approximate))
+        candidates = sum(len(pruned.candidates(bm25._terms(tokenize(m)))) for m in messages) / len(messages)
+
+        print(f"{size:>9} {build_seconds:>8.2f} {exact_ms:>9.3f} {pruned_ms:>10.3f} "
+              f"{exact_ms / pruned_ms:>7.1f}x {same / len(messages):>7.1%} {candidates:>11.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,300000')
+    parser.add_argument('--messages', type=int, default=500)
+    args = parser.parse_args()
+    run([int(s) for s in args.sizes.split(',')], args.messages)
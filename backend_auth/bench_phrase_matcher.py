@@ -0,0 +1,84 @@
+"""
+Microbenchmark for the chatbot exact phrase pass
+Compares the Aho-Corasick PhraseMatcher against the old per-question
+`question in message` loop at 1k, 10k and 100k stored phrases.
+
+Usage: python backend_auth/bench_phrase_matcher.py [--sizes 1000,10000,100000] [--messages 500]
+"""
+import argparse
+import random
+import time
+
+from phrase_matcher import PhraseMatcher
+
+WORDS = (
+    "who what where when why how are you your is the do can tell me about "
+    "skills projects education experience contact email github linkedin react "
+    "python java mongodb flask work build study university college age role "
+    "technology tech hello thanks available internship resume portfolio hobby "
+    "favourite language framework database cloud deploy team lead design api"
+).split()
+
+
+def make_phrases(count, rng):
+    """Synthetic questions of 2-6 words, unique like stored Q&A questions"""
+    phrases = set()
+    while len(phrases) < count:
+        length = rng.randint(2, 6)
+        phrases.add(' '.join(rng.choice(WORDS) for _ in range(length)) + f" q{len(phrases)}")
+    return list(phrases)
+
+
+def make_messages(count, phrases, rng):
+    """Visitor-like messages; about a third contain a stored phrase"""
+    messages = []
+    for i in range(count):
+        words = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 14)))
+        if i % 3 == 0:
+            words = f"{words} {rng.choice(phrases)} please"
+        messages.append(words)
+    return messages
+
+
+def naive_best(phrases, message):
+    """The previous exact phrase pass: first stored question contained in the message"""
+    for phrase in phrases:
+        if phrase in message:
+            return phrase
+    return None
+
+
+def run(sizes, message_count, naive_limit):
+    rng = random.Random(42)
+    print(f"{'phrases':>8} {'build s':>9} {'states':>10} {'AC msg/s':>11} {'naive msg/s':>12} {'speedup':>8}")
+    for size in sizes:
+        phrases = make_phrases(size, rng)
+        messages = make_messages(message_count, phrases, rng)
+
+        start = time.perf_counter()
+        matcher = PhraseMatcher((p, p) for p in phrases)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for message in messages:
+            matcher.best(message)
+        ac_rate = len(messages) / (time.perf_counter() - start)
+
+        naive_messages = messages[:naive_limit]
+        start = time.perf_counter()
+        for message in naive_messages:
+            naive_best(phrases, message)
+        naive_rate = len(naive_messages) / (time.perf_counter() - start)
+
+        print(f"{size:>8} {build_seconds:>9.2f} {len(matcher._fail):>10} "
+              f"{ac_rate:>11.0f} {naive_rate:>12.0f} {ac_rate / naive_rate:>7.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--naive-messages', type=int, default=100,
+                        help='messages timed for the naive loop (it is slow at 100k)')
+    args = parser.parse_args()
+    run([int(s) for s in args.sizes.split(',')], args.messages, args.naive_messages)
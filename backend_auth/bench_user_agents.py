@@ -0,0 +1,151 @@
+"""
+Benchmark for the analytics user-agent classifier
+Replays simulated traffic (Zipf-distributed over a corpus of real UA
+strings) through the previous if/elif substring chain, the compiled rule
+tables without a cache and the cached classifier, and lists the UAs whose
+classification changed.
+
+Usage: python backend_auth/bench_user_agents.py [--hits 200000] [--corpus uas.txt]
+       (--corpus: one UA string per line, e.g. exported from page_views.raw)
+"""
+import argparse
+import random
+import time
+
+import user_agents
+
+CORPUS = [
+    # Desktop
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 Edg/124.0.0.0',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 OPR/110.0.0.0',
+    'Mozilla/5.0 (Windows NT 6.1; Win64; x64; Trident/7.0; rv:11.0) like Gecko',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4.1 Safari/605.1.15',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14.4; rv:125.0) Gecko/20100101 Firefox/125.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 Edg/124.0.0.0',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Ubuntu Chromium/124.0.0.0 Chrome/124.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (X11; CrOS x86_64 14541.0.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
+    # Phones
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4.1 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) CriOS/124.0.6367.88 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) FxiOS/125.0 Mobile/15E148 Safari/605.1.15',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 EdgiOS/124.2478.71 Mobile/15E148 Safari/605.1.15',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 16_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148 Instagram 329.0.0.29.120',
+    'Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.6367.82 Mobile Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 13; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/24.0 Chrome/117.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Android 14; Mobile; rv:125.0) Gecko/125.0 Firefox/125.0',
+    'Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36 EdgA/124.0.0.0',
+    'Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36 OPR/81.0.0.0',
+    'Mozilla/5.0 (Linux; Android 12; M2101K6G Build/SKQ1.210908.001; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/124.0.6367.82 Mobile Safari/537.36',
+    # Tablets
+    'Mozilla/5.0 (iPad; CPU OS 17_4_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4.1 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (iPad; CPU OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) CriOS/124.0.6367.88 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Linux; Android 13; SM-X710) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Android 13; Tablet; rv:125.0) Gecko/125.0 Firefox/125.0',
+    # Bots and tools
+    'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+    'Mozilla/5.0 AppleWebKit/537.36 (KHTML, like Gecko; compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm) Chrome/116.0.1938.76 Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 6.0.1; Nexus 5X Build/MMB29P) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.6367.82 Mobile Safari/537.36 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+    'facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)',
+    'Twitterbot/1.0',
+    'curl/8.4.0',
+    'python-requests/2.31.0',
+    '',
+]
+
+
+def legacy_parse(user_agent_string):
+    """parse_user_agent() as it was before the rule tables (for comparison)"""
+    ua = user_agent_string.lower() if user_agent_string else ''
+    if 'mobile' in ua or 'android' in ua or 'iphone' in ua:
+        device = 'Mobile'
+    elif 'tablet' in ua or 'ipad' in ua:
+        device = 'Tablet'
+    else:
+        device = 'Desktop'
+    if 'edg' in ua:
+        browser = 'Edge'
+    elif 'chrome' in ua and 'chromium' not in ua:
+        browser = 'Chrome'
+    elif 'firefox' in ua:
+        browser = 'Firefox'
+    elif 'safari' in ua and 'chrome' not in ua:
+        browser = 'Safari'
+    elif 'opera' in ua or 'opr' in ua:
+        browser = 'Opera'
+    else:
+        browser = 'Other'
+    if 'windows' in ua:
+        os_name = 'Windows'
+    elif 'mac' in ua:
+        os_name = 'macOS'
+    elif 'linux' in ua:
+        os_name = 'Linux'
+    elif 'android' in ua:
+        os_name = 'Android'
+    elif 'iphone' in ua or 'ipad' in ua:
+        os_name = 'iOS'
+    else:
+        os_name = 'Other'
+    return {'device': device, 'browser': browser, 'os': os_name,
+            'raw': user_agent_string[:200] if user_agent_string else ''}
+
+
+def uncached_parse(user_agent_string):
+    device, browser, os_name = user_agents.classify.__wrapped__(user_agent_string or '')
+    return {'device': device, 'browser': browser, 'os': os_name, 'raw': (user_agent_string or '')[:200]}
+
+
+def timed(parse, traffic):
+    start = time.perf_counter()
+    for ua in traffic:
+        parse(ua)
+    return (time.perf_counter() - start) / len(traffic) * 1e6
+
+
+def run(corpus, hits):
+    rng = random.Random(42)
+    # A few browsers dominate real traffic: Zipf-like weights over the corpus
+    weights = [1 / (rank + 1) for rank in range(len(corpus))]
+    traffic = rng.choices(corpus, weights, k=hits)
+
+    user_agents.classify.cache_clear()
+    legacy_us = timed(legacy_parse, traffic)
+    uncached_us = timed(uncached_parse, traffic)
+    cached_us = timed(user_agents.parse_user_agent, traffic)
+    stats = user_agents.cache_stats()
+
+    print(f"{len(corpus)} distinct UAs, {hits} hits")
+    print(f"{'classifier':<22} {'us/hit':>8}")
+    print(f"{'legacy if/elif chain':<22} {legacy_us:>8.2f}")
+    print(f"{'rule tables, no cache':<22} {uncached_us:>8.2f}")
+    print(f"{'rule tables + LRU':<22} {cached_us:>8.2f}   (hit rate {stats['hit_rate']:.2%})")
+
+    changed = []
+    for ua in corpus:
+        before, after = legacy_parse(ua), user_agents.parse_user_agent(ua)
+        diff = [f"{key} {before[key]} -> {after[key]}" for key in ('device', 'browser', 'os')
+                if before[key] != after[key]]
+        if diff:
+            changed.append((ua, diff))
+    print(f"\n{len(changed)} UAs classified differently from the legacy chain:")
+    for ua, diff in changed:
+        print(f"  {', '.join(diff):<48} {ua[:90]}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hits', type=int, default=200000)
+    parser.add_argument('--corpus', help='File with one UA string per line (default: built-in corpus)')
+    args = parser.parse_args()
+
+    corpus = CORPUS
+    if args.corpus:
+        with open(args.corpus, encoding='utf-8') as f:
+            corpus = list(dict.fromkeys(line.rstrip('\n') for line in f))
+    run(corpus, args.hits)
@@ -0,0 +1,140 @@
+"""
+Build the binary GeoIP database used by geoip.py from a CSV range dump
+Each row holds an IP range and its location. Addresses may be written as
+IPs ("1.0.0.0", "2001:db8::") or as integers (IP2Location style).
+Default column order: start,end,country_code,country,region,city
+
+Usage: python backend_auth/build_geoip_db.py ranges.csv [more.csv ...] [-o backend_auth/data/geoip.bin]
+"""
+import argparse
+import csv
+import ipaddress
+import os
+import sys
+
+from geoip import (
+    DEFAULT_PATH, FIELD_SEPARATOR, HEADER, LOCATION_RECORD, MAGIC, V4_RECORD, V6_RECORD
+)
+
+DEFAULT_COLUMNS = 'start,end,country_code,country,region,city'
+IPV4_MAPPED_START = int(ipaddress.IPv6Address('::ffff:0:0'))
+IPV4_MAPPED_END = int(ipaddress.IPv6Address('::ffff:ffff:ffff'))
+
+
+def parse_address(value):
+    """Return (version, int) for an IP or integer string"""
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        if number <= 0xFFFFFFFF:
+            return 4, number
+        if IPV4_MAPPED_START <= number <= IPV4_MAPPED_END:
+            return 4, number - IPV4_MAPPED_START
+        return 6, number
+    address = ipaddress.ip_address(value)
+    if address.version == 6 and address.ipv4_mapped is not None:
+        return 4, int(address.ipv4_mapped)
+    return address.version, int(address)
+
+
+def clean(value, unknown):
+    value = (value or '').strip().replace(FIELD_SEPARATOR, ' ')
+    return unknown if value in ('', '-') else value
+
+
+def read_ranges(paths, columns):
+    """Yield (version, start, end, location_tuple) from the CSV files"""
+    for path in paths:
+        with open(path, newline='', encoding='utf-8') as f:
+            for line_number, row in enumerate(csv.reader(f), 1):
+                if not row:
+                    continue
+                fields = dict(zip(columns, row))
+                try:
+                    start_version, start = parse_address(fields['start'])
+                    end_version, end = parse_address(fields['end'])
+                except (KeyError, ValueError):
+                    if line_number == 1:
+                        continue  # header row
+                    print(f"  Skipped {path}:{line_number}: bad address")
+                    continue
+                if start_version != end_version or start > end:
+                    print(f"  Skipped {path}:{line_number}: invalid range")
+                    continue
+                location = (
+                    clean(fields.get('city'), 'Unknown'),
+                    clean(fields.get('region'), 'Unknown'),
+                    clean(fields.get('country'), 'Unknown'),
+                    clean(fields.get('country_code'), 'UN').upper()
+                )
+                yield start_version, start, end, location
+
+
+def compact(ranges):
+    """Sort ranges, drop overlaps and merge adjacent ranges with the same location"""
+    merged = []
+    dropped = 0
+    for start, end, location in sorted(ranges):
+        if merged:
+            last_start, last_end, last_location = merged[-1]
+            if start <= last_end:
+                dropped += 1
+                continue
+            if start == last_end + 1 and location == last_location:
+                merged[-1] = (last_start, end, location)
+                continue
+        merged.append((start, end, location))
+    return merged, dropped
+
+
+def build(paths, output, columns):
+    v4, v6 = [], []
+    locations = {}
+    for version, start, end, location in read_ranges(paths, columns):
+        location_index = locations.setdefault(location, len(locations))
+        (v4 if version == 4 else v6).append((start, end, location_index))
+
+    v4, v4_dropped = compact(v4)
+    v6, v6_dropped = compact(v6)
+
+    blob = bytearray()
+    location_table = bytearray()
+    for location in sorted(locations, key=locations.get):
+        encoded = FIELD_SEPARATOR.join(location).encode('utf-8')
+        location_table += LOCATION_RECORD.pack(len(blob), len(encoded))
+        blob += encoded
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    temp_path = f"{output}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(v4), len(v6), len(locations), len(blob)))
+        for start, end, location_index in v4:
+            f.write(V4_RECORD.pack(start, end, location_index))
+        for start, end, location_index in v6:
+            f.write(V6_RECORD.pack(start.to_bytes(16, 'big'), end.to_bytes(16, 'big'), location_index))
+        f.write(location_table)
+        f.write(blob)
+    # Atomic swap: running workers keep their old mapping until they reopen
+    os.replace(temp_path, output)
+
+    print(f"✅ GeoIP database written to {output}")
+    print(f"   IPv4 ranges: {len(v4)} (overlaps dropped: {v4_dropped})")
+    print(f"   IPv6 ranges: {len(v6)} (overlaps dropped: {v6_dropped})")
+    print(f"   Locations:   {len(locations)}")
+    print(f"   Size:        {os.path.getsize(output)} bytes")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the binary GeoIP database from CSV range dumps')
+    parser.add_argument('csv', nargs='+', help='CSV files with IP ranges (IPv4 and/or IPv6)')
+    parser.add_argument('-o', '--output', default=DEFAULT_PATH)
+    parser.add_argument('--columns', default=DEFAULT_COLUMNS,
+                        help=f'comma-separated column order (default: {DEFAULT_COLUMNS}); '
+                             'use "-" to skip a column')
+    args = parser.parse_args()
+
+    try:
+        build(args.csv, args.output, [c.strip() for c in args.columns.split(',')])
+    except Exception as e:
+        print(f"❌ Build failed: {e}")
+        sys.exit(1)
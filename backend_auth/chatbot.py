@@ -3,15 +3,19 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 os.environ['FLASK_SKIP_DOTENV'] = '1'
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context
 from flask_cors import CORS
 from datetime import datetime
+import hashlib
 from dotenv import load_dotenv
 
 # Load environment variables with UTF-16 encoding for Windows
 load_dotenv()
 
 app = Flask(__name__)
+# Timestamps are stored as UTC datetimes; serialize them as ISO 8601 strings
+from timestamps import UTCJSONProvider, utc_now
+app.json = UTCJSONProvider(app)
 # INTEGRATION: Cloudflare Security - Handle Proxy Headers
 from werkzeug.middleware.proxy_fix import ProxyFix
 app.wsgi_app = ProxyFix(
@@ -33,7 +37,8 @@ CORS(app, resources={r"/*": {"origins": allowed_origins}})
 
 # Import portfolio routes
 from database_architecture.portfolio_api import register_portfolio_routes
-from database_architecture.connection import get_database
+from database_architecture.connection import get_database, get_pool_stats
+from database_architecture.indexes import ensure_indexes, print_summary
 
 # Register portfolio API routes
 # Initialize database connection for Q&As
@@ -46,6 +51,70 @@ except Exception as e:
     qa_collection = None
     db = None
 
+# Create any missing indexes from the registry (no-op once they exist)
+if db is not None:
+    try:
+        index_summary = ensure_indexes(db)
+        print_summary(index_summary)
+        print(f"✅ Indexes checked: {len(index_summary['created'])} created, {len(index_summary['existing'])} present")
+    except Exception as e:
+        print(f"⚠️ Indexes not checked: {e}")
+
+# In-memory Q&A index: chatbot messages are answered without a database round trip
+from qa_index import (
+    QAIndex, SharedQAIndex, SHARED_INDEX, bump_version, read_version_info, normalize_text, question_key,
+    fill_missing_question_keys
+)
+from response_cache import ResponseCache
+from qa_transfer import ImportResult, export_ndjson, import_ndjson
+from qa_snapshot import SnapshotCache
+
+# Q&As stored before question_key existed escape the unique index until they get one
+if qa_collection is not None:
+    try:
+        key_indexes = [i for i in qa_collection.index_information().values()
+                       if i.get('unique') and list(dict(i['key'])) == ['question_key']]
+        if key_indexes:
+            filled, unkeyed = fill_missing_question_keys(qa_collection)
+            if filled:
+                print(f"✅ question_key filled in on {filled} Q&As")
+            if unkeyed:
+                print(f"⚠️ {len(unkeyed)} Q&As repeat an existing question and have no question_key - "
+                      f"list them with migrate_chatbot_data.py --backfill-keys")
+        else:
+            print("⚠️ question_key not filled in: the unique custom_qa.question_key index is missing")
+    except Exception as e:
+        print(f"⚠️ question_key not filled in: {e}")
+
+# Responses cached by normalized message; every Q&A write clears the cache
+response_cache = ResponseCache()
+
+def _load_qa_index(index_class):
+    index = index_class(qa_collection, db.qa_meta)
+    # A reload means another process changed Q&As; we can't tell which ones
+    index.on_reload(response_cache.clear)
+    index.load()
+    return index
+
+qa_index = None
+if qa_collection is not None:
+    try:
+        # Workers share one memory-mapped index file unless CHATBOT_SHARED_INDEX=0
+        qa_index = _load_qa_index(SharedQAIndex if SHARED_INDEX else QAIndex)
+    except Exception as e:
+        print(f"⚠️ Shared chatbot index not loaded ({e}), using a per-process index")
+        try:
+            qa_index = _load_qa_index(QAIndex)
+        except Exception as e:
+            print(f"⚠️ Chatbot index not loaded: {e}")
+            qa_index = None
+
+# Gzipped snapshot of the index for clients that answer locally
+snapshot_cache = None
+if qa_index is not None:
+    snapshot_cache = SnapshotCache(qa_index)
+    qa_index.on_reload(snapshot_cache.clear)
+
 # Import and register authentication routes
 limiter = None
 try:
@@ -67,6 +136,15 @@ except Exception as e:
 # Register portfolio API routes (with rate limiting if available)
 register_portfolio_routes(app, limiter)
 
+@app.route('/api/health/database', methods=['GET'])
+@token_required
+def database_health():
+    """Connection pool settings and counters of this worker (Admin only - requires authentication)"""
+    return jsonify({
+        'success': True,
+        'database_pool': get_pool_stats()
+    })
+
 # Import and register analytics routes
 try:
     from analytics import register_analytics_routes
@@ -77,72 +155,64 @@ except Exception as e:
 
 
 
+# Most messages accepted by one /api/chatbot/batch request
+BATCH_MAX_MESSAGES = int(os.getenv('CHATBOT_BATCH_MAX_MESSAGES', 1000))
+
 # Default response when no match is found
 DEFAULT_RESPONSE = "I'm not sure about that specific question, but I can tell you about Ankit's skills, projects, education, or how to contact him. What would you like to know?"
 
-def get_response_from_database(user_message):
+def find_best_qa(message_key):
     """
-    Fetch response from MongoDB based on user message.
-    Uses keyword matching to find the best response.
+    Find the best stored Q&A for a normalized message.
+    Matching runs against the in-memory Q&A index (see qa_index.py),
+    which mirrors the custom_qa collection. Returns (answer, qa_id) or None.
     """
-    if qa_collection is None:
+    if qa_index is None:
         return None
     
     try:
-        lower_message = user_message.lower().strip()
-        
-        # Get all Q&As from database
-        all_qas = list(qa_collection.find({}))
-        
-        if not all_qas:
-            return None
-        
-        best_match = None
-        best_score = 0
-        
-        for qa in all_qas:
-            question_text = qa.get('question', '').lower()
-            answer = qa.get('answer', '')
-            
-            # Exact phrase match (highest priority)
-            if question_text in lower_message:
-                return answer
-            
-            # Check for keyword matches
-            question_words = [w for w in question_text.split() if len(w) > 2]
-            message_words = lower_message.split()
-            
-            # Count matching keywords
-            matching_count = sum(1 for w in question_words if w in lower_message)
-            
-            # Calculate match score
-            if question_words:
-                score = matching_count / len(question_words)
-                if score > best_score:
-                    best_score = score
-                    best_match = answer
-        
-        # Return best match if score is high enough (at least 50% keywords match)
-        if best_score >= 0.5:
-            return best_match
-        
-        return None
-        
+        return qa_index.match(message_key)
     except Exception as e:
-        print(f"Error fetching from database: {e}")
+        print(f"Error matching chatbot message: {e}")
         return None
 
+def get_response_from_database(user_message):
+    """Return the stored answer for a user message, or None"""
+    result = find_best_qa(normalize_text(user_message))
+    return result[0] if result else None
+
+def _record_qa_write():
+    """
+    Bump the Q&A version counter so other workers reload their index, and drop
+    every cached response: BM25 weights depend on the whole corpus, so any write
+    can change the answer to any message.
+    """
+    if qa_index is not None:
+        qa_index.note_write(bump_version(db.qa_meta))
+    response_cache.clear()
+
 def generate_chatbot_response(user_message):
     """Generate response based on user message - 100% database-driven"""
     
+    message_key = normalize_text(user_message)
+    cached = response_cache.get(message_key)
+    if cached is not None:
+        return cached
+    # Read before matching: a write that lands before put() makes it a no-op
+    generation = response_cache.generation
+    
     # Try to get response from database
-    db_response = get_response_from_database(user_message)
+    result = find_best_qa(message_key)
     
-    if db_response:
-        return db_response
+    if result:
+        response = result[0]
+    else:
+        # Return default response if no match found
+        response = DEFAULT_RESPONSE
     
-    # Return default response if no match found
-    return DEFAULT_RESPONSE
+    if qa_index is not None:
+        response_cache.put(message_key, response, generation)
+    return response
 
 @app.route('/')
 def home():
@@ -168,6 +238,8 @@ def chatbot():
         return jsonify({
             'success': True,
             'response': bot_response,
+            # Clients holding an older snapshot refetch /api/chatbot/snapshot
+            'version': qa_index.version if qa_index is not None else None,
             'timestamp': datetime.now().isoformat()
         })
     
@@ -177,11 +249,131 @@ def chatbot():
             'error': str(e)
         }), 500
 
+@app.route('/api/chatbot/batch', methods=['POST'])
+def chatbot_batch():
+    """
+    Answer several messages in one request: { "messages": ["...", ...] }.
+    Answers come back in order, all from the same state of the Q&A index.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        messages = data.get('messages')
+        
+        if not isinstance(messages, list) or not messages:
+            return jsonify({
+                'success': False,
+                'error': 'messages must be a non-empty list'
+            }), 400
+        if len(messages) > BATCH_MAX_MESSAGES:
+            return jsonify({
+                'success': False,
+                'error': f'At most {BATCH_MAX_MESSAGES} messages per batch'
+            }), 400
+        invalid = [i for i, m in enumerate(messages) if not isinstance(m, str) or not m.strip()]
+        if invalid:
+            return jsonify({
+                'success': False,
+                'error': 'Every message must be a non-empty string',
+                'invalid': invalid[:100]
+            }), 400
+        
+        # Repeated messages are matched once
+        message_keys = [normalize_text(m) for m in messages]
+        unique_keys = list(dict.fromkeys(message_keys))
+        if qa_index is not None:
+            try:
+                matches = dict(zip(unique_keys, qa_index.match_many(unique_keys)))
+            except Exception as e:
+                print(f"Error matching chatbot batch: {e}")
+                matches = {}
+        else:
+            matches = {}
+        
+        results = []
+        for key in message_keys:
+            result = matches.get(key)
+            results.append({
+                'response': result[0] if result else DEFAULT_RESPONSE,
+                'qa_id': result[1] if result else None
+            })
+        
+        return jsonify({
+            'success': True,
+            'results': results,
+            'count': len(results),
+            'version': qa_index.version if qa_index is not None else None,
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/chatbot/snapshot', methods=['GET'])
+def chatbot_snapshot():
+    """
+    Compiled Q&A matcher (questions, BM25 terms and weights, answers) so the
+    frontend can answer locally; precompressed once per Q&A version
+    """
+    try:
+        if snapshot_cache is None:
+            return jsonify({
+                'success': False,
+                'error': 'Chatbot index not loaded'
+            }), 503
+        
+        compiled = snapshot_cache.get()
+        if request.if_none_match.contains(compiled.etag):
+            response = Response(status=304)
+        elif 'gzip' in request.accept_encodings:
+            response = Response(compiled.gzipped, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(compiled.body, mimetype='application/json')
+        response.set_etag(compiled.etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        # Browsers revalidate every time and get a 304 while nothing changed
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/chatbot/cache/stats', methods=['GET'])
+@token_required
+def chatbot_cache_stats():
+    """Response cache hit/miss counters (Admin only - requires authentication)"""
+    return jsonify({
+        'success': True,
+        'cache': response_cache.stats()
+    })
+
 # ============ Q&A Management APIs ============
 
+# Q&A list paging: ?limit=&after=<last _id>&fields=question,answer
+QA_PAGE_SIZE = 100
+QA_MAX_PAGE_SIZE = 500
+QA_LIST_FIELDS = ('question', 'answer', 'is_default', 'created_at', 'updated_at')
+
+def _qa_list_version():
+    """
+    custom_qa "epoch-version" for ETags: the in-memory index's copy (no
+    database work), which other workers' writes reach within one poll
+    interval. The epoch keeps a reset or restored counter from reusing the
+    ETags of an earlier database.
+    """
+    if qa_index is not None and qa_index.version is not None:
+        return f"{qa_index.epoch}-{qa_index.version}"
+    version, epoch = read_version_info(db.qa_meta)
+    return f"{epoch}-{version}"
+
 @app.route('/api/chatbot/qa', methods=['GET'])
 def get_all_qa():
-    """Get all Q&A pairs from database"""
+    """Get one page of Q&A pairs (keyset pagination on _id)"""
     try:
         if qa_collection is None:
             return jsonify({
@@ -189,16 +381,57 @@ def get_all_qa():
                 'error': 'Database not connected'
             }), 500
         
-        qas = list(qa_collection.find({}))
+        from bson import ObjectId
+        from bson.errors import InvalidId
+        
+        try:
+            limit = min(max(int(request.args.get('limit', QA_PAGE_SIZE)), 1), QA_MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'limit must be a number'}), 400
+        after = request.args.get('after', '')
+        fields = [f for f in request.args.get('fields', '').split(',') if f] or list(QA_LIST_FIELDS)
+        unknown = [f for f in fields if f not in QA_LIST_FIELDS]
+        if unknown:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown fields: {', '.join(unknown)}"
+            }), 400
+        
+        # Same version and same page parameters -> same body
+        page_key = f"{after}|{limit}|{','.join(fields)}"
+        etag = f"qa-{_qa_list_version()}-{hashlib.sha1(page_key.encode()).hexdigest()[:12]}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        
+        query = {}
+        if after:
+            try:
+                query['_id'] = {'$gt': ObjectId(after)}
+            except (InvalidId, TypeError):
+                return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+        
+        # One extra document tells whether another page exists
+        cursor = qa_collection.find(query, {f: 1 for f in fields}).sort('_id', 1).limit(limit + 1)
+        qas = list(cursor)
+        has_more = len(qas) > limit
+        qas = qas[:limit]
         # Convert ObjectId to string for JSON serialization
         for qa in qas:
             qa['_id'] = str(qa['_id'])
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'data': qas,
-            'count': len(qas)
+            'count': len(qas),
+            'next_cursor': qas[-1]['_id'] if has_more else None
         })
+        response.set_etag(etag)
+        # Browsers revalidate every time and get a 304 while nothing changed
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         return jsonify({
             'success': False,
@@ -226,26 +459,34 @@ def add_qa():
                 'error': 'Both question and answer are required'
             }), 400
         
-        # Check if similar question already exists
-        existing = qa_collection.find_one({
-            'question': {'$regex': f"^{question}$", '$options': 'i'}
-        })
-        if existing:
+        key = question_key(question)
+        if not key:
             return jsonify({
                 'success': False,
-                'error': 'A similar question already exists'
-            }), 409
+                'error': 'Question must contain letters or numbers'
+            }), 400
         
-        # Insert new Q&A
+        # Insert new Q&A; the unique question_key index rejects duplicates
+        from pymongo.errors import DuplicateKeyError
         new_qa = {
             'question': question,
+            'question_key': key,
             'answer': answer,
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat(),
+            'created_at': utc_now(),
+            'updated_at': utc_now(),
             'is_default': False
         }
         
-        result = qa_collection.insert_one(new_qa)
+        try:
+            result = qa_collection.insert_one(new_qa)
+        except DuplicateKeyError:
+            return jsonify({
+                'success': False,
+                'error': 'A similar question already exists'
+            }), 409
+        if qa_index is not None:
+            qa_index.upsert(new_qa)
+        _record_qa_write()
         new_qa['_id'] = str(result.inserted_id)
         
         return jsonify({
@@ -260,6 +501,60 @@ def add_qa():
             'error': str(e)
         }), 500
 
+@app.route('/api/chatbot/qa/export', methods=['GET'])
+@token_required
+def export_qa():
+    """Stream every Q&A as NDJSON (Admin only - requires authentication)"""
+    if qa_collection is None:
+        return jsonify({
+            'success': False,
+            'error': 'Database not connected'
+        }), 500
+    
+    return Response(
+        stream_with_context(export_ndjson(qa_collection)),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename=chatbot_qa.ndjson'}
+    )
+
+@app.route('/api/chatbot/qa/import', methods=['POST'])
+@token_required
+def import_qa():
+    """
+    Upsert Q&As from an NDJSON request body, one {"question", "answer"} object
+    per line (Admin only - requires authentication)
+    """
+    try:
+        if qa_collection is None:
+            return jsonify({
+                'success': False,
+                'error': 'Database not connected'
+            }), 500
+        
+        # The body is read line by line, never as a whole
+        result = ImportResult()
+        try:
+            import_ndjson(qa_collection, request.stream, result=result)
+        finally:
+            # Batches written before a failure are stored too
+            if result.inserted or result.updated:
+                bump_version(db.qa_meta)
+                if qa_index is not None:
+                    # Many Q&As changed: rebuild the index (this also clears cached responses)
+                    qa_index.load()
+        
+        return jsonify({
+            'success': True,
+            'message': f"Imported {result.inserted + result.updated} Q&As",
+            'result': result.to_dict()
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/chatbot/qa/<qa_id>', methods=['DELETE'])
 @token_required
 def delete_qa(qa_id):
@@ -281,6 +576,10 @@ def delete_qa(qa_id):
                 'error': 'Q&A not found'
             }), 404
         
+        if qa_index is not None:
+            qa_index.remove(qa_id)
+        _record_qa_write()
+        
         return jsonify({
             'success': True,
             'message': 'Q&A deleted successfully'
@@ -304,6 +603,8 @@ def update_qa(qa_id):
             }), 500
         
         from bson import ObjectId
+        from pymongo import ReturnDocument
+        from pymongo.errors import DuplicateKeyError
         
         data = request.get_json()
         question = data.get('question', '').strip()
@@ -315,23 +616,40 @@ def update_qa(qa_id):
                 'error': 'At least question or answer must be provided'
             }), 400
         
-        update_data = {'updated_at': datetime.now().isoformat()}
+        update_data = {'updated_at': utc_now()}
         if question:
             update_data['question'] = question
+            update_data['question_key'] = question_key(question)
+            if not update_data['question_key']:
+                return jsonify({
+                    'success': False,
+                    'error': 'Question must contain letters or numbers'
+                }), 400
         if answer:
             update_data['answer'] = answer
         
-        result = qa_collection.update_one(
-            {'_id': ObjectId(qa_id)},
-            {'$set': update_data}
-        )
+        try:
+            updated = qa_collection.find_one_and_update(
+                {'_id': ObjectId(qa_id)},
+                {'$set': update_data},
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            return jsonify({
+                'success': False,
+                'error': 'A similar question already exists'
+            }), 409
         
-        if result.matched_count == 0:
+        if updated is None:
             return jsonify({
                 'success': False,
                 'error': 'Q&A not found'
             }), 404
         
+        if qa_index is not None:
+            qa_index.upsert(updated)
+        _record_qa_write()
+        
         return jsonify({
             'success': True,
             'message': 'Q&A updated successfully'
@@ -0,0 +1,140 @@
+"""
+Offline GeoIP lookups
+Reads a compact binary IP-range database (built by build_geoip_db.py) through
+mmap and answers lookups with a binary search, so resolving a visitor's
+location needs no network call. The file is shared read-only between
+gunicorn workers through the page cache.
+
+File layout (little-endian):
+  header    magic "GEOIPDB1", then uint32 v4_count, v6_count, location_count, blob_size
+  v4 table  v4_count x (uint32 start, uint32 end, uint32 location)      sorted by start
+  v6 table  v6_count x (16-byte start, 16-byte end, uint32 location)    big-endian addresses, sorted
+  locations location_count x (uint32 offset, uint32 length) into the blob
+  blob      UTF-8 "city\\x1fregion\\x1fcountry\\x1fcountry_code" records
+"""
+import ipaddress
+import mmap
+import os
+import struct
+import threading
+
+MAGIC = b'GEOIPDB1'
+HEADER = struct.Struct('<8s4I')
+V4_RECORD = struct.Struct('<3I')
+V6_RECORD = struct.Struct('<16s16sI')
+LOCATION_RECORD = struct.Struct('<2I')
+FIELD_SEPARATOR = '\x1f'
+LOCATION_FIELDS = ('city', 'region', 'country', 'country_code')
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'geoip.bin')
+GEOIP_DB_PATH = os.getenv('GEOIP_DB_PATH', DEFAULT_PATH)
+
+
+class GeoIPDatabase:
+    """Memory-mapped, read-only IP range database"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.v4_count, self.v6_count, self.location_count, blob_size = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path} is not a GeoIP database (bad magic {magic!r})")
+
+        self._v4_offset = HEADER.size
+        self._v6_offset = self._v4_offset + self.v4_count * V4_RECORD.size
+        self._locations_offset = self._v6_offset + self.v6_count * V6_RECORD.size
+        self._blob_offset = self._locations_offset + self.location_count * LOCATION_RECORD.size
+        if self._blob_offset + blob_size > len(self._mm):
+            self._mm.close()
+            raise ValueError(f"{path} is truncated")
+
+        # Decoded locations; real traffic hits a small set of them
+        self._location_cache = {}
+
+    def close(self):
+        self._mm.close()
+
+    def _location(self, index):
+        location = self._location_cache.get(index)
+        if location is None:
+            offset, length = LOCATION_RECORD.unpack_from(self._mm, self._locations_offset + index * LOCATION_RECORD.size)
+            start = self._blob_offset + offset
+            fields = self._mm[start:start + length].decode('utf-8').split(FIELD_SEPARATOR)
+            location = dict(zip(LOCATION_FIELDS, fields))
+            self._location_cache[index] = location
+        return location
+
+    def _search_v4(self, value):
+        # Last range whose start <= value
+        lo, hi = 0, self.v4_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = struct.unpack_from('<I', self._mm, self._v4_offset + mid * V4_RECORD.size)[0]
+            if start <= value:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        start, end, location = V4_RECORD.unpack_from(self._mm, self._v4_offset + (lo - 1) * V4_RECORD.size)
+        return location if value <= end else None
+
+    def _search_v6(self, packed):
+        lo, hi = 0, self.v6_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = self._v6_offset + mid * V6_RECORD.size
+            if self._mm[offset:offset + 16] <= packed:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        start, end, location = V6_RECORD.unpack_from(self._mm, self._v6_offset + (lo - 1) * V6_RECORD.size)
+        return location if packed <= end else None
+
+    def lookup(self, ip_address):
+        """Return a copy of {'city', 'region', 'country', 'country_code'} for an IP, or None"""
+        try:
+            address = ipaddress.ip_address(ip_address.strip())
+        except (ValueError, AttributeError):
+            return None
+
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+
+        if address.version == 4:
+            index = self._search_v4(int(address))
+        else:
+            index = self._search_v6(address.packed)
+
+        if index is None:
+            return None
+        return dict(self._location(index))
+
+
+_database = None
+_database_lock = threading.Lock()
+_database_checked = False
+
+
+def get_geoip_database():
+    """Open the configured GeoIP database once per process (None if the file is missing)"""
+    global _database, _database_checked
+    if _database_checked:
+        return _database
+    with _database_lock:
+        if not _database_checked:
+            if os.path.exists(GEOIP_DB_PATH):
+                try:
+                    _database = GeoIPDatabase(GEOIP_DB_PATH)
+                    print(f"✅ GeoIP database loaded: {_database.v4_count} IPv4 / {_database.v6_count} IPv6 ranges")
+                except Exception as e:
+                    print(f"⚠️ GeoIP database not loaded: {e}")
+            else:
+                print(f"⚠️ GeoIP database not found at {GEOIP_DB_PATH} - run build_geoip_db.py")
+            _database_checked = True
+    return _database
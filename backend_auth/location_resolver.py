@@ -0,0 +1,242 @@
+"""
+Asynchronous IP -> location resolution for analytics
+/api/analytics/track stores events with PENDING_LOCATION instead of waiting
+for a geolocation lookup. LocationResolver then:
+- runs lookups on a bounded thread pool, off the request path
+- merges concurrent lookups of the same IP into one (single flight)
+- caches results with a TTL, failures included (shorter TTL), so a slow or
+  failing source is not asked again for every hit
+Written events are given their location by LocationBackfill
+(analytics_ingest.py) once the lookup finishes. Events left pending by a
+worker that stopped are fixed by the sweep below.
+
+Usage: python backend_auth/location_resolver.py --sweep [--batch-size 500]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# '0' = look locations up on the request path (previous behaviour)
+ASYNC_LOCATION = os.getenv('ANALYTICS_ASYNC_LOCATION', '1') == '1'
+GEO_WORKERS = int(os.getenv('ANALYTICS_GEO_WORKERS', 4))
+GEO_MAX_IN_FLIGHT = int(os.getenv('ANALYTICS_GEO_MAX_IN_FLIGHT', 1000))
+GEO_CACHE_SIZE = int(os.getenv('ANALYTICS_GEO_CACHE_SIZE', 10000))
+GEO_CACHE_TTL_SECONDS = float(os.getenv('ANALYTICS_GEO_CACHE_TTL_SECONDS', 3600))
+GEO_FAILURE_TTL_SECONDS = float(os.getenv('ANALYTICS_GEO_FAILURE_TTL_SECONDS', 300))
+
+# Stored until the lookup finishes; counted under country 'Pending' meanwhile
+PENDING_LOCATION = {
+    'city': 'Pending',
+    'region': 'Pending',
+    'country': 'Pending',
+    'country_code': 'PD',
+    'pending': True
+}
+
+
+def is_pending(location):
+    return bool(location and location.get('pending'))
+
+
+class LocationResolver:
+    """
+    Cached, single-flight location lookups on a bounded thread pool.
+    lookup(ip) returns a location dict, or None when the IP can't be resolved;
+    fallback is cached and handed out for those.
+    """
+
+    def __init__(self, lookup, fallback, workers=GEO_WORKERS, max_in_flight=GEO_MAX_IN_FLIGHT,
+                 cache_size=GEO_CACHE_SIZE, ttl_seconds=GEO_CACHE_TTL_SECONDS,
+                 failure_ttl_seconds=GEO_FAILURE_TTL_SECONDS):
+        self.lookup = lookup
+        self.fallback = fallback
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self.cache_size = cache_size
+        self.ttl_seconds = ttl_seconds
+        self.failure_ttl_seconds = failure_ttl_seconds
+
+        self._cache = OrderedDict()   # ip -> (location, expires_at)
+        self._in_flight = {}          # ip -> [callback]
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+
+        self.hits = 0
+        self.misses = 0
+        self.lookups = 0
+        self.failures = 0
+        self.merged = 0
+        self.rejected = 0
+        self.max_lookup_ms = 0.0
+        self._total_lookup_ms = 0.0
+
+    def _cached(self, ip):
+        now = time.monotonic()
+        with self._lock:
+            item = self._cache.get(ip)
+            if item is None or item[1] <= now:
+                return None
+            self._cache.move_to_end(ip)
+            return dict(item[0])
+
+    def cached(self, ip):
+        """Cached location for ip (a copy), or None; counted as a hit or miss"""
+        location = self._cached(ip)
+        if location is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return location
+
+    def _store(self, ip, location, ttl):
+        with self._lock:
+            self._cache[ip] = (location, time.monotonic() + ttl)
+            self._cache.move_to_end(ip)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _ensure_executor(self):
+        # A forked worker can't use the parent's threads
+        pid = os.getpid()
+        if self._executor_pid != pid:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='geo-lookup')
+            self._executor_pid = pid
+            self._in_flight = {}
+
+    def resolve(self, ip, callback=None):
+        """
+        Start resolving ip in the background; callback(location) runs when it is
+        known (right away on a cache hit). Returns False if the pool is saturated.
+        """
+        location = self._cached(ip)
+        if location is not None:
+            if callback is not None:
+                callback(location)
+            return True
+
+        with self._lock:
+            self._ensure_executor()
+            waiting = self._in_flight.get(ip)
+            if waiting is not None:
+                # Single flight: one lookup per IP, every caller gets its result
+                self.merged += 1
+                if callback is not None:
+                    waiting.append(callback)
+                return True
+            if len(self._in_flight) >= self.max_in_flight:
+                self.rejected += 1
+                return False
+            self._in_flight[ip] = [callback] if callback is not None else []
+            self._executor.submit(self._run, ip)
+        return True
+
+    def get(self, ip):
+        """Resolve ip on the calling thread (cached); never returns None"""
+        location = self.cached(ip)
+        if location is None:
+            location = self._lookup(ip)
+        return dict(location)
+
+    def _lookup(self, ip):
+        start = time.perf_counter()
+        try:
+            location = self.lookup(ip)
+        except Exception as e:
+            print(f"Geolocation error: {e}")
+            location = None
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.lookups += 1
+        self._total_lookup_ms += elapsed_ms
+        self.max_lookup_ms = max(self.max_lookup_ms, elapsed_ms)
+
+        if location is None:
+            self.failures += 1
+            location = dict(self.fallback)
+            self._store(ip, location, self.failure_ttl_seconds)
+        else:
+            self._store(ip, location, self.ttl_seconds)
+        return location
+
+    def _run(self, ip):
+        location = self._lookup(ip)
+        with self._lock:
+            callbacks = self._in_flight.pop(ip, [])
+        for callback in callbacks:
+            try:
+                callback(dict(location))
+            except Exception as e:
+                print(f"Location callback error: {e}")
+
+    def metrics(self):
+        with self._lock:
+            in_flight = len(self._in_flight)
+            cached = len(self._cache)
+        return {
+            'in_flight': in_flight,
+            'cached': cached,
+            'hits': self.hits,
+            'misses': self.misses,
+            'lookups': self.lookups,
+            'failures': self.failures,
+            'merged': self.merged,
+            'rejected': self.rejected,
+            'avg_lookup_ms': round(self._total_lookup_ms / self.lookups, 2) if self.lookups else 0.0,
+            'max_lookup_ms': round(self.max_lookup_ms, 2)
+        }
+
+
+def sweep_pending(db, resolver, backfill, batch_size=500):
+    """
+    Resolve every page view and visitor still stored with a pending location
+    (e.g. left by a worker that stopped before its backfill ran).
+    Returns the number of documents queued for backfill.
+    """
+    queued = 0
+    for collection, key in ((db.page_views, '_id'), (db.visitors, 'visitor_id')):
+        cursor = collection.find(
+            {'location.pending': True},
+            {'_id': 1, 'ip': 1, 'timestamp': 1, 'visitor_id': 1}
+        ).batch_size(batch_size)
+        for doc in cursor:
+            location = resolver.get(doc.get('ip') or '')
+            if key == '_id':
+                backfill.add_page_views([doc], location)
+            else:
+                backfill.add_visitors([doc['visitor_id']], location)
+            queued += 1
+            if queued % batch_size == 0:
+                backfill.flush()
+                print(f"  {queued} documents backfilled...")
+    backfill.flush()
+    return queued
+
+
+if __name__ == '__main__':
+    import argparse
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    from database_architecture.connection import get_database
+    from analytics import UNKNOWN_LOCATION, lookup_location
+    from analytics_ingest import LocationBackfill
+    from analytics_rollups import ROLLUP_COLLECTION, RollupWriter
+
+    parser = argparse.ArgumentParser(description='Resolve analytics events stored with a pending location')
+    parser.add_argument('--sweep', action='store_true', required=True)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    db = get_database()
+    resolver = LocationResolver(lookup_location, UNKNOWN_LOCATION)
+    backfill = LocationBackfill(db.page_views, db.visitors, rollups=RollupWriter(db[ROLLUP_COLLECTION]),
+                                batch_size=args.batch_size)
+    count = sweep_pending(db, resolver, backfill, args.batch_size)
+    backfill.close()
+    print(f"✅ Sweep complete! {count} pending documents, {backfill.written} updated, "
+          f"{resolver.failures} IPs unresolved")
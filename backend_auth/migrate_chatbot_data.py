@@ -1,18 +1,25 @@
 """
 Migration script to move all hardcoded chatbot Q&As to MongoDB
 Run this once to populate the database, then the chatbot will be 100% database-driven
+It also fills in question_key (the normalized question behind the unique
+duplicate-detection index) on documents created before that field existed:
+  python backend_auth/migrate_chatbot_data.py --backfill-keys
 """
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from datetime import datetime
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv(encoding='utf-16')
 
 from database_architecture.connection import get_database
+from database_architecture.indexes import ensure_indexes, print_summary
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from qa_index import bump_version, question_key
+from timestamps import utc_now
 
 # All the Q&As to migrate
 QUESTIONS_TO_MIGRATE = [
@@ -95,6 +102,41 @@ QUESTIONS_TO_MIGRATE = [
     }
 ]
 
+def backfill_question_keys(db):
+    """
+    Set question_key on every Q&A whose key is missing or stale, then make
+    sure the unique index exists. When several questions normalize to the
+    same key only the oldest gets it; the others are listed for cleanup.
+    Returns the number of documents updated.
+    """
+    collection = db.custom_qa
+    owners = {}
+    duplicates = []
+    unsets = []
+    sets = []
+    for doc in collection.find({}, {'question': 1, 'question_key': 1}).sort('_id', 1):
+        key = question_key(doc.get('question'))
+        if key in owners:
+            duplicates.append((doc['_id'], doc.get('question'), owners[key]))
+            if 'question_key' in doc:
+                unsets.append(UpdateOne({'_id': doc['_id']}, {'$unset': {'question_key': ''}}))
+            continue
+        owners[key] = doc['_id']
+        if doc.get('question_key') != key:
+            sets.append(UpdateOne({'_id': doc['_id']}, {'$set': {'question_key': key}}))
+    
+    # Unsets first so a key can move from a newer document to the oldest one
+    operations = unsets + sets
+    updated = 0
+    if operations:
+        updated = collection.bulk_write(operations, ordered=True).modified_count
+    
+    print_summary(ensure_indexes(db, ['custom_qa']))
+    print(f"✅ question_key backfilled on {updated} Q&As")
+    for qa_id, question, owner in duplicates:
+        print(f"  ⚠️ Duplicate of {owner}, left without a key: {qa_id} {question[:40] if question else ''}")
+    return updated
+
 def migrate_data():
     """Migrate all hardcoded Q&As to MongoDB"""
     try:
@@ -104,33 +146,36 @@ def migrate_data():
         print("Starting migration...")
         print(f"Total Q&As to migrate: {len(QUESTIONS_TO_MIGRATE)}")
         
+        # Existing documents need their key for duplicate detection below
+        backfill_question_keys(db)
+        
         added = 0
         skipped = 0
         
         for qa in QUESTIONS_TO_MIGRATE:
-            # Check if similar question already exists
-            existing = collection.find_one({
-                'question': {'$regex': f"^{qa['question']}$", '$options': 'i'}
-            })
-            
-            if existing:
-                print(f"  Skipped (already exists): {qa['question'][:40]}...")
-                skipped += 1
-                continue
-            
-            # Insert new Q&A
+            # Insert new Q&A; the unique question_key index rejects duplicates
             new_qa = {
                 'question': qa['question'],
+                'question_key': question_key(qa['question']),
                 'answer': qa['answer'],
-                'created_at': datetime.now().isoformat(),
-                'updated_at': datetime.now().isoformat(),
+                'created_at': utc_now(),
+                'updated_at': utc_now(),
                 'is_default': True  # Mark as default Q&A
             }
             
-            collection.insert_one(new_qa)
+            try:
+                collection.insert_one(new_qa)
+            except DuplicateKeyError:
+                print(f"  Skipped (already exists): {qa['question'][:40]}...")
+                skipped += 1
+                continue
             print(f"  Added: {qa['question'][:40]}...")
             added += 1
         
+        if added:
+            # Running chatbot workers reload their Q&A index on the next poll
+            bump_version(db.qa_meta)
+        
         print(f"\n✅ Migration complete!")
         print(f"   Added: {added}")
         print(f"   Skipped: {skipped}")
@@ -141,4 +186,7 @@ def migrate_data():
         raise
 
 if __name__ == '__main__':
-    migrate_data()
+    if '--backfill-keys' in sys.argv[1:]:
+        backfill_question_keys(get_database())
+    else:
+        migrate_data()
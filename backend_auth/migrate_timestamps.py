@@ -0,0 +1,139 @@
+"""
+Convert legacy ISO-string timestamps to native UTC datetimes
+Older documents stored timestamps as datetime.now().isoformat() strings in
+server local time. This walks each collection in _id order, converts the
+string fields in small batches (pausing between them so it can run against
+the live database) and saves its position in the migrations collection, so
+an interrupted run resumes where it stopped.
+
+Rebuild the analytics rollups afterwards (analytics_rollups.py --rebuild):
+their hour/day buckets become UTC as well.
+
+Usage: python backend_auth/migrate_timestamps.py [--batch-size 500] [--pause 0.2] [--assume-utc] [--restart]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+from timestamps import parse_timestamp, utc_now
+
+# collection -> fields holding timestamps
+TIMESTAMP_FIELDS = {
+    'page_views': ['timestamp', 'session_start'],
+    'visitors': ['first_visit', 'last_visit'],
+    'custom_qa': ['created_at', 'updated_at'],
+    'users': ['created_at', 'updated_at'],
+}
+CHECKPOINT_COLLECTION = 'migrations'
+
+
+def migrate_collection(db, name, fields, batch_size=500, pause=0.2, assume_utc=False, restart=False):
+    """Convert one collection; returns the number of documents updated in this run"""
+    collection = db[name]
+    checkpoints = db[CHECKPOINT_COLLECTION]
+    checkpoint_id = f'timestamps:{name}'
+
+    if restart:
+        checkpoints.delete_one({'_id': checkpoint_id})
+    checkpoint = checkpoints.find_one({'_id': checkpoint_id}) or {}
+    if checkpoint.get('done'):
+        print(f"  {name}: already converted (use --restart to scan again)")
+        return 0
+
+    last_id = checkpoint.get('last_id')
+    if last_id is not None:
+        print(f"  {name}: resuming after {last_id}")
+
+    legacy = {'$or': [{field: {'$type': 'string'}} for field in fields]}
+    updated = 0
+    unparseable = 0
+    while True:
+        query = dict(legacy)
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+        batch = list(collection.find(query, {field: 1 for field in fields}).sort('_id', 1).limit(batch_size))
+        if not batch:
+            break
+
+        operations = []
+        for doc in batch:
+            changes = {}
+            for field in fields:
+                value = doc.get(field)
+                if not isinstance(value, str):
+                    continue
+                parsed = parse_timestamp(value, assume_utc)
+                if parsed is None:
+                    unparseable += 1
+                    continue
+                changes[field] = parsed
+            if changes:
+                # Skip the document if a live write replaced the string meanwhile
+                match = {'_id': doc['_id']}
+                match.update({field: doc[field] for field in changes})
+                operations.append(UpdateOne(match, {'$set': changes}))
+
+        if operations:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+
+        last_id = batch[-1]['_id']
+        checkpoints.update_one(
+            {'_id': checkpoint_id},
+            {'$set': {'last_id': last_id, 'updated_at': utc_now()}},
+            upsert=True
+        )
+        print(f"  {name}: {updated} documents converted...")
+
+        if len(batch) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    checkpoints.update_one(
+        {'_id': checkpoint_id},
+        {'$set': {'done': True, 'updated_at': utc_now()}},
+        upsert=True
+    )
+    if unparseable:
+        print(f"  ⚠️ {name}: {unparseable} values could not be parsed and were left as strings")
+    return updated
+
+
+def migrate_timestamps(batch_size=500, pause=0.2, assume_utc=False, restart=False, collections=None):
+    from database_architecture.connection import get_database
+
+    db = get_database()
+    total = 0
+    for name, fields in TIMESTAMP_FIELDS.items():
+        if collections and name not in collections:
+            continue
+        total += migrate_collection(db, name, fields, batch_size, pause, assume_utc, restart)
+    print(f"\n✅ Timestamp migration complete! Documents converted: {total}")
+    if total and (not collections or {'page_views', 'visitors'} & set(collections)):
+        print("   Now rebuild the analytics rollups: python backend_auth/analytics_rollups.py --rebuild")
+
+
+if __name__ == '__main__':
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='Convert ISO-string timestamps to UTC datetimes')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--pause', type=float, default=0.2, help='seconds to sleep between batches')
+    parser.add_argument('--assume-utc', action='store_true',
+                        help='treat strings without an offset as UTC instead of server local time')
+    parser.add_argument('--restart', action='store_true', help='ignore saved progress and scan from the start')
+    parser.add_argument('--collection', action='append', choices=sorted(TIMESTAMP_FIELDS),
+                        help='only convert this collection (repeatable)')
+    args = parser.parse_args()
+
+    try:
+        migrate_timestamps(args.batch_size, args.pause, args.assume_utc, args.restart, args.collection)
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,166 @@
+"""
+Aho-Corasick phrase matcher
+Compiles many phrases into one automaton so every phrase contained in a
+message is found in a single left-to-right pass, whatever the number of phrases.
+Used by the chatbot for the exact phrase pass over stored questions.
+"""
+
+# Transition keys pack (state, character) into one int: state << 21 | ord(ch)
+_CHAR_BITS = 21
+
+
+class PhraseMatcher:
+    """
+    Multi-pattern substring matcher.
+    phrases is an iterable of (phrase, value) pairs in priority order.
+    best() prefers the longest contained phrase and, between phrases of the
+    same length, the one added first.
+    """
+
+    def __init__(self, phrases=()):
+        self._goto = {}         # packed (state, char) -> state
+        self._fail = [0]        # failure link per state
+        self._own = [-1]        # pattern ending exactly at this state (first added wins)
+        self._best = [-1]       # best pattern ending here, following failure links
+        self._out_link = [0]    # next state on the failure chain that ends a pattern
+        self._lengths = []      # phrase length per pattern
+        self._ranks = []        # comparable rank per pattern (length first, then order)
+        self._values = []
+
+        children = [[]]
+        for phrase, value in phrases:
+            if not phrase:
+                continue
+            self._add(phrase, value, children)
+        self._build(children)
+
+    def __len__(self):
+        return len(self._values)
+
+    def to_arrays(self):
+        """
+        Flat tables for a serialized copy (see qa_index_file.py):
+        sorted transition keys, their target states, failure links, best
+        pattern per state, rank per pattern and value per pattern
+        """
+        transitions = sorted(self._goto.items())
+        return {
+            'keys': [key for key, _ in transitions],
+            'targets': [target for _, target in transitions],
+            'fail': list(self._fail),
+            'best': list(self._best),
+            'ranks': list(self._ranks),
+            'values': list(self._values),
+        }
+
+    def _add(self, phrase, value, children):
+        goto = self._goto
+        state = 0
+        for ch in phrase:
+            key = (state << _CHAR_BITS) | ord(ch)
+            nxt = goto.get(key)
+            if nxt is None:
+                nxt = len(self._fail)
+                goto[key] = nxt
+                children[state].append(ord(ch))
+                children.append([])
+                self._fail.append(0)
+                self._own.append(-1)
+                self._best.append(-1)
+                self._out_link.append(0)
+            state = nxt
+
+        pattern = len(self._values)
+        self._values.append(value)
+        self._lengths.append(len(phrase))
+        if self._own[state] < 0:
+            self._own[state] = pattern
+
+    def _build(self, children):
+        # Rank: longer phrases win, then earlier phrases (lower index)
+        count = len(self._values)
+        self._ranks = [length * (count + 1) + (count - i) for i, length in enumerate(self._lengths)]
+
+        goto, fail, own, best, out_link = self._goto, self._fail, self._own, self._best, self._out_link
+        queue = []
+        for c in children[0]:
+            child = goto[c]
+            queue.append(child)
+            best[child] = own[child]
+
+        # Breadth-first so every failure target is finished before it is used
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for c in children[state]:
+                child = goto[(state << _CHAR_BITS) | c]
+                queue.append(child)
+
+                f = fail[state]
+                while True:
+                    target = goto.get((f << _CHAR_BITS) | c)
+                    if target is not None or f == 0:
+                        break
+                    f = fail[f]
+                fail[child] = target if target is not None and target != child else 0
+
+                f = fail[child]
+                out_link[child] = f if own[f] >= 0 else out_link[f]
+                best[child] = self._better(own[child], best[f])
+
+    def _better(self, a, b):
+        if a < 0:
+            return b
+        if b < 0:
+            return a
+        return a if self._ranks[a] > self._ranks[b] else b
+
+    def _step(self, state, c):
+        goto, fail = self._goto, self._fail
+        while True:
+            nxt = goto.get((state << _CHAR_BITS) | c)
+            if nxt is not None:
+                return nxt
+            if state == 0:
+                return 0
+            state = fail[state]
+
+    def find_all(self, text):
+        """Return every (start, end, value) for phrases contained in text"""
+        matches = []
+        own, out_link = self._own, self._out_link
+        state = 0
+        for pos, ch in enumerate(text):
+            state = self._step(state, ord(ch))
+            s = state if own[state] >= 0 else out_link[state]
+            while s:
+                pattern = own[s]
+                matches.append((pos + 1 - self._lengths[pattern], pos + 1, self._values[pattern]))
+                s = out_link[s]
+        return matches
+
+    def best(self, text):
+        """Return the value of the longest phrase contained in text, or None"""
+        if not self._values:
+            return None
+        goto, fail, best, ranks = self._goto, self._fail, self._best, self._ranks
+        found = -1
+        found_rank = -1
+        state = 0
+        for ch in text:
+            # Inlined _step(): this loop is the hot path
+            c = ord(ch)
+            while True:
+                nxt = goto.get((state << _CHAR_BITS) | c)
+                if nxt is not None:
+                    state = nxt
+                    break
+                if state == 0:
+                    break
+                state = fail[state]
+            pattern = best[state]
+            if pattern >= 0 and ranks[pattern] > found_rank:
+                found = pattern
+                found_rank = ranks[pattern]
+        return self._values[found] if found >= 0 else None
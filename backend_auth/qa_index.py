@@ -0,0 +1,561 @@
+"""
+In-memory Q&A index for the chatbot
+Keeps the custom_qa collection inside the process so answering a message
+never touches MongoDB:
+- an Aho-Corasick automaton over lowercased questions for the exact phrase pass
+- a BM25 term-document matrix for the keyword pass (see qa_scoring.py)
+- keyword lists, question lengths and keyword postings (keyword -> Q&A ids)
+  for the legacy "ratio" scorer, kept as a compatibility mode
+The index is patched in place by the Q&A CRUD routes and fully reloaded when
+the version counter stored in MongoDB moves (e.g. a write from another worker).
+
+SharedQAIndex keeps the same matchers in a compiled file per version that
+all worker processes memory-map instead (see qa_index_file.py).
+"""
+import os
+import re
+import threading
+import time
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from phrase_matcher import PhraseMatcher
+from qa_scoring import HAS_NUMPY, BM25Scorer, MIN_TOKEN_LENGTH, PrunedBM25Scorer, tokenize
+from qa_index_file import (
+    DEFAULT_DIR, MappedQAIndexFile, build_lock, index_path, prune_index_files, write_index_file
+)
+from trigram_index import TrigramIndex
+
+# Keyword pass scorer: 'bm25' (default) or 'ratio' (legacy substring keyword ratio)
+SCORER = os.getenv('CHATBOT_SCORER', 'bm25').lower()
+
+# Minimum normalized score for a keyword match to be answered
+MIN_SCORE = float(os.getenv('CHATBOT_MIN_SCORE', 0.5))
+
+# Corpus size from which the BM25 pass only scores candidate questions
+# (same answers, see PrunedBM25Scorer; needs NumPy)
+PRUNE_MIN_ENTRIES = int(os.getenv('CHATBOT_PRUNE_MIN_ENTRIES', 50000))
+
+# Retry unmatched messages with misspelled words corrected ('0' = off)
+FUZZY = os.getenv('CHATBOT_FUZZY', '1') == '1'
+
+# How often (seconds) each process checks the MongoDB version counter
+POLL_INTERVAL_SECONDS = float(os.getenv('CHATBOT_INDEX_POLL_SECONDS', 5))
+
+# Share one memory-mapped index file between worker processes ('0' = per-process index)
+SHARED_INDEX = os.getenv('CHATBOT_SHARED_INDEX', '1') == '1'
+SHARED_INDEX_DIR = os.getenv('CHATBOT_INDEX_DIR', DEFAULT_DIR)
+
+# Document in the meta collection that holds the custom_qa version counter
+VERSION_DOC_ID = 'custom_qa'
+
+
+_APOSTROPHE_RE = re.compile(r"['\u2019]")
+_PUNCTUATION_RE = re.compile(r'[^\w\s]|_')
+
+
+def normalize_text(text):
+    """Fold case, punctuation and whitespace ("What's up?!" -> "whats up")"""
+    text = _APOSTROPHE_RE.sub('', text.lower())
+    return ' '.join(_PUNCTUATION_RE.sub(' ', text).split())
+
+
+def question_key(question):
+    """Stored duplicate-detection key of a question (unique index on custom_qa.question_key)"""
+    return normalize_text(question or '')
+
+
+def fill_missing_question_keys(collection):
+    """
+    Give question_key to Q&As stored without one (the unique index skips
+    them, so they would never be detected as duplicates), oldest first.
+    A key already taken is left unset. Returns (filled, duplicate ids).
+    """
+    filled = 0
+    duplicates = []
+    for doc in collection.find({'question_key': {'$exists': False}}, {'question': 1}).sort('_id', 1):
+        key = question_key(doc.get('question'))
+        if not key:
+            continue
+        try:
+            result = collection.update_one(
+                {'_id': doc['_id'], 'question_key': {'$exists': False}},
+                {'$set': {'question_key': key}}
+            )
+            filled += result.modified_count
+        except DuplicateKeyError:
+            duplicates.append(doc['_id'])
+    return filled, duplicates
+
+
+def extract_keywords(question_text):
+    """Keywords used by the keyword pass (words longer than 2 characters)"""
+    return [w for w in question_text.split() if len(w) > 2]
+
+
+def read_version(meta_collection):
+    """Read the current custom_qa version counter (0 if never written)"""
+    doc = meta_collection.find_one({'_id': VERSION_DOC_ID})
+    return doc.get('version', 0) if doc else 0
+
+
+def read_version_info(meta_collection):
+    """
+    (version, epoch) of the custom_qa counter. The epoch is a random tag set
+    when the counter document is created, so index files compiled for another
+    database (or before a reset) never match the same version number.
+    """
+    doc = meta_collection.find_one({'_id': VERSION_DOC_ID})
+    if doc is None or 'epoch' not in doc:
+        try:
+            meta_collection.update_one(
+                {'_id': VERSION_DOC_ID, 'epoch': {'$exists': False}},
+                {'$set': {'epoch': os.urandom(6).hex()}, '$setOnInsert': {'version': 0}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # another process set it first
+        doc = meta_collection.find_one({'_id': VERSION_DOC_ID})
+    return doc.get('version', 0), doc['epoch']
+
+
+def bump_version(meta_collection):
+    """Increment the custom_qa version counter and return the new value"""
+    doc = meta_collection.find_one_and_update(
+        {'_id': VERSION_DOC_ID},
+        {'$inc': {'version': 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc['version']
+
+
+def should_prune(entry_count):
+    """True when the BM25 pass should only score candidate questions"""
+    return HAS_NUMPY and entry_count >= PRUNE_MIN_ENTRIES
+
+
+def pruned_scorer(bm25, min_score):
+    """PrunedBM25Scorer over bm25 for large corpora, else bm25 itself"""
+    if should_prune(len(bm25)):
+        return PrunedBM25Scorer(bm25, min_score)
+    return bm25
+
+
+def snapshot_data(version, scorer, min_score, entries, bm25=None):
+    """
+    Plain-data copy of the matchers for clients that answer locally:
+    normalized questions and answers in priority order, plus the BM25
+    postings (term -> [entry positions, weights]) and self-scores
+    """
+    entries = list(entries)
+    data = {
+        'version': version,
+        'scorer': scorer,
+        'min_score': min_score,
+        'min_token_length': MIN_TOKEN_LENGTH,
+        'questions': [entry['question'] for entry in entries],
+        'answers': [entry['answer'] for entry in entries]
+    }
+    if bm25 is not None:
+        data['terms'] = {term: [positions, weights] for term, positions, weights in bm25.rows()}
+        data['self_scores'] = [float(score) for score in bm25.self_scores]
+    return data
+
+
+class _IndexState:
+    """
+    Entries and matchers of a QAIndex at one point in time. Never modified
+    after it is built: writes build a new one and swap the reference, so a
+    match() reads a consistent state without taking a lock.
+    """
+
+    def __init__(self, entries, next_seq, scorer, min_score, fuzzy):
+        self.entries = entries   # qa_id -> entry, in _id (insertion) order
+        self.next_seq = next_seq
+        self.postings = {}       # keyword -> {qa_id: occurrences}
+        for entry in entries.values():
+            for keyword in entry['keywords']:
+                posting = self.postings.setdefault(keyword, {})
+                posting[entry['id']] = posting.get(entry['id'], 0) + 1
+        # Entries are in seq order, so ties resolve to the oldest Q&A
+        self.phrases = PhraseMatcher((entry['question'], entry['id']) for entry in entries.values())
+        self.bm25 = BM25Scorer([])
+        self.keyword_scorer = self.bm25   # bm25, or its pruned wrapper on large corpora
+        if scorer == 'bm25':
+            # IDF depends on the whole corpus, so the matrix is rebuilt rather than patched
+            self.bm25 = BM25Scorer([(entry['id'], entry['terms']) for entry in entries.values()])
+            self.keyword_scorer = pruned_scorer(self.bm25, min_score)
+        self.fuzzy = None   # TrigramIndex over question words when fuzzy
+        if fuzzy and entries:
+            self.fuzzy = TrigramIndex(term for entry in entries.values() for term in entry['terms'])
+
+
+class QAIndex:
+    """
+    Process-local index over the custom_qa collection.
+    Matching reads the current _IndexState without locking; writes (reload,
+    upsert, remove) are serialized by _lock and publish a new state.
+    """
+
+    def __init__(self, collection, meta_collection, poll_interval=POLL_INTERVAL_SECONDS,
+                 scorer=SCORER, min_score=MIN_SCORE, fuzzy=FUZZY):
+        if scorer not in ('bm25', 'ratio'):
+            raise ValueError(f"Unknown chatbot scorer '{scorer}' (expected 'bm25' or 'ratio')")
+        self.collection = collection
+        self.meta_collection = meta_collection
+        self.poll_interval = poll_interval
+        self.scorer = scorer
+        self.min_score = min_score
+        self.fuzzy = fuzzy
+        self.version = None
+        self.epoch = None     # tag of the version counter (see read_version_info)
+        self.loaded_at = None
+        self._state = self._build_state({}, 0)
+        self._lock = threading.RLock()   # writers only
+        self._poller_lock = threading.Lock()
+        self._poller_pid = None
+        self._reload_listeners = []
+
+    # ---------- building ----------
+
+    def _make_entry(self, doc, seq):
+        question_text = normalize_text(doc.get('question', ''))
+        keywords = extract_keywords(question_text)
+        return {
+            'id': str(doc['_id']),
+            'seq': seq,
+            'question': question_text,
+            'answer': doc.get('answer', ''),
+            'keywords': keywords,
+            'length': len(keywords),
+            'terms': tokenize(question_text)
+        }
+
+    def _build_state(self, entries, next_seq):
+        return _IndexState(entries, next_seq, self.scorer, self.min_score, self.fuzzy)
+
+    def load(self):
+        """Rebuild the whole index from MongoDB"""
+        version, epoch = read_version_info(self.meta_collection)
+        docs = list(self.collection.find({}, {'question': 1, 'answer': 1}).sort('_id', 1))
+
+        entries = {}
+        for seq, doc in enumerate(docs):
+            entry = self._make_entry(doc, seq)
+            entries[entry['id']] = entry
+        state = self._build_state(entries, len(docs))
+
+        with self._lock:
+            self._state = state
+            self.version = version
+            self.epoch = epoch
+            self.loaded_at = time.time()
+
+        print(f"✅ Chatbot Q&A index loaded: {len(docs)} entries (version {version})")
+        for listener in self._reload_listeners:
+            listener()
+        return len(docs)
+
+    def on_reload(self, listener):
+        """Call listener() after every full reload (e.g. to clear response caches)"""
+        self._reload_listeners.append(listener)
+
+    def upsert(self, doc):
+        """
+        Add or replace a single Q&A after a local write. The matchers are
+        rebuilt from the entries (BM25 weights and the automaton's failure
+        links depend on every question); matches keep using the old state
+        until the new one is swapped in.
+        """
+        with self._lock:
+            state = self._state
+            qa_id = str(doc['_id'])
+            old = state.entries.get(qa_id)
+            next_seq = state.next_seq
+            if old is not None:
+                # Keep the original position so tie-breaking stays stable
+                entry = self._make_entry(doc, old['seq'])
+            else:
+                entry = self._make_entry(doc, next_seq)
+                next_seq += 1
+            entries = dict(state.entries)
+            entries[qa_id] = entry
+            self._state = self._build_state(entries, next_seq)
+
+    def remove(self, qa_id):
+        """Drop a single Q&A after a local delete"""
+        with self._lock:
+            state = self._state
+            if str(qa_id) not in state.entries:
+                return
+            entries = dict(state.entries)
+            del entries[str(qa_id)]
+            self._state = self._build_state(entries, state.next_seq)
+
+    def note_write(self, new_version):
+        """
+        Record the version produced by a local write.
+        If another process wrote in between, leave the index marked stale
+        so the poller reloads it instead of skipping that write.
+        """
+        with self._lock:
+            if self.version is not None and new_version == self.version + 1:
+                self.version = new_version
+            else:
+                self.version = None
+
+    # ---------- staleness ----------
+
+    def refresh_if_stale(self):
+        """Reload when the MongoDB version counter differs from ours"""
+        try:
+            if self.version is None or read_version(self.meta_collection) != self.version:
+                self.load()
+                return True
+        except Exception as e:
+            print(f"Chatbot index refresh error: {e}")
+        return False
+
+    def _poll_loop(self):
+        while True:
+            time.sleep(self.poll_interval)
+            self.refresh_if_stale()
+
+    def ensure_poller(self):
+        """Start the version poller once per process (restarted after fork)"""
+        pid = os.getpid()
+        if self._poller_pid == pid:
+            return
+        # Not _lock: the first match must not wait for a write in progress
+        with self._poller_lock:
+            if self._poller_pid == pid:
+                return
+            self._poller_pid = pid
+            thread = threading.Thread(target=self._poll_loop, name='qa-index-poller', daemon=True)
+            thread.start()
+
+    # ---------- matching ----------
+
+    def __len__(self):
+        return len(self._state.entries)
+
+    def get(self, qa_id):
+        """Return the indexed entry for qa_id, or None"""
+        return self._state.entries.get(str(qa_id))
+
+    def snapshot(self):
+        """Matcher data for client-side answering (see snapshot_data)"""
+        with self._lock:
+            state, version = self._state, self.version
+        return snapshot_data(version, self.scorer, self.min_score, state.entries.values(),
+                             state.bm25 if self.scorer == 'bm25' else None)
+
+    def match(self, message_key):
+        """
+        Return (answer, qa_id) for the best Q&A, or None.
+        message_key should already be normalized with normalize_text().
+        The longest stored question contained in the message wins (oldest
+        first on ties), otherwise the best keyword score of at least min_score.
+        Messages that match nothing are tried again with misspelled words
+        replaced by the closest question words.
+        """
+        self.ensure_poller()
+        return self._match_state(self._state, message_key)
+
+    def _match_state(self, state, message_key):
+        result = self._match_key(state, message_key)
+        if result is None and state.fuzzy is not None:
+            corrected = state.fuzzy.correct_text(message_key)
+            if corrected != message_key:
+                result = self._match_key(state, corrected)
+        return result
+
+    def _match_key(self, state, message_key):
+        if not state.entries:
+            return None
+
+        # Exact phrase match (highest priority), one pass over the message
+        qa_id = state.phrases.best(message_key)
+        if qa_id is not None:
+            entry = state.entries[qa_id]
+            return entry['answer'], entry['id']
+
+        if self.scorer == 'bm25':
+            result = state.keyword_scorer.best(tokenize(message_key), self.min_score)
+            if result is None:
+                return None
+            entry = state.entries[result[0]]
+            return entry['answer'], entry['id']
+
+        return self._ratio_match(state, message_key)
+
+    def match_many(self, message_keys):
+        """match() for each normalized message, all against the same index state"""
+        self.ensure_poller()
+        state = self._state
+        return [self._match_state(state, message_key) for message_key in message_keys]
+
+    def _ratio_match(self, state, message_key):
+        """Legacy scorer: share of question keywords found anywhere in the message"""
+        # Each distinct keyword is tested once, then its postings
+        # credit every Q&A that contains it
+        counts = {}
+        for keyword, posting in state.postings.items():
+            if keyword in message_key:
+                for qa_id, occurrences in posting.items():
+                    counts[qa_id] = counts.get(qa_id, 0) + occurrences
+
+        best = None
+        best_key = None
+        for qa_id, matching_count in counts.items():
+            entry = state.entries[qa_id]
+            key = (matching_count / entry['length'], -entry['seq'])
+            if best_key is None or key > best_key:
+                best_key = key
+                best = entry
+
+        if best is not None and best_key[0] >= self.min_score:
+            return best['answer'], best['id']
+        return None
+
+
+class SharedQAIndex(QAIndex):
+    """
+    QAIndex whose matchers live in a compiled, memory-mapped file per
+    custom_qa version, shared by every worker process.
+    Local writes don't patch anything in place: the version they produce is
+    compiled right away by the writing worker, and the other workers map
+    that file on their next poll. Each match() uses one mapping from start
+    to finish, so switching versions never affects a request in flight.
+    """
+
+    def __init__(self, collection, meta_collection, directory=SHARED_INDEX_DIR, keep_files=3, **kwargs):
+        super().__init__(collection, meta_collection, **kwargs)
+        self.directory = directory
+        self.keep_files = keep_files
+        self.path = None
+        self._file = None
+
+    def _build(self, path, version):
+        docs = self.collection.find({}, {'question': 1, 'answer': 1}).sort('_id', 1)
+        entries = [self._make_entry(doc, seq) for seq, doc in enumerate(docs)]
+        # Pruning tables go into the file, so workers map them instead of each building a copy
+        prune = self.scorer == 'bm25' and should_prune(len(entries))
+        write_index_file(path, version, entries, prune_min_score=self.min_score if prune else None,
+                         fuzzy=self.fuzzy)
+
+    def _switch_to(self, version, epoch):
+        """Map the file for a version (compiling it first if no worker has yet)"""
+        path = index_path(self.directory, epoch, version)
+        if not os.path.exists(path):
+            with build_lock(self.directory):
+                if not os.path.exists(path):
+                    self._build(path, version)
+        mapped = MappedQAIndexFile(path)
+        if self.scorer == 'bm25' and getattr(mapped.keyword_scorer, 'min_score', self.min_score) != self.min_score:
+            # Compiled by a worker with another CHATBOT_MIN_SCORE: its tables don't apply here
+            mapped.keyword_scorer = pruned_scorer(mapped.bm25, self.min_score)
+        if not self.fuzzy:
+            mapped.fuzzy = None
+        elif mapped.fuzzy is None and len(mapped.terms):
+            # Compiled by a worker without fuzzy matching
+            mapped.fuzzy = TrigramIndex(term for term, _ in mapped.terms.items())
+        with self._lock:
+            # Atomic switch: running matches keep their reference to the old mapping
+            self._file = mapped
+            self.path = path
+            self.version = version
+            self.epoch = epoch
+            self.loaded_at = time.time()
+        prune_index_files(self.directory, self.keep_files, path)
+        return mapped
+
+    def load(self):
+        """Map the compiled file for the current version"""
+        version, epoch = read_version_info(self.meta_collection)
+        mapped = self._switch_to(version, epoch)
+        print(f"✅ Chatbot Q&A index mapped: {len(mapped)} entries (version {version}, {self.path})")
+        for listener in self._reload_listeners:
+            listener()
+        return len(mapped)
+
+    def upsert(self, doc):
+        """No-op: the file compiled in note_write() includes the write"""
+
+    def remove(self, qa_id):
+        """No-op: the file compiled in note_write() includes the delete"""
+
+    def note_write(self, new_version):
+        """Compile and switch to the version produced by a local write"""
+        try:
+            _, epoch = read_version_info(self.meta_collection)
+            self._switch_to(new_version, epoch)
+        except Exception as e:
+            print(f"Chatbot index compile error: {e}")
+            with self._lock:
+                self.version = None
+
+    def __len__(self):
+        mapped = self._file
+        return len(mapped) if mapped is not None else 0
+
+    def get(self, qa_id):
+        mapped = self._file
+        return mapped.find(qa_id) if mapped is not None else None
+
+    def snapshot(self):
+        mapped = self._file
+        if mapped is None:
+            return snapshot_data(self.version, self.scorer, self.min_score, [])
+        return snapshot_data(mapped.version, self.scorer, self.min_score,
+                             (mapped.entry(position) for position in range(len(mapped))),
+                             mapped.bm25 if self.scorer == 'bm25' else None)
+
+    def match(self, message_key):
+        self.ensure_poller()
+        return self._mapped_match(self._file, message_key)
+
+    def match_many(self, message_keys):
+        self.ensure_poller()
+        mapped = self._file
+        return [self._mapped_match(mapped, message_key) for message_key in message_keys]
+
+    def _mapped_match(self, mapped, message_key):
+        result = self._mapped_match_key(mapped, message_key)
+        if result is None and mapped is not None and mapped.fuzzy is not None:
+            corrected = mapped.fuzzy.correct_text(message_key)
+            if corrected != message_key:
+                result = self._mapped_match_key(mapped, corrected)
+        return result
+
+    def _mapped_match_key(self, mapped, message_key):
+        if mapped is None or not len(mapped):
+            return None
+
+        # Exact phrase match (highest priority), one pass over the message
+        position = mapped.phrases.best(message_key)
+        if position is None:
+            if self.scorer == 'bm25':
+                result = mapped.keyword_scorer.best(tokenize(message_key), self.min_score)
+                position = result[0] if result is not None else None
+            else:
+                position = self._mapped_ratio_match(mapped, message_key)
+            if position is None:
+                return None
+
+        entry = mapped.entry(position)
+        return entry['answer'], entry['id']
+
+    def _mapped_ratio_match(self, mapped, message_key):
+        best = None
+        best_key = None
+        for position, matching_count in mapped.ratio_counts(message_key).items():
+            key = (matching_count / mapped.keyword_count(position), -position)
+            if best_key is None or key > best_key:
+                best_key = key
+                best = position
+        if best is not None and best_key[0] >= self.min_score:
+            return best
+        return None
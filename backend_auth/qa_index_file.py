@@ -0,0 +1,491 @@
+"""
+Compiled, memory-mapped chatbot index
+The Q&A matchers (phrase automaton, BM25 matrix and its pruning tables,
+keyword postings, typo-correction trigrams) and the answers are written once per custom_qa version to
+a read-only binary file.
+Every gunicorn worker maps the same file, so the index lives once in the
+page cache however many workers run. A new version is a new file: workers
+switch by swapping their reference, and requests already running finish
+on the old mapping.
+
+File layout (little-endian):
+  header     magic "QAIDX003", uint64 version, uint32 entry_count, uint32 section_count
+  directory  section_count x (uint64 offset, uint64 length), in SECTIONS order
+  sections   fixed-width tables (uint32 / int32 / int64 / float64) and one UTF-8 blob
+             strings are (uint32 offset, uint32 length) into the blob; string
+             tables used for lookups are sorted by their UTF-8 bytes
+
+Usage: python backend_auth/qa_index_file.py [--dir backend_auth/data/qa_index]
+"""
+import bisect
+import glob
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from phrase_matcher import PhraseMatcher, _CHAR_BITS
+from qa_scoring import BM25Scorer, HAS_NUMPY, PrunedBM25Scorer
+from trigram_index import TrigramIndex
+
+if HAS_NUMPY:
+    import numpy as np
+
+# File lock so only one worker compiles a given version (POSIX only; elsewhere
+# concurrent builds just write identical files)
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+# Bumped with every layout change; it is part of the file name, so files of
+# another layout are never opened (and are pruned like old versions)
+FORMAT_VERSION = 3
+MAGIC = b'QAIDX%03d' % FORMAT_VERSION
+HEADER = struct.Struct('<8sQII')
+SECTION = struct.Struct('<QQ')
+ENTRY = struct.Struct('<7I')     # id, question, answer as (offset, length), keyword count
+STRING = struct.Struct('<2I')
+
+# (name, array typecode); typecode None = raw bytes
+SECTIONS = (
+    ('entries', None), ('ids_sorted', 'I'), ('blob', None),
+    ('ac_keys', 'q'), ('ac_targets', 'i'), ('ac_fail', 'i'), ('ac_best', 'i'),
+    ('ac_ranks', 'q'), ('ac_values', 'i'),
+    ('terms', None), ('bm25_indptr', 'q'), ('bm25_indices', 'i'),
+    ('bm25_weights', 'd'), ('bm25_self_scores', 'd'),
+    ('keywords', None), ('keyword_indptr', 'q'), ('keyword_entries', 'i'), ('keyword_counts', 'i'),
+    # PrunedBM25Scorer tables; empty when the index was written without pruning
+    ('prune_min_score', 'd'), ('prune_doc_indptr', 'q'), ('prune_doc_terms', 'q'),
+    ('prune_doc_weights', 'd'), ('prune_prefix_indptr', 'q'), ('prune_prefix_documents', 'q'),
+    # TrigramIndex postings over the terms (word index = term row), sorted by
+    # (trigram code, trigram count); empty without fuzzy
+    ('trigram_codes', 'q'), ('trigram_sizes', 'i'), ('trigram_indptr', 'q'), ('trigram_words', 'i'),
+)
+_NUMPY_TYPES = {'I': '<u4', 'i': '<i4', 'q': '<i8', 'd': '<f8'}
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'qa_index')
+
+
+def index_path(directory, epoch, version):
+    return os.path.join(directory, f'qa_index.{epoch}.{version}.v{FORMAT_VERSION}.bin')
+
+
+@contextmanager
+def build_lock(directory):
+    """Serialize index builds across worker processes"""
+    os.makedirs(directory, exist_ok=True)
+    if not HAS_FCNTL:
+        yield
+        return
+    with open(os.path.join(directory, '.build.lock'), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def prune_index_files(directory, keep, current_path):
+    """Delete all but the newest `keep` index files (workers still mapping one keep their copy)"""
+    paths = sorted(glob.glob(os.path.join(directory, 'qa_index.*.bin')), key=os.path.getmtime, reverse=True)
+    for path in paths[keep:]:
+        if os.path.abspath(path) == os.path.abspath(current_path):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class _Blob:
+    """Collects UTF-8 strings into one blob, returning (offset, length)"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def add(self, text):
+        encoded = text.encode('utf-8')
+        offset = len(self.data)
+        self.data += encoded
+        return offset, len(encoded)
+
+
+def _trigram_code(gram):
+    """A 3-character trigram as one integer (21 bits per code point)"""
+    return (ord(gram[0]) << 42) | (ord(gram[1]) << 21) | ord(gram[2])
+
+
+def _string_table(blob, strings):
+    """Sorted string table; returns (bytes, sorted strings)"""
+    ordered = sorted(strings, key=lambda s: s.encode('utf-8'))
+    table = bytearray()
+    for text in ordered:
+        table += STRING.pack(*blob.add(text))
+    return bytes(table), ordered
+
+
+def write_index_file(path, version, entries, prune_min_score=None, fuzzy=False):
+    """
+    Write the compiled index for entries (QAIndex entry dicts in seq order)
+    to path atomically (temp file + os.replace). With prune_min_score (needs
+    NumPy), the PrunedBM25Scorer tables for that minimum score are included;
+    with fuzzy, the TrigramIndex postings over the terms.
+    """
+    if sys.byteorder != 'little':
+        raise RuntimeError("Compiled chatbot index files require a little-endian host")
+
+    blob = _Blob()
+    sections = {}
+
+    entry_table = bytearray()
+    for entry in entries:
+        entry_table += ENTRY.pack(*blob.add(entry['id']), *blob.add(entry['question']),
+                                  *blob.add(entry['answer']), entry['length'])
+    sections['entries'] = bytes(entry_table)
+    sections['ids_sorted'] = sorted(range(len(entries)), key=lambda i: entries[i]['id'].encode('utf-8'))
+
+    # Phrase pass: values are entry positions (= seq order)
+    tables = PhraseMatcher((entry['question'], i) for i, entry in enumerate(entries)).to_arrays()
+    sections['ac_keys'] = tables['keys']
+    sections['ac_targets'] = tables['targets']
+    sections['ac_fail'] = tables['fail']
+    sections['ac_best'] = tables['best']
+    sections['ac_ranks'] = tables['ranks']
+    sections['ac_values'] = tables['values']
+
+    # BM25: rows rewritten in sorted-term order, so a term's row is its table position
+    bm25 = BM25Scorer([(i, entry['terms']) for i, entry in enumerate(entries)])
+    rows = {term: (indices, weights) for term, indices, weights in bm25.rows()}
+    sections['terms'], terms = _string_table(blob, rows)
+    indptr, indices, weights = [0], [], []
+    for term in terms:
+        indices.extend(rows[term][0])
+        weights.extend(rows[term][1])
+        indptr.append(len(indices))
+    sections['bm25_indptr'] = indptr
+    sections['bm25_indices'] = indices
+    sections['bm25_weights'] = weights
+    sections['bm25_self_scores'] = [float(s) for s in bm25.self_scores]
+
+    # Pruning tables, computed over the rows as written (term row = sorted position)
+    prune = {name: [] for name in PrunedBM25Scorer.ARRAYS}
+    if prune_min_score is not None:
+        file_bm25 = BM25Scorer.from_arrays(
+            range(len(entries)), {term: row for row, term in enumerate(terms)},
+            *(np.asarray(sections[name], dtype=dtype) for name, dtype in (
+                ('bm25_indptr', np.int64), ('bm25_indices', np.int64),
+                ('bm25_weights', np.float64), ('bm25_self_scores', np.float64)))
+        )
+        prune = PrunedBM25Scorer(file_bm25, prune_min_score).to_arrays()
+    sections['prune_min_score'] = [prune_min_score] if prune_min_score is not None else []
+    for name in PrunedBM25Scorer.ARRAYS:
+        sections['prune_' + name] = prune[name]
+
+    # Typo correction: terms are distinct and sorted, so word indexes are term rows
+    postings = TrigramIndex(terms).postings() if fuzzy else {}
+    keys = sorted(postings, key=lambda key: (_trigram_code(key[0]), key[1]))
+    indptr, members = [0], []
+    for key in keys:
+        members.extend(postings[key])
+        indptr.append(len(members))
+    sections['trigram_codes'] = [_trigram_code(gram) for gram, _ in keys]
+    sections['trigram_sizes'] = [size for _, size in keys]
+    sections['trigram_indptr'] = indptr
+    sections['trigram_words'] = members
+
+    # Keyword postings for the legacy ratio scorer
+    postings = {}
+    for i, entry in enumerate(entries):
+        for keyword in entry['keywords']:
+            posting = postings.setdefault(keyword, {})
+            posting[i] = posting.get(i, 0) + 1
+    sections['keywords'], keywords = _string_table(blob, postings)
+    indptr, members, counts = [0], [], []
+    for keyword in keywords:
+        for i, occurrences in sorted(postings[keyword].items()):
+            members.append(i)
+            counts.append(occurrences)
+        indptr.append(len(members))
+    sections['keyword_indptr'] = indptr
+    sections['keyword_entries'] = members
+    sections['keyword_counts'] = counts
+
+    sections['blob'] = bytes(blob.data)
+
+    encoded = []
+    for name, typecode in SECTIONS:
+        data = sections[name]
+        if HAS_NUMPY and isinstance(data, np.ndarray):
+            data = data.astype(_NUMPY_TYPES[typecode]).tobytes()
+        else:
+            data = array(typecode, data).tobytes() if typecode else data
+        # Pad to 8 bytes so every numeric section stays aligned
+        encoded.append((data, b'\0' * (-len(data) % 8)))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    offset = HEADER.size + SECTION.size * len(SECTIONS)
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, version, len(entries), len(SECTIONS)))
+        for data, padding in encoded:
+            f.write(SECTION.pack(offset, len(data)))
+            offset += len(data) + len(padding)
+        for data, padding in encoded:
+            f.write(data)
+            f.write(padding)
+    # Atomic: readers see either no file or the complete one
+    os.replace(temp_path, path)
+
+
+class _StringTable:
+    """Sorted string table in the mapped file: `in` / [] give the row number"""
+
+    def __init__(self, blob, table):
+        self._blob = blob
+        self._table = table
+        self._count = len(table) // STRING.size
+
+    def __len__(self):
+        return self._count
+
+    def _key(self, row):
+        offset, length = STRING.unpack_from(self._table, row * STRING.size)
+        return bytes(self._blob[offset:offset + length])
+
+    def find(self, text):
+        target = text.encode('utf-8')
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self._count and self._key(lo) == target else -1
+
+    def __contains__(self, text):
+        return self.find(text) >= 0
+
+    def __getitem__(self, text):
+        row = self.find(text)
+        if row < 0:
+            raise KeyError(text)
+        return row
+
+    def text(self, row):
+        return self._key(row).decode('utf-8')
+
+    def items(self):
+        for row in range(self._count):
+            yield self.text(row), row
+
+
+class _StringRows:
+    """Row -> text view of a _StringTable (the TrigramIndex word list)"""
+
+    def __init__(self, table):
+        self._table = table
+
+    def __len__(self):
+        return len(self._table)
+
+    def __getitem__(self, row):
+        return self._table.text(row)
+
+
+class _MappedTrigramPostings:
+    """TrigramIndex postings read from the file: get((trigram, count), default)"""
+
+    def __init__(self, codes, sizes, indptr, words):
+        self._codes = codes
+        self._sizes = sizes
+        self._indptr = indptr
+        self._words = words
+
+    def get(self, key, default=None):
+        gram, size = key
+        code = _trigram_code(gram)
+        start = bisect.bisect_left(self._codes, code)
+        end = bisect.bisect_right(self._codes, code, start)
+        row = bisect.bisect_left(self._sizes, size, start, end)
+        if row == end or self._sizes[row] != size:
+            return default
+        return self._words[self._indptr[row]:self._indptr[row + 1]]
+
+
+class MappedPhraseMatcher:
+    """PhraseMatcher.best() over the flat tables in the mapped file"""
+
+    def __init__(self, keys, targets, fail, best, ranks, values):
+        self.keys = keys
+        self.targets = targets
+        self.fail = fail
+        self.best_pattern = best
+        self.ranks = ranks
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def best(self, text):
+        """Return the value of the longest phrase contained in text, or None"""
+        if not len(self.values):
+            return None
+        keys, targets, fail, best, ranks = self.keys, self.targets, self.fail, self.best_pattern, self.ranks
+        count = len(keys)
+        found = -1
+        found_rank = -1
+        state = 0
+        for ch in text:
+            c = ord(ch)
+            while True:
+                key = (state << _CHAR_BITS) | c
+                position = bisect_left(keys, key)
+                if position < count and keys[position] == key:
+                    state = targets[position]
+                    break
+                if state == 0:
+                    break
+                state = fail[state]
+            pattern = best[state]
+            if pattern >= 0 and ranks[pattern] > found_rank:
+                found = pattern
+                found_rank = ranks[pattern]
+        return self.values[found] if found >= 0 else None
+
+
+class MappedQAIndexFile:
+    """Read-only view of one compiled index file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+
+        magic, self.version, self.entry_count, section_count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or section_count != len(SECTIONS):
+            raise ValueError(f"{path} is not a compiled chatbot index")
+
+        self._sections = {}
+        for position, (name, typecode) in enumerate(SECTIONS):
+            offset, length = SECTION.unpack_from(self._mm, HEADER.size + position * SECTION.size)
+            if offset + length > len(self._mm):
+                raise ValueError(f"{path} is truncated")
+            self._sections[name] = self._section(offset, length, typecode)
+
+        s = self._sections
+        self._blob = s['blob']
+        self.phrases = MappedPhraseMatcher(s['ac_keys'], s['ac_targets'], s['ac_fail'],
+                                           s['ac_best'], s['ac_ranks'], s['ac_values'])
+        self.terms = _StringTable(self._blob, s['terms'])
+        self.bm25 = BM25Scorer.from_arrays(
+            range(self.entry_count), self.terms, self._numeric('bm25_indptr'),
+            self._numeric('bm25_indices'), self._numeric('bm25_weights'), self._numeric('bm25_self_scores')
+        )
+        self.keyword_scorer = self.bm25
+        if len(s['prune_min_score']):
+            # Large corpora: the pruning tables were compiled into the file
+            self.keyword_scorer = PrunedBM25Scorer.from_arrays(
+                self.bm25, s['prune_min_score'][0],
+                {name: self._numeric('prune_' + name) for name in PrunedBM25Scorer.ARRAYS}
+            )
+        self.fuzzy = None   # TrigramIndex over the terms, when the file was written with fuzzy
+        if len(s['trigram_codes']):
+            self.fuzzy = TrigramIndex.from_tables(
+                _StringRows(self.terms), self.terms,
+                _MappedTrigramPostings(s['trigram_codes'], s['trigram_sizes'],
+                                       s['trigram_indptr'], s['trigram_words'])
+            )
+        self.keywords = _StringTable(self._blob, s['keywords'])
+        self._keyword_list = None
+
+    def _section(self, offset, length, typecode):
+        view = self._view[offset:offset + length]
+        return view.cast(typecode) if typecode else view
+
+    def _numeric(self, name):
+        """NumPy view (zero-copy) for the BM25 arrays when NumPy is available"""
+        section = self._sections[name]
+        if not HAS_NUMPY:
+            return section
+        typecode = dict(SECTIONS)[name]
+        return np.frombuffer(section, dtype=_NUMPY_TYPES[typecode])
+
+    def _text(self, offset, length):
+        return bytes(self._blob[offset:offset + length]).decode('utf-8')
+
+    def __len__(self):
+        return self.entry_count
+
+    def entry(self, position):
+        """Entry dict (id, seq, question, answer, length) at a seq position"""
+        fields = ENTRY.unpack_from(self._sections['entries'], position * ENTRY.size)
+        return {
+            'id': self._text(fields[0], fields[1]),
+            'seq': position,
+            'question': self._text(fields[2], fields[3]),
+            'answer': self._text(fields[4], fields[5]),
+            'length': fields[6]
+        }
+
+    def _entry_id(self, position):
+        offset, length = ENTRY.unpack_from(self._sections['entries'], position * ENTRY.size)[:2]
+        return bytes(self._blob[offset:offset + length])
+
+    def find(self, qa_id):
+        """Entry dict for a Q&A id, or None"""
+        target = str(qa_id).encode('utf-8')
+        ids_sorted = self._sections['ids_sorted']
+        lo, hi = 0, self.entry_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._entry_id(ids_sorted[mid]) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.entry_count and self._entry_id(ids_sorted[lo]) == target:
+            return self.entry(ids_sorted[lo])
+        return None
+
+    def keyword_count(self, position):
+        return ENTRY.unpack_from(self._sections['entries'], position * ENTRY.size)[6]
+
+    def ratio_counts(self, message_key):
+        """Legacy ratio scorer: {entry position: keyword occurrences found in the message}"""
+        if self._keyword_list is None:
+            # Decoded once per mapping; only the legacy scorer needs it
+            self._keyword_list = [keyword for keyword, _ in self.keywords.items()]
+        indptr = self._sections['keyword_indptr']
+        members = self._sections['keyword_entries']
+        occurrences = self._sections['keyword_counts']
+        counts = {}
+        for row, keyword in enumerate(self._keyword_list):
+            if keyword in message_key:
+                for i in range(indptr[row], indptr[row + 1]):
+                    counts[members[i]] = counts.get(members[i], 0) + occurrences[i]
+        return counts
+
+
+if __name__ == '__main__':
+    import argparse
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from database_architecture.connection import get_database
+    from qa_index import SharedQAIndex
+
+    parser = argparse.ArgumentParser(description='Compile the chatbot index file for the current Q&A version')
+    parser.add_argument('--dir', default=DEFAULT_DIR)
+    args = parser.parse_args()
+
+    db = get_database()
+    index = SharedQAIndex(db.custom_qa, db.qa_meta, directory=args.dir)
+    index.load()
+    print(f"✅ {index.path} ({os.path.getsize(index.path)} bytes, {len(index)} Q&As)")
@@ -0,0 +1,268 @@
+"""
+BM25 scoring engine for the chatbot keyword pass
+Builds a sparse term-document matrix over stored questions (CSR by term:
+indptr / doc indices / precomputed BM25 weights) and scores every question
+against a message in one batched operation. For large corpora,
+PrunedBM25Scorer gives the same answers while scoring only the questions
+that can still reach the minimum score.
+
+Scores are normalized by each question's self-score, so 1.0 means every
+question term appears in the message and the minimum score keeps the same
+meaning as the old "share of keywords matched" ratio.
+"""
+import math
+import re
+
+# NumPy makes scoring one vectorized bincount; without it the same math runs in Python
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# Same minimum word length as the keyword pass
+MIN_TOKEN_LENGTH = 3
+
+_TOKEN_RE = re.compile(r'[^\W_]+')
+
+
+def tokenize(text):
+    """Whole-word tokens (lowercase input expected), shorter words dropped"""
+    return [t for t in _TOKEN_RE.findall(text) if len(t) >= MIN_TOKEN_LENGTH]
+
+
+class BM25Scorer:
+    """
+    BM25 over a fixed list of documents.
+    documents is a list of (doc_id, tokens) pairs in priority order; on equal
+    scores the earlier document wins.
+    """
+
+    def __init__(self, documents, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = [doc_id for doc_id, _ in documents]
+        self.vocabulary = {}
+
+        count = len(documents)
+        lengths = [len(tokens) for _, tokens in documents]
+        avg_length = (sum(lengths) / count) if count else 0.0
+
+        # term -> [(doc_index, term_frequency)]
+        postings = []
+        for doc_index, (_, tokens) in enumerate(documents):
+            frequencies = {}
+            for token in tokens:
+                frequencies[token] = frequencies.get(token, 0) + 1
+            for token, tf in frequencies.items():
+                term = self.vocabulary.get(token)
+                if term is None:
+                    term = len(postings)
+                    self.vocabulary[token] = term
+                    postings.append([])
+                postings[term].append((doc_index, tf))
+
+        indptr = [0]
+        indices = []
+        weights = []
+        self_scores = [0.0] * count
+        for docs in postings:
+            df = len(docs)
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for doc_index, tf in docs:
+                norm = 1 - b + b * (lengths[doc_index] / avg_length if avg_length else 0)
+                weight = idf * tf * (k1 + 1) / (tf + k1 * norm)
+                indices.append(doc_index)
+                weights.append(weight)
+                self_scores[doc_index] += weight
+            indptr.append(len(indices))
+
+        if HAS_NUMPY:
+            self.indptr = np.asarray(indptr, dtype=np.int64)
+            self.indices = np.asarray(indices, dtype=np.int64)
+            self.weights = np.asarray(weights, dtype=np.float64)
+            self.self_scores = np.asarray(self_scores, dtype=np.float64)
+        else:
+            self.indptr = indptr
+            self.indices = indices
+            self.weights = weights
+            self.self_scores = self_scores
+
+    @classmethod
+    def from_arrays(cls, doc_ids, vocabulary, indptr, indices, weights, self_scores, k1=1.2, b=0.75):
+        """
+        Scorer over prebuilt arrays (e.g. views into a memory-mapped index file).
+        vocabulary only needs `in` and `[]`; the arrays only need indexing
+        (NumPy arrays when HAS_NUMPY).
+        """
+        scorer = cls.__new__(cls)
+        scorer.k1 = k1
+        scorer.b = b
+        scorer.doc_ids = doc_ids
+        scorer.vocabulary = vocabulary
+        scorer.indptr = indptr
+        scorer.indices = indices
+        scorer.weights = weights
+        scorer.self_scores = self_scores
+        return scorer
+
+    def rows(self):
+        """Yield (term, doc_indices, weights) per vocabulary term"""
+        for term, row in self.vocabulary.items():
+            start, end = int(self.indptr[row]), int(self.indptr[row + 1])
+            yield term, [int(i) for i in self.indices[start:end]], [float(w) for w in self.weights[start:end]]
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def _terms(self, tokens):
+        return sorted({self.vocabulary[t] for t in tokens if t in self.vocabulary})
+
+    def scores(self, tokens):
+        """Raw BM25 score of every document for the given query tokens"""
+        terms = self._terms(tokens)
+        count = len(self.doc_ids)
+        if HAS_NUMPY:
+            if not terms:
+                return np.zeros(count)
+            slices = [np.arange(self.indptr[t], self.indptr[t + 1]) for t in terms]
+            positions = np.concatenate(slices)
+            return np.bincount(self.indices[positions], weights=self.weights[positions], minlength=count)
+
+        scores = [0.0] * count
+        for t in terms:
+            for pos in range(self.indptr[t], self.indptr[t + 1]):
+                scores[self.indices[pos]] += self.weights[pos]
+        return scores
+
+    def best(self, tokens, min_score):
+        """Return (doc_id, normalized_score) of the best document, or None below min_score"""
+        if not self.doc_ids:
+            return None
+        raw = self.scores(tokens)
+
+        if HAS_NUMPY:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                normalized = np.where(self.self_scores > 0, raw / self.self_scores, 0.0)
+            top = normalized.max()
+            if top <= 0 or top < min_score:
+                return None
+            # Highest normalized score, then highest raw score, then earliest document
+            tied = np.flatnonzero(normalized >= top - 1e-12)
+            winner = int(tied[np.argmax(raw[tied])])
+            return self.doc_ids[winner], float(top)
+
+        best_key = None
+        winner = None
+        for doc_index, score in enumerate(raw):
+            if score <= 0:
+                continue
+            key = (score / self.self_scores[doc_index], score)
+            if best_key is None or key[0] > best_key[0] + 1e-12 or (
+                    abs(key[0] - best_key[0]) <= 1e-12 and key[1] > best_key[1]):
+                best_key = key
+                winner = doc_index
+        if winner is None or best_key[0] < min_score:
+            return None
+        return self.doc_ids[winner], best_key[0]
+
+
+class PrunedBM25Scorer:
+    """
+    Exact BM25Scorer.best() that only scores candidate documents (needs NumPy).
+    A document can only reach min_score if the message contains one of its
+    "prefix" terms: its highest-weight terms, taken until the rest of its
+    weight is below min_score of its self-score. An inverted index over
+    prefix terms yields the candidates, which are re-scored exactly from a
+    document-major copy of the matrix. Long postings of common words are
+    rarely in a prefix, so large corpora score far fewer documents.
+    """
+
+    def __init__(self, bm25, min_score):
+        self.bm25 = bm25
+        self.min_score = min_score
+        count = len(bm25)
+        indptr = np.asarray(bm25.indptr, dtype=np.int64)
+        terms = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        documents = np.asarray(bm25.indices, dtype=np.int64)
+        weights = np.asarray(bm25.weights, dtype=np.float64)
+        self.self_scores = np.asarray(bm25.self_scores, dtype=np.float64)
+
+        # Document-major matrix for re-scoring
+        order = np.argsort(documents, kind='stable')
+        self._doc_terms = terms[order]
+        self._doc_weights = weights[order]
+        self._doc_indptr = np.concatenate(([0], np.cumsum(np.bincount(documents, minlength=count))))
+
+        # Per document, heaviest terms first; a term is in the prefix while the
+        # weight of the terms before it is at most (1 - min_score) of the self-score
+        order = np.lexsort((terms, -weights, documents))
+        documents, terms, weights = documents[order], terms[order], weights[order]
+        cumulative = np.cumsum(weights)
+        document_start = np.concatenate(([0.0], cumulative))[self._doc_indptr[documents]]
+        before = cumulative - weights - document_start
+        limit = (1 - min_score) * self.self_scores[documents]
+        in_prefix = before <= limit * (1 + 1e-9) + 1e-12
+
+        terms, documents = terms[in_prefix], documents[in_prefix]
+        order = np.lexsort((documents, terms))
+        self._prefix_documents = documents[order]
+        self._prefix_indptr = np.concatenate(
+            ([0], np.cumsum(np.bincount(terms[order], minlength=len(indptr) - 1)))
+        )
+
+    # Arrays that to_arrays() exports, by attribute
+    ARRAYS = ('doc_indptr', 'doc_terms', 'doc_weights', 'prefix_indptr', 'prefix_documents')
+
+    def to_arrays(self):
+        """{name: NumPy array} of the pruning tables, for storing in an index file"""
+        return {name: getattr(self, '_' + name) for name in self.ARRAYS}
+
+    @classmethod
+    def from_arrays(cls, bm25, min_score, arrays):
+        """Scorer over tables exported by to_arrays() (e.g. views into a mapped file)"""
+        scorer = cls.__new__(cls)
+        scorer.bm25 = bm25
+        scorer.min_score = min_score
+        scorer.self_scores = np.asarray(bm25.self_scores, dtype=np.float64)
+        for name in cls.ARRAYS:
+            setattr(scorer, '_' + name, arrays[name])
+        return scorer
+
+    def __len__(self):
+        return len(self.bm25)
+
+    def candidates(self, terms):
+        """Sorted documents with a prefix term among the given term rows"""
+        found = [self._prefix_documents[self._prefix_indptr[t]:self._prefix_indptr[t + 1]] for t in terms]
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+    def best(self, tokens, min_score):
+        """Same result as BM25Scorer.best()"""
+        if min_score < self.min_score:
+            # Prefixes were cut for a higher threshold and could miss documents
+            return self.bm25.best(tokens, min_score)
+        terms = self.bm25._terms(tokens)
+        candidates = self.candidates(terms)
+        if not len(candidates):
+            return None
+
+        starts = self._doc_indptr[candidates]
+        lengths = self._doc_indptr[candidates + 1] - starts
+        owners = np.repeat(np.arange(len(candidates)), lengths)
+        positions = np.arange(int(lengths.sum())) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        hits = np.isin(self._doc_terms[positions], terms)
+        raw = np.bincount(owners[hits], weights=self._doc_weights[positions[hits]], minlength=len(candidates))
+
+        self_scores = self.self_scores[candidates]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            normalized = np.where(self_scores > 0, raw / self_scores, 0.0)
+        top = normalized.max()
+        if top <= 0 or top < min_score:
+            return None
+        # Same tie-breaking as BM25Scorer: raw score, then earliest document
+        tied = np.flatnonzero(normalized >= top - 1e-12)
+        winner = int(candidates[tied[np.argmax(raw[tied])]])
+        return self.bm25.doc_ids[winner], float(top)
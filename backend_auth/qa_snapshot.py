@@ -0,0 +1,60 @@
+"""
+Client-side chatbot index snapshot
+Serializes the Q&A matchers (normalized questions, BM25 terms and weights,
+answers) into one JSON document the frontend can answer from without a
+request per message. The document is compiled and gzip-compressed once per
+custom_qa version and served as-is afterwards, with an ETag so unchanged
+snapshots cost a 304.
+
+The frontend copy of the matching rules lives in
+frontend/src/lib/chatbotSnapshot.js and must follow qa_index.match().
+"""
+import gzip
+import hashlib
+import json
+import threading
+
+
+class CompiledSnapshot:
+    """One serialized snapshot: JSON body, its gzip encoding and ETag"""
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        self.etag = f"snapshot-{hashlib.sha1(body).hexdigest()[:16]}"
+
+
+class SnapshotCache:
+    """Compiles the snapshot of a QAIndex at most once per version"""
+
+    def __init__(self, index):
+        self.index = index
+        self._compiled = None
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self):
+        """CompiledSnapshot for the index's current version"""
+        if self.index.version is None:
+            # Stale after a concurrent write: reload now rather than serve an unversioned copy
+            self.index.refresh_if_stale()
+
+        compiled = self._compiled
+        if compiled is not None and compiled.version == self.index.version:
+            return compiled
+        with self._lock:
+            compiled = self._compiled
+            if compiled is not None and compiled.version == self.index.version:
+                return compiled
+            data = self.index.snapshot()
+            body = json.dumps({'success': True, 'snapshot': data},
+                              ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            compiled = CompiledSnapshot(data['version'], body)
+            self._compiled = compiled
+            self.builds += 1
+            return compiled
+
+    def clear(self):
+        """Drop the compiled snapshot (e.g. after a full index reload)"""
+        self._compiled = None
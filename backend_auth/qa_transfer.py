@@ -0,0 +1,192 @@
+"""
+Bulk NDJSON import/export for chatbot Q&As
+One JSON object per line: {"question": "...", "answer": "...", "is_default": false, ...}
+- Export streams the collection from a cursor, one line per Q&A
+- Import upserts in batches with bulk_write, keyed on question_key (the
+  normalized question), so re-importing a file updates answers instead of
+  duplicating questions
+Run migrate_chatbot_data.py --backfill-keys first on databases created
+before question_key existed.
+
+Usage: python backend_auth/qa_transfer.py export [-o qas.ndjson]
+       python backend_auth/qa_transfer.py import qas.ndjson [--batch-size 500]
+"""
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from qa_index import question_key
+from timestamps import parse_timestamp, to_iso, utc_now
+
+BATCH_SIZE = 500
+EXPORT_FIELDS = ('question', 'answer', 'is_default', 'created_at', 'updated_at')
+
+
+def export_ndjson(collection, batch_size=BATCH_SIZE):
+    """Yield one NDJSON line per Q&A, oldest first, without loading the collection"""
+    projection = {'_id': 0}
+    projection.update({field: 1 for field in EXPORT_FIELDS})
+    cursor = collection.find({}, projection).sort('_id', 1).batch_size(batch_size)
+    for doc in cursor:
+        yield json.dumps(doc, default=to_iso, ensure_ascii=False) + '\n'
+
+
+def _parse_line(line):
+    """Return (key, update, error) for one NDJSON line"""
+    try:
+        doc = json.loads(line)
+    except ValueError as e:
+        return None, None, f"invalid JSON ({e})"
+    if not isinstance(doc, dict):
+        return None, None, "expected a JSON object"
+
+    question = str(doc.get('question') or '').strip()
+    answer = str(doc.get('answer') or '').strip()
+    if not question or not answer:
+        return None, None, "question and answer are required"
+    key = question_key(question)
+    if not key:
+        return None, None, "question must contain letters or numbers"
+
+    # Exported timestamps are UTC; a value that doesn't parse is an error, not "now"
+    timestamps = {}
+    for field in ('created_at', 'updated_at'):
+        if doc.get(field) is not None:
+            timestamps[field] = parse_timestamp(doc[field], assume_utc=True)
+            if timestamps[field] is None:
+                return None, None, f"{field} is not an ISO 8601 timestamp"
+
+    now = utc_now()
+    return key, UpdateOne(
+        {'question_key': key},
+        {
+            '$set': {'question': question, 'answer': answer, 'updated_at': now},
+            '$setOnInsert': {
+                'created_at': timestamps.get('created_at') or now,
+                'is_default': bool(doc.get('is_default', False))
+            }
+        },
+        upsert=True
+    ), None
+
+
+class ImportResult:
+    """Counters of an import, updated after every batch"""
+
+    def __init__(self):
+        self.lines = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.batches = 0
+        self.invalid = []   # (line number, reason)
+
+    def to_dict(self):
+        return {
+            'lines': self.lines,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'failed': self.failed,
+            'batches': self.batches,
+            'invalid': [{'line': number, 'error': error} for number, error in self.invalid[:100]],
+            'invalid_count': len(self.invalid)
+        }
+
+
+def _write_batch(collection, pending, result):
+    # Later lines win within a batch; one operation per key avoids upsert races
+    operations = list(pending.values())
+    pending.clear()
+    try:
+        outcome = collection.bulk_write(operations, ordered=False)
+        details = outcome.bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+        result.failed += len(details.get('writeErrors', []))
+    result.inserted += details.get('nUpserted', 0)
+    result.updated += details.get('nMatched', 0)
+    result.batches += 1
+
+
+def import_ndjson(collection, lines, batch_size=BATCH_SIZE, progress=None, result=None):
+    """
+    Upsert Q&As from an iterable of NDJSON lines (str or bytes).
+    progress(result) is called after each batch. Returns an ImportResult;
+    pass one in to keep the counts of batches written before a failure.
+    """
+    result = result or ImportResult()
+    pending = {}
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        if not line.strip():
+            continue
+        result.lines += 1
+        key, operation, error = _parse_line(line)
+        if error:
+            result.invalid.append((number, error))
+            continue
+        pending[key] = operation
+        if len(pending) >= batch_size:
+            _write_batch(collection, pending, result)
+            if progress:
+                progress(result)
+    if pending:
+        _write_batch(collection, pending, result)
+        if progress:
+            progress(result)
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    from database_architecture.connection import get_database
+    from qa_index import bump_version
+
+    parser = argparse.ArgumentParser(description='Import or export chatbot Q&As as NDJSON')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help='write every Q&A as one JSON line')
+    export_parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    import_parser = commands.add_parser('import', help='upsert Q&As from an NDJSON file')
+    import_parser.add_argument('file', help="NDJSON file ('-' for stdin)")
+    import_parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = get_database()
+    if args.command == 'export':
+        out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+        count = 0
+        try:
+            for line in export_ndjson(db.custom_qa):
+                out.write(line)
+                count += 1
+        finally:
+            if args.output:
+                out.close()
+        print(f"✅ Exported {count} Q&As", file=sys.stderr)
+    else:
+        def report(result):
+            print(f"  {result.lines} lines: {result.inserted} added, {result.updated} updated, "
+                  f"{len(result.invalid)} invalid...")
+
+        source = sys.stdin if args.file == '-' else open(args.file, encoding='utf-8')
+        result = ImportResult()
+        try:
+            import_ndjson(db.custom_qa, source, args.batch_size, progress=report, result=result)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if result.inserted or result.updated:
+                # Running chatbot workers reload their Q&A index on the next poll
+                bump_version(db.qa_meta)
+        for number, error in result.invalid:
+            print(f"  ⚠️ Line {number}: {error}")
+        print(f"✅ Import complete! Added: {result.inserted}, Updated: {result.updated}, "
+              f"Failed: {result.failed}, Invalid: {len(result.invalid)}")
@@ -0,0 +1,84 @@
+"""
+Response cache for /api/chatbot
+Bounded LRU cache with a TTL, keyed by the normalized message. Any Q&A write
+clears it: BM25 weights and spelling corrections depend on the whole corpus,
+so no per-entry rule can tell which cached answers a write leaves valid.
+A response computed before a clear() is not stored after it: callers read
+the generation before matching and pass it to put().
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_SIZE = int(os.getenv('CHATBOT_CACHE_SIZE', 1024))
+CACHE_TTL_SECONDS = float(os.getenv('CHATBOT_CACHE_TTL_SECONDS', 300))
+
+
+class ResponseCache:
+    """Thread-safe LRU + TTL cache of chatbot responses"""
+
+    def __init__(self, max_entries=CACHE_SIZE, ttl_seconds=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()   # key -> (response, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation = 0   # bumped by every clear()
+        self.discarded = 0    # put() calls dropped because a clear() happened meanwhile
+
+    def get(self, key):
+        """Return the cached response for key, or None"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            if item[1] <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, response, generation=None):
+        """Store a response computed while `generation` was current (None: don't check)"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                # A write cleared the cache after this response was computed
+                self.discarded += 1
+                return
+            self._entries[key] = (response, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (after a Q&A write or an index reload)"""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self.generation += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'discarded': self.discarded
+            }
@@ -6,7 +6,6 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from datetime import datetime
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -14,6 +13,7 @@ load_dotenv()
 
 from database_architecture.connection import get_database
 from auth import hash_password
+from timestamps import utc_now
 
 def create_admin_user(username=None, password=None):
     """Create an admin user with hashed password"""
@@ -37,7 +37,7 @@ def create_admin_user(username=None, password=None):
                 hashed = hash_password(new_password)
                 users_collection.update_one(
                     {'username': username},
-                    {'$set': {'password': hashed, 'updated_at': datetime.now().isoformat()}}
+                    {'$set': {'password': hashed, 'updated_at': utc_now()}}
                 )
                 print(f"✅ Password updated for '{username}'!")
             return
@@ -50,8 +50,8 @@ def create_admin_user(username=None, password=None):
             'username': username,
             'password': hashed_password,
             'role': 'admin',
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat()
+            'created_at': utc_now(),
+            'updated_at': utc_now()
         }
         
         # Insert into database
@@ -0,0 +1,103 @@
+"""
+Stale-while-revalidate cache for expensive computations
+- fresh (younger than ttl): served as is
+- stale (younger than max_stale): served immediately while one background
+  thread recomputes it
+- missing or too old: computed in the request, and concurrent callers wait
+  for that same computation instead of starting their own (single flight)
+"""
+import threading
+import time
+
+
+class _Flight:
+    """One in-progress computation that several callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SWRCache:
+    """Caches the result of compute() for a single key"""
+
+    def __init__(self, compute, ttl_seconds, max_stale_seconds, name='cache'):
+        self.compute = compute
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.name = name
+        self._lock = threading.Lock()
+        self._value = None
+        self._computed_at = None
+        self._flight = None
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.shared_waits = 0
+
+    def _start_flight(self):
+        """Return (flight, is_owner); called with the lock held"""
+        if self._flight is not None:
+            return self._flight, False
+        self._flight = _Flight()
+        return self._flight, True
+
+    def _run_flight(self, flight):
+        try:
+            value = self.compute()
+            with self._lock:
+                self._value = value
+                self._computed_at = time.monotonic()
+            flight.value = value
+        except Exception as e:
+            flight.error = e
+            print(f"{self.name} refresh error: {e}")
+        finally:
+            with self._lock:
+                self.refreshes += 1
+                self._flight = None
+            flight.done.set()
+
+    def get(self):
+        """Return (value, age_seconds)"""
+        with self._lock:
+            age = time.monotonic() - self._computed_at if self._computed_at is not None else None
+            if age is not None and age < self.ttl_seconds:
+                self.hits += 1
+                return self._value, age
+
+            flight, owner = self._start_flight()
+            if age is not None and age < self.max_stale_seconds:
+                self.stale_hits += 1
+                if owner:
+                    threading.Thread(target=self._run_flight, args=(flight,),
+                                     name=f'{self.name}-refresh', daemon=True).start()
+                return self._value, age
+
+            if owner:
+                self.misses += 1
+            else:
+                self.shared_waits += 1
+
+        if owner:
+            self._run_flight(flight)
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value, 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'shared_waits': self.shared_waits,
+                'refreshes': self.refreshes,
+                'ttl_seconds': self.ttl_seconds,
+                'max_stale_seconds': self.max_stale_seconds
+            }
@@ -0,0 +1,58 @@
+"""
+UTC timestamp helpers
+Documents store timestamps as naive UTC datetimes (BSON dates, as pymongo
+returns them). API responses render them as ISO 8601 strings ending in 'Z'.
+Older documents hold datetime.now().isoformat() strings in server local
+time; migrate_timestamps.py converts them.
+"""
+from datetime import datetime, timezone
+
+from flask.json.provider import DefaultJSONProvider
+
+
+def utc_now():
+    """Current time as a naive UTC datetime"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_iso(value):
+    """ISO 8601 'Z' string for a datetime (other values are returned unchanged)"""
+    if not isinstance(value, datetime):
+        return value
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat() + 'Z'
+
+
+def parse_timestamp(value, assume_utc=False):
+    """
+    Naive UTC datetime for an ISO string, or None if it can't be parsed.
+    Strings without an offset are taken as server local time (how they were
+    written) unless assume_utc is set.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            value = value.strip()
+            # fromisoformat() only accepts a trailing 'Z' from Python 3.11 on
+            if value[-1:] in ('Z', 'z'):
+                value = value[:-1] + '+00:00'
+            parsed = datetime.fromisoformat(value)
+        except (ValueError, AttributeError, TypeError):
+            return None
+    if parsed.tzinfo is None:
+        if assume_utc:
+            return parsed
+        parsed = parsed.astimezone()
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class UTCJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that writes datetimes as ISO 8601 UTC strings"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, datetime):
+            return to_iso(o)
+        return DefaultJSONProvider.default(o)
@@ -0,0 +1,133 @@
+"""
+Character-trigram index over a vocabulary, for typo-tolerant matching
+Maps a misspelled word ("skils") to the closest known word ("skills") by
+the Dice similarity of their padded trigram sets. Postings are keyed by
+(trigram, trigram count), so a lookup only reads the postings of its own
+trigrams among words of about the same length: the cost per word depends
+on how many similar words exist, not on the size of the vocabulary.
+Used by the chatbot to re-try messages that matched nothing.
+"""
+import os
+import threading
+
+# Minimum Dice similarity (0-1) between a word and its correction
+MIN_SIMILARITY = float(os.getenv('CHATBOT_FUZZY_MIN_SIMILARITY', 0.6))
+
+# Largest difference in trigram count between a word and its correction
+MAX_SIZE_DIFFERENCE = 2
+
+# Corrections remembered per index (a cleared dict when full)
+CACHE_SIZE = 10000
+
+
+def trigrams(word):
+    """Distinct trigrams of a word padded with spaces (" skills " -> " sk", ..., "ls ")"""
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    Closest-word lookup over a fixed vocabulary.
+    words is an iterable of distinct known words (lowercase).
+    """
+
+    def __init__(self, words, min_similarity=MIN_SIMILARITY):
+        self.min_similarity = min_similarity
+        self._words = []
+        self._known = set()
+        self._postings = {}   # (trigram, trigram count of the word) -> [word index]
+        for word in words:
+            if word in self._known:
+                continue
+            index = len(self._words)
+            self._words.append(word)
+            self._known.add(word)
+            grams = trigrams(word)
+            for gram in grams:
+                self._postings.setdefault((gram, len(grams)), []).append(index)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_tables(cls, words, known, postings, min_similarity=MIN_SIMILARITY):
+        """
+        Index over prebuilt tables (a compiled index file): words[index] gives
+        a word, `in known` tests one, and postings.get((trigram, count), ())
+        gives word indexes, as postings() returned them
+        """
+        self = cls.__new__(cls)
+        self.min_similarity = min_similarity
+        self._words = words
+        self._known = known
+        self._postings = postings
+        self._cache = {}
+        self._lock = threading.Lock()
+        return self
+
+    def postings(self):
+        """{(trigram, trigram count): [word index]}, for writing the index to a file"""
+        return self._postings
+
+    def __len__(self):
+        return len(self._words)
+
+    def __contains__(self, word):
+        return word in self._known
+
+    def _size_range(self, size):
+        """
+        Trigram counts of the words worth comparing with a word of `size`
+        trigrams: within MAX_SIZE_DIFFERENCE (typos change a word's length by
+        a letter or two) and able to reach min_similarity
+        """
+        s = self.min_similarity
+        low, high = size - MAX_SIZE_DIFFERENCE, size + MAX_SIZE_DIFFERENCE
+        if s > 0:
+            low = max(low, int(size * s / (2 - s) - 1e-9))
+            high = min(high, int(size * (2 - s) / s + 1e-9))
+        return range(max(low, 1), high + 1)
+
+    def closest(self, word):
+        """Most similar known word at or above min_similarity, else None (the word itself if known)"""
+        if word in self._known:
+            return word
+        cached = self._cache.get(word, False)
+        if cached is not False:
+            return cached
+
+        grams = trigrams(word)
+        size = len(grams)
+        best = None
+        best_key = None
+        for other_size in self._size_range(size):
+            # Dice = 2 * shared / (size + other_size); skip words that can't get there
+            needed = self.min_similarity * (size + other_size) / 2 - 1e-9
+            shared = {}
+            for gram in grams:
+                for index in self._postings.get((gram, other_size), ()):
+                    shared[index] = shared.get(index, 0) + 1
+            for index, count in shared.items():
+                if count < needed:
+                    continue
+                other = self._words[index]
+                similarity = 2 * count / (size + other_size)
+                # Highest similarity, then the closest length, then alphabetical
+                key = (-similarity, abs(len(other) - len(word)), other)
+                if best_key is None or key < best_key:
+                    best_key = key
+                    best = other
+
+        with self._lock:
+            if len(self._cache) >= CACHE_SIZE:
+                self._cache.clear()
+            self._cache[word] = best
+        return best
+
+    def correct_text(self, text, min_length=3):
+        """Replace each unknown word of min_length or more with its closest known word"""
+        words = text.split()
+        for i, word in enumerate(words):
+            if len(word) >= min_length and word not in self._known:
+                words[i] = self.closest(word) or word
+        return ' '.join(words)
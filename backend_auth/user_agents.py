@@ -0,0 +1,124 @@
+"""
+Table-driven user-agent classifier for analytics
+Each dimension (device, browser, OS) is an ordered rule table: the first
+rule whose keywords are present (and whose excluded keywords are not) wins,
+so specific rules sit above the generic ones they overlap with (iPhone
+before macOS - iPhone UAs say "like Mac OS X" - and Android before Linux).
+Every keyword of every table is compiled into one regex, so a UA string is
+scanned once; results are kept in an LRU cache keyed on the raw UA string
+(real traffic has a few hundred distinct UAs).
+Benchmark: python backend_auth/bench_user_agents.py
+"""
+import os
+import re
+from functools import lru_cache
+
+UA_CACHE_SIZE = int(os.getenv('ANALYTICS_UA_CACHE_SIZE', 4096))
+
+# (label, any of these keywords, none of these keywords), first match wins
+DEVICE_RULES = [
+    ('Tablet', ('ipad', 'tablet'), ()),
+    # Android tablets are the Android UAs without "Mobile"
+    ('Tablet', ('android',), ('mobile',)),
+    ('Mobile', ('mobile', 'iphone', 'ipod', 'android'), ()),
+]
+
+BROWSER_RULES = [
+    ('Edge', ('edg/', 'edga/', 'edgios/'), ()),
+    ('Opera', ('opr/', 'opera'), ()),
+    ('Chrome', ('chrome', 'crios'), ('chromium',)),
+    ('Firefox', ('firefox', 'fxios'), ()),
+    ('Safari', ('safari',), ('chrome', 'chromium')),
+]
+
+OS_RULES = [
+    ('Windows', ('windows',), ()),
+    ('iOS', ('iphone', 'ipad', 'ipod'), ()),
+    ('Android', ('android',), ()),
+    ('macOS', ('macintosh', 'mac os x'), ()),
+    ('Linux', ('linux',), ()),
+]
+
+DEFAULT_DEVICE = 'Desktop'
+DEFAULT_BROWSER = 'Other'
+DEFAULT_OS = 'Other'
+
+
+def _trie_pattern(words):
+    """
+    Regex for a set of words shaped like a trie (c(?:hrom(?:e|ium)|rios)|...),
+    so the engine tests one branch per character instead of every word
+    """
+    branches = {}
+    ends_here = False
+    for word in words:
+        if word:
+            branches.setdefault(word[0], []).append(word[1:])
+        else:
+            ends_here = True
+    parts = []
+    for first in sorted(branches):
+        rest = _trie_pattern(branches[first])
+        parts.append(re.escape(first) + rest)
+    if not parts:
+        return ''
+    # Longer continuations first, so a keyword is never cut short by one of its prefixes
+    pattern = parts[0] if len(parts) == 1 else '(?:' + '|'.join(parts) + ')'
+    return f'(?:{pattern})?' if ends_here else pattern
+
+
+def _compile(*tables):
+    keywords = {keyword for table in tables for _, found, excluded in table for keyword in found + excluded}
+    return re.compile(_trie_pattern(keywords))
+
+
+def _frozen(rules):
+    return [(label, frozenset(found), frozenset(excluded)) for label, found, excluded in rules]
+
+
+_KEYWORDS_RE = _compile(DEVICE_RULES, BROWSER_RULES, OS_RULES)
+_DEVICE_RULES = _frozen(DEVICE_RULES)
+_BROWSER_RULES = _frozen(BROWSER_RULES)
+_OS_RULES = _frozen(OS_RULES)
+
+
+def _first_match(rules, present, default):
+    for label, found, excluded in rules:
+        if not found.isdisjoint(present) and excluded.isdisjoint(present):
+            return label
+    return default
+
+
+@lru_cache(maxsize=UA_CACHE_SIZE)
+def classify(user_agent):
+    """(device, browser, os) for a raw UA string"""
+    present = set(_KEYWORDS_RE.findall(user_agent.lower()))
+    return (
+        _first_match(_DEVICE_RULES, present, DEFAULT_DEVICE),
+        _first_match(_BROWSER_RULES, present, DEFAULT_BROWSER),
+        _first_match(_OS_RULES, present, DEFAULT_OS),
+    )
+
+
+def parse_user_agent(user_agent_string):
+    """Device, browser, OS and (truncated) raw string of a UA"""
+    user_agent_string = user_agent_string or ''
+    device, browser, os_name = classify(user_agent_string)
+    return {
+        'device': device,
+        'browser': browser,
+        'os': os_name,
+        'raw': user_agent_string[:200]
+    }
+
+
+def cache_stats():
+    info = classify.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'max_size': info.maxsize,
+        'hit_rate': round(info.hits / lookups, 4) if lookups else 0.0
+    }
@@ -1,36 +1,187 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
+import atexit
 import os
+import threading
 from dotenv import load_dotenv
 import certifi
 
 # Load environment variables with default encoding
 load_dotenv()
 
+# Connection pool sizing (override through environment variables)
+POOL_SETTINGS = {
+    'maxPoolSize': int(os.getenv('MONGODB_MAX_POOL_SIZE', 50)),
+    'minPoolSize': int(os.getenv('MONGODB_MIN_POOL_SIZE', 0)),
+    'maxIdleTimeMS': int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', 300000)),
+    'waitQueueTimeoutMS': int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 5000)),
+}
+
+DATABASE_NAME = 'portfolio_db'
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Collects connection pool counters for the shared client"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {
+                'pools_created': 0,
+                'connections_created': 0,
+                'connections_closed': 0,
+                'checked_out': 0,
+                'checked_in': 0,
+                'checkout_failed': 0,
+                'pools_cleared': 0,
+            }
+
+    def _bump(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['open_connections'] = stats['connections_created'] - stats['connections_closed']
+        stats['in_use'] = stats['checked_out'] - stats['checked_in']
+        return stats
+
+    def pool_created(self, event):
+        self._bump('pools_created')
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump('pools_cleared')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump('connections_created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump('connections_closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._bump('checkout_failed')
+
+    def connection_checked_out(self, event):
+        self._bump('checked_out')
+
+    def connection_checked_in(self, event):
+        self._bump('checked_in')
+
+
+# One client per process. The pid is remembered so a forked worker
+# (e.g. gunicorn with --preload) never reuses the parent's sockets.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_pool_stats = PoolStatsListener()
+
+
+def _reset_after_fork():
+    """Drop the inherited client in a forked child without closing the parent's sockets"""
+    global _client, _client_pid, _client_lock
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+    _pool_stats.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_client():
+    """
+    Return the process-wide MongoClient, creating it on first use
+    """
+    global _client, _client_pid
+
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    with _client_lock:
+        if _client is not None and _client_pid != pid:
+            # Inherited from the parent process: start a fresh pool here
+            _client = None
+            _pool_stats.reset()
+        if _client is None:
+            try:
+                # Get MongoDB connection string from environment variable
+                connection_string = os.getenv('MONGODB_CONNECTION_STRING')
+
+                if not connection_string:
+                    raise ValueError("MONGODB_CONNECTION_STRING environment variable not found. Please check your .env file.")
+
+                # FIX: Bypass SSL verification for local dev environments where certificates fail
+                client = MongoClient(
+                    connection_string,
+                    tls=True,
+                    tlsAllowInvalidCertificates=True,
+                    serverSelectionTimeoutMS=5000,
+                    event_listeners=[_pool_stats],
+                    **POOL_SETTINGS
+                )
+
+                # Test the connection once per process
+                client.admin.command('ping')
+
+                _client = client
+                _client_pid = pid
+                print(f"Successfully connected to MongoDB Atlas (pid {pid}, maxPoolSize {POOL_SETTINGS['maxPoolSize']})")
+
+            except Exception as e:
+                print(f"Error connecting to MongoDB: {e}")
+                print("Please check your MongoDB Atlas connection string in the .env file")
+                raise
+
+    return _client
+
+
 def get_database():
     """
-    Establish connection to MongoDB Atlas and return database instance
+    Return the portfolio database from the shared, pooled client
     """
-    try:
-        # Get MongoDB connection string from environment variable
-        connection_string = os.getenv('MONGODB_CONNECTION_STRING')
+    return get_client()[DATABASE_NAME]
 
-        if not connection_string:
-            raise ValueError("MONGODB_CONNECTION_STRING environment variable not found. Please check your .env file.")
 
-        # Create MongoDB client
-        # FIX: Bypass SSL verification for local dev environments where certificates fail
-        client = MongoClient(connection_string, tls=True, tlsAllowInvalidCertificates=True, serverSelectionTimeoutMS=5000)
+def close_client():
+    """
+    Close the shared client (e.g. on worker shutdown)
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
 
-        # Test the connection
-        client.admin.command('ping')
 
-        # Get database (you can change 'portfolio_db' to your preferred name)
-        db = client.portfolio_db
+# Worker exit (gunicorn workers leave through sys.exit) closes this process's pool.
+# Registered before any write-behind buffer, so their final flushes run first.
+atexit.register(close_client)
 
-        print("Successfully connected to MongoDB Atlas")
-        return db
 
-    except Exception as e:
-        print(f"Error connecting to MongoDB: {e}")
-        print("Please check your MongoDB Atlas connection string in the .env file")
-        raise
+def get_pool_stats():
+    """
+    Return connection pool settings and counters for this process
+    """
+    stats = _pool_stats.snapshot()
+    stats['pid'] = os.getpid()
+    stats['connected'] = _client is not None and _client_pid == os.getpid()
+    stats['settings'] = dict(POOL_SETTINGS)
+    return stats
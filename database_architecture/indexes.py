@@ -0,0 +1,235 @@
+"""
+Index registry for every collection the app queries
+INDEXES declares, per collection, the indexes its filters and sorts need.
+ensure_indexes() creates the missing ones and leaves existing ones alone,
+so it is safe to run at every startup; index_report() lists declared
+indexes that are missing and existing ones $indexStats has never seen used.
+Duplicate visitor documents, which would block the unique visitor_id index,
+are merged before it is created.
+
+Usage: python database_architecture/indexes.py [--apply]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+
+from pymongo import ASCENDING, IndexModel
+
+from backend_auth.timestamps import utc_now
+
+# Single-field indexes are ascending: MongoDB walks them backwards for newest-first sorts
+INDEXES = {
+    'visitors': [
+        IndexModel([('visitor_id', ASCENDING)], unique=True),
+        # Date windows, and /api/analytics/visitors pages sorted on (last_visit, visitor_id)
+        IndexModel([('last_visit', ASCENDING), ('visitor_id', ASCENDING)]),
+        # Only documents still waiting for a location (location_resolver.py --sweep)
+        IndexModel([('location.pending', ASCENDING)],
+                   partialFilterExpression={'location.pending': True}),
+        # Visitors changed while analytics_rollups.py --rebuild was scanning
+        IndexModel([('updated_at', ASCENDING)]),
+    ],
+    'page_views': [
+        IndexModel([('timestamp', ASCENDING)]),
+        IndexModel([('location.pending', ASCENDING)],
+                   partialFilterExpression={'location.pending': True}),
+    ],
+    'contact_submissions': [
+        IndexModel([('created_at', ASCENDING)]),
+    ],
+    'soft_posts': [
+        IndexModel([('created_at', ASCENDING)]),
+    ],
+    'users': [
+        IndexModel([('username', ASCENDING)], unique=True),
+    ],
+    'custom_qa': [
+        # Normalized question (qa_index.question_key); documents not yet
+        # backfilled have no key and are left out of the index
+        IndexModel([('question_key', ASCENDING)], unique=True,
+                   partialFilterExpression={'question_key': {'$exists': True}}),
+    ],
+}
+
+
+def _earliest(values, latest=False):
+    """Earliest (or latest) timestamp; migrated datetimes win over legacy ISO strings"""
+    values = [v for v in values if v is not None]
+    values = [v for v in values if isinstance(v, datetime)] or values
+    if not values:
+        return None
+    return max(values) if latest else min(values)
+
+
+def merge_duplicate_visitors(collection):
+    """
+    Fold visitor documents that share a visitor_id into the oldest one
+    (visit counts added, first/last visit widened, pages merged, location of
+    the latest visit) and delete the others. Returns the number deleted.
+    """
+    duplicates = collection.aggregate([
+        {'$group': {'_id': '$visitor_id', 'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}},
+    ], allowDiskUse=True)
+    removed = 0
+    for group in duplicates:
+        docs = list(collection.find({'_id': {'$in': group['ids']}}).sort('_id', ASCENDING))
+        keep, others = docs[0], docs[1:]
+        latest = max(docs, key=lambda doc: (isinstance(doc.get('last_visit'), datetime), doc.get('last_visit') or ''))
+        pages = []
+        for doc in docs:
+            pages.extend(page for page in doc.get('pages_visited') or [] if page not in pages)
+        collection.update_one({'_id': keep['_id']}, {'$set': {
+            'visit_count': sum(doc.get('visit_count') or 0 for doc in docs),
+            'first_visit': _earliest(doc.get('first_visit') for doc in docs),
+            'last_visit': _earliest((doc.get('last_visit') for doc in docs), latest=True),
+            'pages_visited': pages,
+            'location': latest.get('location'),
+            'updated_at': utc_now()
+        }})
+        removed += collection.delete_many({'_id': {'$in': [doc['_id'] for doc in others]}}).deleted_count
+    return removed
+
+
+# Run before a collection's unique index is created, so existing duplicates don't block it
+MERGE_DUPLICATES = {
+    'visitors': merge_duplicate_visitors,
+}
+
+
+def _key(spec):
+    """Comparable key list (indexes created from the shell may store 1.0 for 1)"""
+    items = spec.items() if hasattr(spec, 'items') else spec
+    return [(field, int(direction) if isinstance(direction, float) else direction) for field, direction in items]
+
+
+def _matches(existing, declared):
+    """True when an existing index has the declared key and options"""
+    if _key(existing['key']) != _key(declared['key']):
+        return False
+    if bool(existing.get('unique')) != bool(declared.get('unique')):
+        return False
+    existing_collation = existing.get('collation') or {}
+    for option, value in (declared.get('collation') or {}).items():
+        if existing_collation.get(option) != value:
+            return False
+    return True
+
+
+def _find_existing(info, declared):
+    """(name, matches) of the index on the declared key, or (None, False)"""
+    for name, existing in info.items():
+        if _key(existing['key']) == _key(declared['key']):
+            return name, _matches(existing, declared)
+    return None, False
+
+
+def ensure_indexes(db, collections=None):
+    """
+    Create the declared indexes that don't exist yet.
+    Returns {'created': [...], 'existing': [...], 'conflicts': [...], 'merged': [...], 'errors': [...]}
+    """
+    summary = {'created': [], 'existing': [], 'conflicts': [], 'merged': [], 'errors': []}
+    for collection_name, models in INDEXES.items():
+        if collections and collection_name not in collections:
+            continue
+        collection = db[collection_name]
+        info = collection.index_information()
+        for model in models:
+            declared = model.document
+            name, matches = _find_existing(info, declared)
+            if name is not None:
+                # Same key with other options: needs a manual drop, never done automatically
+                summary['existing' if matches else 'conflicts'].append(f"{collection_name}.{name}")
+                continue
+            if declared.get('unique') and collection_name in MERGE_DUPLICATES:
+                merged = MERGE_DUPLICATES[collection_name](collection)
+                if merged:
+                    summary['merged'].append(f"{collection_name}: {merged} duplicate documents")
+            try:
+                created = collection.create_indexes([model])
+                summary['created'].append(f"{collection_name}.{created[0]}")
+            except Exception as e:
+                # e.g. duplicate values blocking a unique index
+                summary['errors'].append(f"{collection_name}.{declared['name']}: {e}")
+    return summary
+
+
+def index_report(db):
+    """
+    Compare the registry with the database:
+    missing (declared but absent), conflicts (same key, other options),
+    unused (no accesses since the server started, per $indexStats) and
+    undeclared (present in the database but not in INDEXES).
+    """
+    report = {'missing': [], 'conflicts': [], 'unused': [], 'undeclared': [], 'usage': {}}
+    collection_names = set(db.list_collection_names())
+    for collection_name, models in INDEXES.items():
+        if collection_name not in collection_names:
+            report['missing'].extend(f"{collection_name}.{model.document['name']}" for model in models)
+            continue
+        collection = db[collection_name]
+        info = collection.index_information()
+        declared_names = set()
+        for model in models:
+            name, matches = _find_existing(info, model.document)
+            if name is None:
+                report['missing'].append(f"{collection_name}.{model.document['name']}")
+            else:
+                declared_names.add(name)
+                if not matches:
+                    report['conflicts'].append(f"{collection_name}.{name}")
+
+        for name in info:
+            if name != '_id_' and name not in declared_names:
+                report['undeclared'].append(f"{collection_name}.{name}")
+
+        try:
+            for stats in collection.aggregate([{'$indexStats': {}}]):
+                ops = stats.get('accesses', {}).get('ops', 0)
+                report['usage'][f"{collection_name}.{stats['name']}"] = ops
+                if ops == 0 and stats['name'] != '_id_':
+                    report['unused'].append(f"{collection_name}.{stats['name']}")
+        except Exception as e:
+            print(f"⚠️ $indexStats unavailable for {collection_name}: {e}")
+    return report
+
+
+def print_summary(summary):
+    for merged in summary['merged']:
+        print(f"  ⚠️ Merged {merged} - run analytics_rollups.py --rebuild to recount visitors")
+    for name in summary['created']:
+        print(f"  ✅ Created {name}")
+    for name in summary['conflicts']:
+        print(f"  ⚠️ {name} exists with different options - drop it to let it be recreated")
+    for error in summary['errors']:
+        print(f"  ❌ {error}")
+
+
+if __name__ == '__main__':
+    import argparse
+    from database_architecture.connection import get_database
+
+    parser = argparse.ArgumentParser(description='Create and audit MongoDB indexes')
+    parser.add_argument('--apply', action='store_true', help='create missing indexes before reporting')
+    args = parser.parse_args()
+
+    db = get_database()
+    if args.apply:
+        summary = ensure_indexes(db)
+        print_summary(summary)
+        print(f"✅ Indexes applied: {len(summary['created'])} created, {len(summary['existing'])} already present")
+
+    report = index_report(db)
+    print("\n📋 Index report")
+    for label, key in (('Missing', 'missing'), ('Conflicting', 'conflicts'),
+                       ('Unused since server start', 'unused'), ('Not in registry', 'undeclared')):
+        print(f"  {label}: {', '.join(report[key]) if report[key] else 'none'}")
+    if report['usage']:
+        print("\n  Accesses since server start:")
+        for name, ops in sorted(report['usage'].items()):
+            print(f"    {name}: {ops}")
+    if report['missing'] or report['conflicts']:
+        sys.exit(1)
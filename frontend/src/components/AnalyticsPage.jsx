@@ -17,6 +17,7 @@ import {
     faClock,
     faShieldAlt
 } from '@fortawesome/free-solid-svg-icons';
+import { subscribeLiveAnalytics } from '../lib/liveAnalytics';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000';
 
@@ -25,6 +26,7 @@ const AnalyticsPage = ({ adminUser }) => {
     const [stats, setStats] = useState(null);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
+    const [live, setLive] = useState(null);
 
     const fetchStats = async () => {
         setLoading(true);
@@ -68,6 +70,33 @@ const AnalyticsPage = ({ adminUser }) => {
         fetchStats();
     }, [navigate]);
 
+    useEffect(() => {
+        // New page views are pushed by the server; no polling
+        const token = localStorage.getItem('authToken');
+        if (!token) return undefined;
+
+        return subscribeLiveAnalytics(`${API_BASE_URL}/api/analytics/live`, token, (event, data) => {
+            if (event === 'counters') {
+                setLive(data);
+                return;
+            }
+            setLive(data.counters);
+            if (event !== 'views' || !data.events.length) return;
+
+            const count = data.events.length;
+            setStats((previous) => previous && {
+                ...previous,
+                page_views: {
+                    ...previous.page_views,
+                    total: previous.page_views.total + count,
+                    today: previous.page_views.today + count,
+                    this_week: previous.page_views.this_week + count
+                },
+                recent_views: [...data.events].reverse().concat(previous.recent_views || []).slice(0, 10)
+            });
+        }, (err) => console.debug('Live analytics unavailable:', err));
+    }, []);
+
     const getDeviceIcon = (device) => {
         switch (device) {
             case 'Mobile': return faMobile;
@@ -116,6 +145,12 @@ const AnalyticsPage = ({ adminUser }) => {
                         </div>
                     </div>
                     <div className="analytics-header-actions">
+                        {live && (
+                            <div className="live-badge" title="Visitors active in the last 5 minutes / page views this minute">
+                                <span className="live-dot"></span>
+                                <span>Live · {live.active_visitors} active · {live.views_per_minute[live.views_per_minute.length - 1]?.views || 0}/min</span>
+                            </div>
+                        )}
                         <div className="admin-badge-large">
                             <FontAwesomeIcon icon={faShieldAlt} />
                             <span>Admin Access</span>
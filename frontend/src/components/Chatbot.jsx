@@ -1,6 +1,7 @@
 import React, { useState, useRef, useEffect } from 'react';
 import { FontAwesomeIcon } from '@fortawesome/react-fontawesome';
 import { faTimes, faPaperPlane, faUser, faRobot, faPlus, faComments, faTrash, faList } from '@fortawesome/free-solid-svg-icons';
+import { answerLocally, prepareSnapshot } from '../lib/chatbotSnapshot';
 
 // Backend API URL
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000';
@@ -23,6 +24,8 @@ const Chatbot = ({ isOpen, setIsOpen, adminUser }) => {
   const [addStatus, setAddStatus] = useState({ show: false, success: false, message: '' });
   const messagesEndRef = useRef(null);
   const inputRef = useRef(null);
+  // Compiled Q&A matcher: known questions are answered without an API call
+  const snapshotRef = useRef(null);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -38,6 +41,12 @@ const Chatbot = ({ isOpen, setIsOpen, adminUser }) => {
     }
   }, [isOpen]);
 
+  useEffect(() => {
+    if (isOpen) {
+      loadSnapshot();
+    }
+  }, [isOpen]);
+
   // Fetch custom Q&As when admin opens the chatbot
   useEffect(() => {
     if (adminUser && isOpen) {
@@ -47,13 +56,34 @@ const Chatbot = ({ isOpen, setIsOpen, adminUser }) => {
 
   const fetchCustomQAs = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/chatbot/qa`);
+      // The list is paginated; unchanged pages are answered with 304 from the browser cache
+      let allQAs = [];
+      let cursor = null;
+      do {
+        const params = `limit=500&fields=question,answer${cursor ? `&after=${cursor}` : ''}`;
+        const response = await fetch(`${API_BASE_URL}/api/chatbot/qa?${params}`);
+        const data = await response.json();
+        if (!data.success) return;
+        allQAs = allQAs.concat(data.data);
+        cursor = data.next_cursor;
+      } while (cursor);
+      setCustomQAs(allQAs);
+    } catch (error) {
+      console.error('Error fetching custom Q&As:', error);
+    }
+  };
+
+  const loadSnapshot = async () => {
+    try {
+      // Revalidated with the ETag, so an unchanged snapshot is a 304
+      const response = await fetch(`${API_BASE_URL}/api/chatbot/snapshot`);
       const data = await response.json();
       if (data.success) {
-        setCustomQAs(data.data);
+        snapshotRef.current = prepareSnapshot(data.snapshot);
       }
     } catch (error) {
-      console.error('Error fetching custom Q&As:', error);
+      // Without a snapshot every message goes to the API
+      console.error('Error loading chatbot snapshot:', error);
     }
   };
 
@@ -70,6 +100,10 @@ const Chatbot = ({ isOpen, setIsOpen, adminUser }) => {
       const data = await response.json();
 
       if (data.success) {
+        // Q&As changed since our snapshot was taken
+        if (snapshotRef.current && data.version !== snapshotRef.current.version) {
+          loadSnapshot();
+        }
         return data.response;
       } else {
         throw new Error(data.error || 'Failed to get response');
@@ -98,8 +132,8 @@ const Chatbot = ({ isOpen, setIsOpen, adminUser }) => {
     setIsTyping(true);
 
     try {
-      // Get response from Python backend
-      const botResponse = await sendMessageToBackend(userMessage);
+      // Answer from the local snapshot, falling back to the Python backend
+      const botResponse = answerLocally(snapshotRef.current, userMessage) ?? await sendMessageToBackend(userMessage);
 
       // Add bot response
       const newBotMessage = {
@@ -149,6 +183,7 @@ const Chatbot = ({ isOpen, setIsOpen, adminUser }) => {
         setQuestionInput('');
         setAnswerInput('');
         fetchCustomQAs(); // Refresh the list
+        loadSnapshot();
         setTimeout(() => setAddStatus({ show: false, success: false, message: '' }), 3000);
       } else {
         setAddStatus({ show: true, success: false, message: data.error || 'Failed to add Q&A' });
@@ -175,6 +210,7 @@ const Chatbot = ({ isOpen, setIsOpen, adminUser }) => {
 
       if (data.success) {
         setCustomQAs(prev => prev.filter(qa => qa._id !== qaId));
+        loadSnapshot();
       } else if (data.code === 'INVALID_TOKEN') {
         setAddStatus({ show: true, success: false, message: 'Session expired. Please login again.' });
         setTimeout(() => setAddStatus({ show: false, success: false, message: '' }), 3000);
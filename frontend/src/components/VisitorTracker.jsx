@@ -1,6 +1,11 @@
 import { useEffect, useRef } from 'react';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000';
+const BATCH_URL = `${API_BASE_URL}/api/analytics/track/batch`;
+
+// Page views are queued and sent together every FLUSH_DELAY_MS (or when the tab is hidden)
+const FLUSH_DELAY_MS = 5000;
+const MAX_BATCH_EVENTS = 50;
 
 /**
  * VisitorTracker Component
@@ -10,30 +15,46 @@ const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000';
 const VisitorTracker = () => {
     const sessionStartRef = useRef(new Date().toISOString());
     const lastPageRef = useRef('');
+    const queueRef = useRef([]);
+    const timerRef = useRef(null);
 
     useEffect(() => {
-        const trackPageView = async () => {
+        const flush = () => {
+            clearTimeout(timerRef.current);
+            timerRef.current = null;
+            if (!queueRef.current.length) return;
+
+            const events = queueRef.current.splice(0, MAX_BATCH_EVENTS);
+            // A string body is sent as text/plain: no CORS preflight, and it survives page unload
+            const body = JSON.stringify({ events });
+            try {
+                if (!(navigator.sendBeacon && navigator.sendBeacon(BATCH_URL, body))) {
+                    fetch(BATCH_URL, { method: 'POST', body, keepalive: true }).catch(() => {});
+                }
+            } catch (error) {
+                // Silently fail - analytics shouldn't break the site
+                console.debug('Analytics tracking failed:', error);
+            }
+            if (queueRef.current.length) flush();
+        };
+
+        const trackPageView = () => {
             const currentPage = window.location.pathname + window.location.hash;
 
             // Don't track same page twice in a row
             if (currentPage === lastPageRef.current) return;
             lastPageRef.current = currentPage;
 
-            try {
-                await fetch(`${API_BASE_URL}/api/analytics/track`, {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify({
-                        page: currentPage,
-                        referrer: document.referrer || 'Direct',
-                        session_start: sessionStartRef.current
-                    }),
-                });
-            } catch (error) {
-                // Silently fail - analytics shouldn't break the site
-                console.debug('Analytics tracking failed:', error);
+            queueRef.current.push({
+                page: currentPage,
+                referrer: document.referrer || 'Direct',
+                session_start: sessionStartRef.current,
+                timestamp: new Date().toISOString()
+            });
+            if (queueRef.current.length >= MAX_BATCH_EVENTS) {
+                flush();
+            } else if (!timerRef.current) {
+                timerRef.current = setTimeout(flush, FLUSH_DELAY_MS);
             }
         };
 
@@ -53,9 +74,19 @@ const VisitorTracker = () => {
         };
         window.addEventListener('hashchange', hashChangeHandler);
 
+        // Send whatever is queued before the page goes away
+        const visibilityHandler = () => {
+            if (document.visibilityState === 'hidden') flush();
+        };
+        document.addEventListener('visibilitychange', visibilityHandler);
+        window.addEventListener('pagehide', flush);
+
         return () => {
             window.removeEventListener('popstate', handleNavigation);
             window.removeEventListener('hashchange', hashChangeHandler);
+            document.removeEventListener('visibilitychange', visibilityHandler);
+            window.removeEventListener('pagehide', flush);
+            flush();
         };
     }, []);
 
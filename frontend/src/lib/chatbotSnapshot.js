@@ -0,0 +1,101 @@
+// Local chatbot matching over the snapshot served by GET /api/chatbot/snapshot.
+// Mirrors QAIndex.match() in backend_auth/qa_index.py: the longest stored
+// question contained in the message wins, otherwise the best keyword score
+// (BM25 or the legacy ratio) of at least min_score. A null result means
+// "ask the API".
+
+const APOSTROPHE_RE = /['’]/g;
+const PUNCTUATION_RE = /[^\p{L}\p{N}\s]|_/gu;
+const TOKEN_RE = /[\p{L}\p{N}]+/gu;
+const EPSILON = 1e-12;
+
+// Lengths in code points, like Python's len()
+const charLength = (text) => Array.from(text).length;
+
+export const normalizeText = (text) =>
+  text
+    .toLowerCase()
+    .replace(APOSTROPHE_RE, '')
+    .replace(PUNCTUATION_RE, ' ')
+    .split(/\s+/)
+    .filter(Boolean)
+    .join(' ');
+
+// Precompute what matching needs once per snapshot
+export const prepareSnapshot = (snapshot) => {
+  const minLength = snapshot.min_token_length;
+  return {
+    ...snapshot,
+    questionLengths: snapshot.questions.map(charLength),
+    keywords: snapshot.questions.map((question) =>
+      question.split(' ').filter((word) => charLength(word) >= minLength)
+    ),
+  };
+};
+
+const phraseMatch = (snapshot, messageKey) => {
+  let best = -1;
+  snapshot.questions.forEach((question, position) => {
+    if (!question || !messageKey.includes(question)) return;
+    if (best < 0 || snapshot.questionLengths[position] > snapshot.questionLengths[best]) {
+      best = position;
+    }
+  });
+  return best;
+};
+
+const bm25Match = (snapshot, messageKey) => {
+  const tokens = new Set(
+    (messageKey.match(TOKEN_RE) || []).filter((token) => charLength(token) >= snapshot.min_token_length)
+  );
+  const raw = new Array(snapshot.questions.length).fill(0);
+  tokens.forEach((token) => {
+    const row = Object.prototype.hasOwnProperty.call(snapshot.terms, token) ? snapshot.terms[token] : null;
+    if (!row) return;
+    row[0].forEach((position, i) => {
+      raw[position] += row[1][i];
+    });
+  });
+
+  // Highest normalized score, then highest raw score, then earliest question
+  let best = -1;
+  let bestScore = 0;
+  raw.forEach((score, position) => {
+    if (score <= 0) return;
+    const normalized = score / snapshot.self_scores[position];
+    if (best < 0 || normalized > bestScore + EPSILON ||
+        (Math.abs(normalized - bestScore) <= EPSILON && score > raw[best])) {
+      best = position;
+      bestScore = normalized;
+    }
+  });
+  return best >= 0 && bestScore >= snapshot.min_score ? best : -1;
+};
+
+const ratioMatch = (snapshot, messageKey) => {
+  // Share of question keywords found anywhere in the message, earliest question on ties
+  let best = -1;
+  let bestScore = 0;
+  snapshot.keywords.forEach((keywords, position) => {
+    const found = keywords.filter((keyword) => messageKey.includes(keyword)).length;
+    if (!found) return;
+    const score = found / keywords.length;
+    if (best < 0 || score > bestScore) {
+      best = position;
+      bestScore = score;
+    }
+  });
+  return best >= 0 && bestScore >= snapshot.min_score ? best : -1;
+};
+
+// Stored answer for a message, or null when the API should be asked
+export const answerLocally = (snapshot, message) => {
+  if (!snapshot || !snapshot.questions.length) return null;
+  const messageKey = normalizeText(message);
+
+  let position = phraseMatch(snapshot, messageKey);
+  if (position < 0) {
+    position = snapshot.scorer === 'bm25' ? bm25Match(snapshot, messageKey) : ratioMatch(snapshot, messageKey);
+  }
+  return position >= 0 ? snapshot.answers[position] : null;
+};
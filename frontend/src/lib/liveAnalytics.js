@@ -0,0 +1,75 @@
+// Subscriber for GET /api/analytics/live (Server-Sent Events).
+// EventSource can't send an Authorization header, so the stream is read
+// with fetch() and parsed here. Reconnects after the server's `retry`
+// delay, resuming from the last event id; stops on 401 or unsubscribe().
+
+const DEFAULT_RETRY_MS = 5000;
+
+// Split a text buffer into complete SSE messages; returns [messages, rest]
+const parseMessages = (buffer) => {
+  const blocks = buffer.split(/\r?\n\r?\n/);
+  const rest = blocks.pop();
+  const messages = blocks.map((block) => {
+    const message = { event: 'message', data: [], id: null, retry: null };
+    block.split(/\r?\n/).forEach((line) => {
+      if (!line || line.startsWith(':')) return;
+      const colon = line.indexOf(':');
+      const field = colon < 0 ? line : line.slice(0, colon);
+      const value = colon < 0 ? '' : line.slice(colon + 1).replace(/^ /, '');
+      if (field === 'data') message.data.push(value);
+      else if (field === 'event') message.event = value;
+      else if (field === 'id') message.id = value;
+      else if (field === 'retry') message.retry = parseInt(value, 10);
+    });
+    return message;
+  });
+  return [messages, rest];
+};
+
+// onMessage(event, data) for 'snapshot', 'views' and 'counters'; returns unsubscribe()
+export const subscribeLiveAnalytics = (url, token, onMessage, onError = () => {}) => {
+  const controller = new AbortController();
+  let lastEventId = null;
+  let retryMs = DEFAULT_RETRY_MS;
+  let timer = null;
+
+  const connect = async () => {
+    try {
+      const headers = { Authorization: `Bearer ${token}`, Accept: 'text/event-stream' };
+      if (lastEventId !== null) headers['Last-Event-ID'] = lastEventId;
+      const response = await fetch(url, { headers, signal: controller.signal });
+      if (response.status === 401) {
+        onError(new Error('Authentication required'));
+        return;
+      }
+      if (!response.ok || !response.body) throw new Error(`Live stream failed (${response.status})`);
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const [messages, rest] = parseMessages(buffer);
+        buffer = rest;
+        messages.forEach((message) => {
+          if (message.retry) retryMs = message.retry;
+          if (message.id !== null) lastEventId = message.id;
+          if (message.data.length) onMessage(message.event, JSON.parse(message.data.join('\n')));
+        });
+      }
+    } catch (error) {
+      if (controller.signal.aborted) return;
+      onError(error);
+    }
+    // Stream ended (server time limit, restart, network): reconnect
+    if (!controller.signal.aborted) timer = setTimeout(connect, retryMs);
+  };
+
+  connect();
+  return () => {
+    clearTimeout(timer);
+    controller.abort();
+  };
+};
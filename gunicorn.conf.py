@@ -0,0 +1,31 @@
+"""
+gunicorn settings for the backend (read automatically when gunicorn is
+started from the repository root: gunicorn wsgi:app)
+
+/api/analytics/live holds its request open for up to
+ANALYTICS_LIVE_MAX_STREAM_SECONDS. With the default sync workers each open
+stream would take a whole worker, and the worker timeout would kill it
+mid-stream, so workers are threaded (gthread): a stream holds one thread
+and the worker keeps answering from the others. gthread workers report to
+the arbiter from their main loop, so a long stream doesn't trip `timeout`.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+# workers is left to gunicorn's own default: WEB_CONCURRENCY, or 1
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Set before the workers import the app, which reads these at import time
+if worker_class == 'sync':
+    # (gunicorn switches sync workers with threads > 1 to gthread)
+    threads = 1
+    # One request per worker: end streams before the timeout kills the worker
+    os.environ.setdefault('ANALYTICS_LIVE_MAX_STREAM_SECONDS', str(max(timeout - 5, 1)))
+    os.environ.setdefault('ANALYTICS_LIVE_MAX_CLIENTS', '1')
+else:
+    # Leave at least half of each worker's threads to ordinary requests
+    os.environ.setdefault('ANALYTICS_LIVE_MAX_CLIENTS', str(max(threads // 2, 1)))
@@ -0,0 +1,79 @@
+"""
+Shared test setup
+Backend modules import each other by bare name (import qa_index), as when
+running python backend_auth/chatbot.py, so backend_auth goes on sys.path the
+same way wsgi.py does it. Settings read at import time are set here, before
+any test module imports the backend.
+
+Tests that need the Flask app run it against mongomock (requirements-dev.txt):
+`app` gives the chatbot module with empty collections and a reloaded index.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'backend_auth'))
+
+_TEMP_DIR = tempfile.mkdtemp(prefix='portfolio-tests-')
+os.environ.setdefault('JWT_SECRET', 'test-secret-' + 'x' * 32)
+os.environ.setdefault('MONGODB_CONNECTION_STRING', 'mongodb://localhost:27017')
+os.environ['CHATBOT_INDEX_DIR'] = os.path.join(_TEMP_DIR, 'qa_index')
+os.environ['GEOIP_DB_PATH'] = os.path.join(_TEMP_DIR, 'missing-geoip.bin')
+os.environ['ANALYTICS_FLUSH_INTERVAL_SECONDS'] = '0.05'
+
+
+@pytest.fixture(scope='session', autouse=True)
+def _temp_dir():
+    yield _TEMP_DIR
+    shutil.rmtree(_TEMP_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def _app_modules():
+    """Import chatbot.py once, with get_database() returning a mongomock database"""
+    mongomock = pytest.importorskip('mongomock')
+    from database_architecture import connection
+
+    client = mongomock.MongoClient()
+    # Only for the import: chatbot keeps the database it got, and test_connection
+    # needs the real get_client() afterwards
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(connection, 'get_client', lambda: client)
+        patch.setattr(connection, 'get_database', lambda: client[connection.DATABASE_NAME])
+        import chatbot
+    yield chatbot, client[connection.DATABASE_NAME]
+
+
+@pytest.fixture
+def app(_app_modules):
+    """chatbot module with every collection emptied and the Q&A index reloaded"""
+    chatbot, db = _app_modules
+    from database_architecture.indexes import ensure_indexes
+
+    for name in db.list_collection_names():
+        db.drop_collection(name)
+    ensure_indexes(db)
+    chatbot.qa_index.load()
+    chatbot.response_cache.clear()
+    return chatbot
+
+
+@pytest.fixture
+def db(app):
+    return app.db
+
+
+@pytest.fixture
+def client(app):
+    return app.app.test_client()
+
+
+@pytest.fixture
+def admin_headers():
+    from auth import generate_token
+    return {'Authorization': 'Bearer ' + generate_token('admin-id', 'admin')}
@@ -0,0 +1,136 @@
+"""Live analytics feed (backend_auth/analytics_live.py) and its gunicorn settings"""
+import json
+import os
+import runpy
+from datetime import datetime
+
+import pytest
+
+from analytics_live import LiveFeed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def view(page, visitor='a'):
+    return {'visitor_id': visitor, 'ip': '1.2.3.4', 'page': page, 'timestamp': datetime(2026, 3, 1, 10, 15),
+            'device': 'Desktop', 'browser': 'Firefox', 'os': 'Linux',
+            'location': {'city': 'Tokyo', 'country': 'Japan', 'country_code': 'JP'}}
+
+
+def parse(message):
+    """(event, data, id) of one SSE message"""
+    fields = dict(line.split(': ', 1) for line in message.strip().split('\n'))
+    return fields.get('event'), json.loads(fields['data']), fields.get('id')
+
+
+def test_since_returns_missed_events_or_none_when_they_are_gone():
+    feed = LiveFeed(capacity=3)
+    feed.publish([view('/1'), view('/2')])
+    events, seq = feed.since(0)
+    assert [e['page'] for e in events] == ['/1', '/2'] and seq == 2
+    assert feed.since(2) == ([], 2)
+    assert 'ip' not in events[0] and 'visitor_id' not in events[0]
+
+    feed.publish([view('/3'), view('/4'), view('/5')])
+    assert feed.since(1) == (None, 5)          # /2 fell out of the buffer
+    assert [e['page'] for e in feed.since(2)[0]] == ['/3', '/4', '/5']
+    assert feed.since(9) == (None, 5)          # an id from another worker
+
+
+def test_counters():
+    feed = LiveFeed(minutes=3)
+    feed.publish([view('/', 'a'), view('/x', 'b'), view('/y', 'a')])
+    counters = feed.counters()
+    assert counters['active_visitors'] == 2
+    assert [point['views'] for point in counters['views_per_minute']] == [0, 0, 3]
+
+
+def test_stream_sends_a_snapshot_then_views_then_counters():
+    feed = LiveFeed()
+    feed.publish([view('/old')])
+    stream = feed.stream(heartbeat_seconds=0.01, max_seconds=60)
+    assert next(stream).startswith('retry: ')
+
+    event, data, event_id = parse(next(stream))
+    assert (event, [e['page'] for e in data['events']], event_id) == ('snapshot', ['/old'], feed.event_id(1))
+
+    feed.publish([view('/new')])
+    event, data, event_id = parse(next(stream))
+    assert (event, [e['page'] for e in data['events']], event_id) == ('views', ['/new'], feed.event_id(2))
+    assert data['counters']['active_visitors'] == 1
+
+    event, data, event_id = parse(next(stream))   # quiet heartbeat
+    assert (event, event_id) == ('counters', None)
+    assert 'views_per_minute' in data
+
+
+def test_reconnecting_stream_gets_the_views_it_missed():
+    feed = LiveFeed()
+    feed.publish([view('/1'), view('/2'), view('/3')])
+    messages = list(feed.stream(last_event_id=feed.event_id(1), max_seconds=0))
+    event, data, event_id = parse(messages[1])
+    assert (event, [e['page'] for e in data['events']], event_id) == ('views', ['/2', '/3'], feed.event_id(3))
+    assert len(messages) == 2   # ends at max_seconds
+
+    assert len(list(feed.stream(last_event_id=feed.event_id(3), max_seconds=0))) == 1   # nothing missed
+
+
+@pytest.mark.parametrize('last_event_id', ['other-1', '1', 'garbage', ''])
+def test_ids_from_another_worker_get_a_snapshot(last_event_id):
+    feed, other = LiveFeed(), LiveFeed()
+    feed.publish([view('/1'), view('/2'), view('/3')])
+    other.publish([view('/elsewhere')])
+    assert feed.boot_id != other.boot_id
+
+    for event_id in (last_event_id, other.event_id(1)):
+        event, data, sent_id = parse(list(feed.stream(last_event_id=event_id, max_seconds=0))[1])
+        assert (event, [e['page'] for e in data['events']], sent_id) == ('snapshot', ['/1', '/2', '/3'],
+                                                                          feed.event_id(3))
+
+
+def test_a_forked_worker_gets_its_own_boot_id(monkeypatch):
+    feed = LiveFeed()
+    parent = feed.boot_id
+    monkeypatch.setattr(os, 'getpid', lambda: -1)
+    assert feed.boot_id != parent
+    assert feed.parse_event_id(f'{parent}-1') is None
+
+
+def test_client_slots():
+    feed = LiveFeed(max_clients=1)
+    assert feed.acquire_client() is True
+    assert feed.acquire_client() is False
+    feed.release_client()
+    assert feed.acquire_client() is True
+    assert feed.metrics()['clients'] == 1
+
+
+@pytest.fixture
+def gunicorn_env(monkeypatch):
+    """Loads gunicorn.conf.py with the given environment (restored afterwards)"""
+    names = ['WEB_CONCURRENCY', 'GUNICORN_WORKER_CLASS', 'GUNICORN_THREADS', 'GUNICORN_TIMEOUT',
+             'ANALYTICS_LIVE_MAX_STREAM_SECONDS', 'ANALYTICS_LIVE_MAX_CLIENTS']
+    for name in names:
+        monkeypatch.setenv(name, '')
+        monkeypatch.delenv(name)
+
+    def load(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        settings = runpy.run_path(os.path.join(ROOT, 'gunicorn.conf.py'))
+        return settings, {name: os.environ.get(name) for name in names[4:]}
+    return load
+
+
+def test_gunicorn_runs_threaded_workers_by_default(gunicorn_env):
+    settings, env = gunicorn_env()
+    assert settings['worker_class'] == 'gthread'
+    assert 'workers' not in settings   # gunicorn's default: WEB_CONCURRENCY, or 1
+    assert env == {'ANALYTICS_LIVE_MAX_STREAM_SECONDS': None,
+                   'ANALYTICS_LIVE_MAX_CLIENTS': str(settings['threads'] // 2)}
+
+
+def test_sync_workers_close_streams_before_the_timeout(gunicorn_env):
+    settings, env = gunicorn_env(GUNICORN_WORKER_CLASS='sync', GUNICORN_TIMEOUT='30')
+    assert settings['threads'] == 1
+    assert env == {'ANALYTICS_LIVE_MAX_STREAM_SECONDS': '25', 'ANALYTICS_LIVE_MAX_CLIENTS': '1'}
@@ -0,0 +1,127 @@
+"""Analytics rollups (backend_auth/analytics_rollups.py)"""
+from datetime import timedelta
+
+import pytest
+
+from analytics import compute_raw_stats
+from analytics_ingest import LocationBackfill, VisitorCoalescer, WriteBehindBuffer
+from analytics_rollups import ROLLUP_COLLECTION, RollupWriter, read_rollup_stats, rebuild_rollups
+from location_resolver import PENDING_LOCATION
+from timestamps import utc_now
+
+mongomock = pytest.importorskip('mongomock')
+
+INDIA = {'city': 'Bhubaneswar', 'region': 'Odisha', 'country': 'India', 'country_code': 'IN'}
+JAPAN = {'city': 'Tokyo', 'region': 'Tokyo', 'country': 'Japan', 'country_code': 'JP'}
+
+
+class Ingest:
+    """The tracking pipeline of analytics.py, flushed by hand"""
+
+    def __init__(self, db):
+        self.rollups = RollupWriter(db[ROLLUP_COLLECTION])
+        self.views = WriteBehindBuffer(db.page_views, flush_interval=3600, on_written=self.rollups.record_page_views)
+        self.visitors = VisitorCoalescer(db.visitors, flush_interval=3600, rollups=self.rollups)
+        self.backfill = LocationBackfill(db.page_views, db.visitors, flush_interval=3600, rollups=self.rollups)
+
+    def visit(self, visitor_id, timestamp, page, location, browser='Firefox'):
+        self.views.submit({'visitor_id': visitor_id, 'ip': visitor_id, 'location': location, 'device': 'Desktop',
+                           'browser': browser, 'os': 'Linux', 'page': page, 'timestamp': timestamp})
+        self.visitors.record(visitor_id, timestamp, page, location, {
+            'ip': visitor_id, 'device': 'Desktop', 'browser': browser, 'os': 'Linux', 'first_visit': timestamp
+        })
+        self.views.flush()
+        self.visitors.flush()
+
+    def resolve(self, db, visitor_id, location):
+        self.backfill.add_page_views(list(db.page_views.find({'visitor_id': visitor_id})), location)
+        self.backfill.add_visitors([visitor_id], location)
+        self.backfill.flush()
+
+
+class ScanHook:
+    """Database wrapper that runs on_scan right after the first visitors scan has been read"""
+
+    def __init__(self, db, on_scan):
+        self._db = db
+        self._on_scan = on_scan
+
+    def __getattr__(self, name):
+        return self[name]
+
+    def __getitem__(self, name):
+        collection = self._db[name]
+        if name != 'visitors' or self._on_scan is None:
+            return collection
+        hook = self
+
+        class Visitors:
+            def find(self, *args, **kwargs):
+                documents = list(collection.find(*args, **kwargs))
+                on_scan, hook._on_scan = hook._on_scan, None
+                on_scan()
+                return iter(documents)
+        return Visitors()
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+def assert_rollups_match_raw(db, now):
+    from_rollups = read_rollup_stats(db[ROLLUP_COLLECTION], now)
+    from_raw = compute_raw_stats(db.visitors, db.page_views, now)
+    for key in from_raw:
+        assert from_rollups.get(key) == from_raw[key], key
+
+
+def test_rollups_are_missing_until_the_first_rebuild(db):
+    assert read_rollup_stats(db[ROLLUP_COLLECTION]) is None
+    rebuild_rollups(db)
+    assert read_rollup_stats(db[ROLLUP_COLLECTION])['visitors']['total'] == 0
+
+
+def test_ingest_increments_match_a_rebuild(db):
+    now = utc_now()
+    ingest = Ingest(db)
+    rebuild_rollups(db)
+    ingest.visit('a', now - timedelta(days=3), '/', INDIA)
+    ingest.visit('a', now - timedelta(minutes=5), '/blog', JAPAN)
+    ingest.visit('b', now - timedelta(hours=1), '/', dict(PENDING_LOCATION), browser='Chrome')
+    ingest.resolve(db, 'b', INDIA)
+    assert_rollups_match_raw(db, now)
+
+    rebuild_rollups(db)
+    assert_rollups_match_raw(db, now)
+
+
+def test_writes_during_a_rebuild_are_not_lost(db):
+    now = utc_now()
+    ingest = Ingest(db)
+    ingest.visit('a', now - timedelta(days=2), '/', INDIA)
+    ingest.visit('b', now - timedelta(days=1), '/', dict(PENDING_LOCATION), browser='Chrome')
+
+    def traffic():
+        ingest.visit('a', now - timedelta(minutes=1), '/projects', JAPAN)   # existing visitor moves bucket and country
+        ingest.visit('c', now - timedelta(minutes=1), '/', INDIA)           # new visitor
+        ingest.resolve(db, 'b', INDIA)                                      # pending location filled in
+
+    rebuild_rollups(ScanHook(db, traffic), cutoff_margin=0)
+    stats = read_rollup_stats(db[ROLLUP_COLLECTION], now)
+    assert stats['visitors']['total'] == 3
+    assert stats['page_views']['total'] == 4
+    assert stats['countries'] == {'India': 2, 'Japan': 1}
+    assert_rollups_match_raw(db, now)
+
+
+def test_old_documents_changed_during_the_scan_are_replayed(db):
+    """Visitors before the cutoff are re-read once they are updated"""
+    now = utc_now()
+    ingest = Ingest(db)
+    ingest.visit('a', now - timedelta(days=2), '/', INDIA)
+    db.visitors.update_many({}, {'$unset': {'updated_at': ''}})   # written before updated_at existed
+
+    rebuild_rollups(ScanHook(db, lambda: ingest.visit('a', now, '/', JAPAN)), cutoff_margin=0)
+    assert read_rollup_stats(db[ROLLUP_COLLECTION], now)['countries'] == {'Japan': 1}
+    assert_rollups_match_raw(db, now)
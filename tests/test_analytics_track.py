@@ -0,0 +1,61 @@
+"""Page view tracking (/api/analytics/track/batch, backend_auth/analytics.py)"""
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import analytics
+from analytics import event_timestamp
+from test_timestamps import parse_as_python310
+
+
+@pytest.fixture(params=['current', '3.10'])
+def python(request, monkeypatch):
+    """Runs a test as is and with timestamps parsed by a pre-3.11 fromisoformat"""
+    if request.param == '3.10':
+        monkeypatch.setattr(analytics, 'parse_timestamp', parse_as_python310)
+    return request.param
+
+
+def iso_string(moment):
+    """new Date().toISOString()"""
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.') + f'{moment.microsecond // 1000:03d}Z'
+
+
+def wait_for(collection, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while collection.count_documents({}) < count and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return list(collection.find().sort('page', 1))
+
+
+def test_event_timestamp(python):
+    now = datetime(2026, 3, 1, 10, 15)
+    assert event_timestamp('2026-03-01T10:14:00.250Z', now) == datetime(2026, 3, 1, 10, 14, 0, 250000)
+    assert event_timestamp('2026-03-01T15:44:00+05:30', now) == datetime(2026, 3, 1, 10, 14)
+    assert event_timestamp('2026-03-01T10:16:00Z', now) == now   # in the future
+    old = now - timedelta(seconds=analytics.TRACK_BATCH_MAX_AGE_SECONDS + 1)
+    assert event_timestamp(iso_string(old), now) == now
+    assert event_timestamp('yesterday', now) == now
+    assert event_timestamp(None, now) == now
+
+
+def test_batched_events_keep_their_browser_timestamps(client, db, python):
+    sent = datetime.utcnow().replace(microsecond=123000) - timedelta(seconds=30)
+    response = client.post('/api/analytics/track/batch', json={'events': [
+        {'page': '/a', 'timestamp': iso_string(sent), 'session_start': iso_string(sent - timedelta(minutes=2))},
+        {'page': '/b'},
+    ]})
+    assert response.status_code == 200
+    assert response.json['count'] == 2
+
+    first, second = wait_for(db.page_views, 2)
+    assert first['timestamp'] == sent
+    assert first['session_start'] == sent - timedelta(minutes=2)
+    assert abs((second['timestamp'] - datetime.utcnow()).total_seconds()) < 5   # no timestamp: now
+
+
+@pytest.mark.parametrize('body', ['', 'not json', '[]', '{"events": [1]}', '{"events": {}}'])
+def test_invalid_batches(client, body):
+    response = client.post('/api/analytics/track/batch', data=body, content_type='text/plain')
+    assert response.status_code == 400
@@ -0,0 +1,73 @@
+"""Visitor list pagination (/api/analytics/visitors, backend_auth/analytics.py)"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import analytics
+from analytics import decode_visitor_cursor, encode_visitor_cursor
+from test_timestamps import parse_as_python310
+
+
+@pytest.fixture(params=['current', '3.10'])
+def python(request, monkeypatch):
+    """Runs a test as is and with cursors parsed by a pre-3.11 fromisoformat"""
+    if request.param == '3.10':
+        monkeypatch.setattr(analytics, 'parse_timestamp', parse_as_python310)
+    return request.param
+
+
+@pytest.mark.parametrize('last_visit', [
+    datetime(2026, 3, 1, 10, 15),
+    datetime(2026, 3, 1, 10, 15, 30, 123456),
+])
+def test_cursor_round_trip(python, last_visit):
+    cursor = encode_visitor_cursor({'last_visit': last_visit, 'visitor_id': 'abc123'})
+    assert '=' not in cursor
+    assert decode_visitor_cursor(cursor) == (last_visit, 'abc123')
+
+
+@pytest.mark.parametrize('cursor', ['', 'not-base64!', 'WzEsMl0', 'WyJub3QgYSBkYXRlIiwiYSJd'])
+def test_malformed_cursors(cursor):
+    with pytest.raises(ValueError):
+        decode_visitor_cursor(cursor)
+
+
+def test_two_pages(client, db, admin_headers, python):
+    now = datetime.utcnow().replace(microsecond=0)
+    # Two visitors share a last_visit, so the page boundary falls between a tie
+    db.visitors.insert_many([
+        {'visitor_id': f'v{i}', 'last_visit': now - timedelta(minutes=i // 2 * 2), 'visit_count': 1}
+        for i in range(5)
+    ])
+
+    first = client.get('/api/analytics/visitors?limit=3', headers=admin_headers)
+    assert first.status_code == 200
+    assert [v['visitor_id'] for v in first.json['visitors']] == ['v1', 'v0', 'v3']
+    assert first.json['next_cursor']
+
+    second = client.get(f"/api/analytics/visitors?limit=3&cursor={first.json['next_cursor']}",
+                        headers=admin_headers)
+    assert second.status_code == 200
+    assert [v['visitor_id'] for v in second.json['visitors']] == ['v2', 'v4']
+    assert second.json['next_cursor'] is None
+
+
+def test_bad_cursor_is_a_400(client, admin_headers):
+    response = client.get('/api/analytics/visitors?cursor=bogus', headers=admin_headers)
+    assert response.status_code == 400
+
+
+def test_fields_and_array_caps(client, db, admin_headers):
+    db.visitors.insert_one({'visitor_id': 'v', 'ip': '1.2.3.4', 'last_visit': datetime.utcnow(), 'visit_count': 30,
+                            'pages_visited': [f'/{i}' for i in range(30)]})
+
+    default = client.get('/api/analytics/visitors', headers=admin_headers).json['visitors'][0]
+    assert len(default['pages_visited']) == 20
+    assert default['pages_visited'][-1] == '/29'   # the latest are kept
+
+    visitor = client.get('/api/analytics/visitors?fields=visit_count,pages_visited&max_array=2',
+                         headers=admin_headers).json['visitors'][0]
+    assert set(visitor) == {'visitor_id', 'last_visit', 'visit_count', 'pages_visited'}
+    assert visitor['pages_visited'] == ['/28', '/29']
+
+    assert client.get('/api/analytics/visitors?fields=password', headers=admin_headers).status_code == 400
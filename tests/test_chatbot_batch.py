@@ -0,0 +1,46 @@
+"""Batch chatbot endpoint (/api/chatbot/batch)"""
+import pytest
+
+
+@pytest.fixture
+def qas(client, admin_headers):
+    for question, answer in (('where do you live', 'India'), ('what are your skills', 'Python')):
+        client.post('/api/chatbot/qa', json={'question': question, 'answer': answer}, headers=admin_headers)
+
+
+def test_answers_match_the_single_message_endpoint(app, client, qas):
+    messages = ['Where do you live?', 'tell me a joke', 'What are your main skills', 'where do you LIVE']
+    response = client.post('/api/chatbot/batch', json={'messages': messages})
+    assert response.status_code == 200
+    assert response.json['count'] == 4
+    answers = [result['response'] for result in response.json['results']]
+    assert answers == [client.post('/api/chatbot', json={'message': m}).json['response'] for m in messages]
+    assert answers[1] == app.DEFAULT_RESPONSE
+    assert response.json['results'][0]['qa_id'] == response.json['results'][3]['qa_id'] is not None
+    assert response.json['results'][1]['qa_id'] is None
+
+
+def test_repeated_messages_are_matched_once(app, client, qas, monkeypatch):
+    seen = []
+    match_many = app.qa_index.match_many
+    monkeypatch.setattr(app.qa_index, 'match_many', lambda keys: seen.append(keys) or match_many(keys))
+    client.post('/api/chatbot/batch', json={'messages': ['Skills?', 'skills', 'where do you live']})
+    assert seen == [['skills', 'where do you live']]
+
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'messages': []},
+    {'messages': 'not a list'},
+    {'messages': ['fine', '  ']},
+    {'messages': ['fine', 42]},
+])
+def test_invalid_batches(client, body):
+    response = client.post('/api/chatbot/batch', json=body)
+    assert response.status_code == 400
+    assert response.json['success'] is False
+
+
+def test_batch_size_limit(app, client):
+    messages = ['hello'] * (app.BATCH_MAX_MESSAGES + 1)
+    assert client.post('/api/chatbot/batch', json={'messages': messages}).status_code == 400
@@ -0,0 +1,78 @@
+"""Shared MongoClient per process (database_architecture/connection.py)"""
+import pytest
+
+from database_architecture import connection
+
+
+class FakeClient:
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        self.kwargs = kwargs
+        self.closed = False
+        self.admin = self
+        FakeClient.instances.append(self)
+
+    def command(self, name):
+        return {'ok': 1}
+
+    def close(self):
+        self.closed = True
+
+    def __getitem__(self, name):
+        return (self, name)
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    FakeClient.instances = []
+    monkeypatch.setattr(connection, 'MongoClient', FakeClient)
+    monkeypatch.setattr(connection, '_client', None)
+    monkeypatch.setattr(connection, '_client_pid', None)
+    return FakeClient
+
+
+def test_client_is_created_once_per_process(fake_client):
+    first = connection.get_client()
+    assert connection.get_client() is first
+    assert connection.get_database() == (first, connection.DATABASE_NAME)
+    assert len(fake_client.instances) == 1
+    assert first.kwargs['maxPoolSize'] == connection.POOL_SETTINGS['maxPoolSize']
+
+
+def test_forked_child_gets_a_new_client(fake_client, monkeypatch):
+    parent = connection.get_client()
+    monkeypatch.setattr(connection, '_client_pid', -1)   # as seen from a child process
+    child = connection.get_client()
+    assert child is not parent
+    assert not parent.closed   # the parent's sockets are left alone
+
+
+def test_close_client(fake_client):
+    client = connection.get_client()
+    connection.close_client()
+    assert client.closed
+    assert connection.get_pool_stats()['connected'] is False
+
+
+def test_pool_stats_counters():
+    listener = connection.PoolStatsListener()
+    for _ in range(3):
+        listener.connection_created(None)
+        listener.connection_checked_out(None)
+    listener.connection_closed(None)
+    listener.connection_checked_in(None)
+    stats = listener.snapshot()
+    assert stats['open_connections'] == 2
+    assert stats['in_use'] == 2
+
+
+def test_pool_stats_need_authentication(client, admin_headers):
+    health = client.get('/api/health')
+    assert health.status_code == 200
+    assert 'database_pool' not in health.json
+
+    assert client.get('/api/health/database').status_code == 401
+    pool = client.get('/api/health/database', headers=admin_headers)
+    assert pool.status_code == 200
+    assert 'settings' in pool.json['database_pool']
@@ -0,0 +1,64 @@
+"""Offline GeoIP database (backend_auth/geoip.py, build_geoip_db.py)"""
+import csv
+
+import pytest
+
+from build_geoip_db import build
+from geoip import GeoIPDatabase
+
+ROWS = [
+    ('start', 'end', 'country_code', 'country', 'region', 'city'),
+    ('1.0.0.0', '1.0.0.255', 'au', 'Australia', 'Queensland', 'Brisbane'),
+    ('1.0.1.0', '1.0.1.255', 'AU', 'Australia', 'Queensland', 'Brisbane'),   # merged with the row above
+    ('1.0.1.128', '1.0.2.0', 'CN', 'China', 'Fujian', 'Fuzhou'),              # overlap, dropped
+    ('16778240', '16778495', 'CN', 'China', 'Fujian', 'Fuzhou'),             # 1.0.4.0/24 as integers
+    ('2001:db8::', '2001:db8::ffff', 'IN', 'India', 'Odisha', '-'),
+]
+
+
+@pytest.fixture
+def database(tmp_path):
+    source = tmp_path / 'ranges.csv'
+    with open(source, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(ROWS)
+    output = tmp_path / 'geoip.bin'
+    build([str(source)], str(output), ROWS[0])
+    database = GeoIPDatabase(str(output))
+    yield database
+    database.close()
+
+
+def test_ranges_are_merged_and_overlaps_dropped(database):
+    assert (database.v4_count, database.v6_count, database.location_count) == (2, 1, 3)
+
+
+def test_ipv4_lookups(database):
+    brisbane = {'city': 'Brisbane', 'region': 'Queensland', 'country': 'Australia', 'country_code': 'AU'}
+    assert database.lookup('1.0.0.0') == brisbane
+    assert database.lookup('1.0.1.255') == brisbane
+    assert database.lookup(' 1.0.4.9 ')['city'] == 'Fuzhou'
+    assert database.lookup('1.0.2.1') is None      # between ranges
+    assert database.lookup('0.255.255.255') is None
+
+
+def test_ipv6_and_mapped_ipv4_lookups(database):
+    assert database.lookup('2001:db8::1') == {
+        'city': 'Unknown', 'region': 'Odisha', 'country': 'India', 'country_code': 'IN'
+    }
+    assert database.lookup('2001:db8::1:0') is None
+    assert database.lookup('::ffff:1.0.0.7')['country_code'] == 'AU'
+
+
+def test_bad_input(database, tmp_path):
+    assert database.lookup('not an ip') is None
+    assert database.lookup(None) is None
+
+    bad = tmp_path / 'bad.bin'
+    bad.write_bytes(b'NOTGEOIP' + bytes(16))
+    with pytest.raises(ValueError):
+        GeoIPDatabase(str(bad))
+
+
+def test_lookups_return_copies(database):
+    database.lookup('1.0.0.1')['city'] = 'changed'
+    assert database.lookup('1.0.0.1')['city'] == 'Brisbane'
@@ -0,0 +1,57 @@
+"""Index registry (database_architecture/indexes.py)"""
+from datetime import datetime
+
+import pytest
+from pymongo import ASCENDING
+
+from database_architecture.indexes import INDEXES, ensure_indexes
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+def test_creates_every_declared_index_once(db):
+    summary = ensure_indexes(db)
+    assert len(summary['created']) == sum(len(models) for models in INDEXES.values())
+    assert summary['errors'] == []
+
+    again = ensure_indexes(db)
+    assert again['created'] == [] and again['merged'] == []
+    assert len(again['existing']) == len(summary['created'])
+
+
+def test_same_key_with_other_options_is_reported_not_dropped(db):
+    db.users.create_index([('username', ASCENDING)])   # not unique
+    summary = ensure_indexes(db, ['users'])
+    assert summary['conflicts'] == ['users.username_1']
+    assert not db.users.index_information()['username_1'].get('unique')
+
+
+def test_duplicate_visitors_are_merged_before_the_unique_index(db):
+    db.visitors.insert_many([
+        {'visitor_id': 'a', 'visit_count': 2, 'first_visit': datetime(2026, 1, 5),
+         'last_visit': datetime(2026, 1, 6), 'pages_visited': ['/', '/blog'], 'location': {'country': 'India'}},
+        {'visitor_id': 'b', 'visit_count': 1, 'first_visit': datetime(2026, 1, 1),
+         'last_visit': datetime(2026, 1, 1), 'pages_visited': ['/']},
+        {'visitor_id': 'a', 'visit_count': 3, 'first_visit': '2026-01-02T08:00:00',
+         'last_visit': datetime(2026, 2, 1), 'pages_visited': ['/', '/projects'], 'location': {'country': 'Japan'}},
+    ])
+    first_id = db.visitors.find_one({'visitor_id': 'a'})['_id']
+
+    summary = ensure_indexes(db, ['visitors'])
+    assert summary['errors'] == []
+    assert summary['merged'] == ['visitors: 1 duplicate documents']
+    assert db.visitors.index_information()['visitor_id_1']['unique']
+
+    merged = db.visitors.find_one({'visitor_id': 'a'})
+    assert merged['_id'] == first_id
+    assert merged['visit_count'] == 5
+    assert merged['first_visit'] == datetime(2026, 1, 5)   # migrated datetimes win over legacy strings
+    assert merged['last_visit'] == datetime(2026, 2, 1)
+    assert merged['pages_visited'] == ['/', '/blog', '/projects']
+    assert merged['location'] == {'country': 'Japan'}
+    assert db.visitors.count_documents({}) == 2
@@ -0,0 +1,174 @@
+"""Background IP -> location resolution (backend_auth/location_resolver.py)"""
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import location_resolver
+from analytics_ingest import LocationBackfill
+from analytics_rollups import TOTAL_ID, RollupWriter
+from location_resolver import PENDING_LOCATION, LocationResolver, is_pending, sweep_pending
+
+mongomock = pytest.importorskip('mongomock')
+
+T0 = datetime(2026, 3, 1, 10, 15)
+INDIA = {'city': 'Bhubaneswar', 'region': 'Odisha', 'country': 'India', 'country_code': 'IN'}
+UNKNOWN = {'city': 'Unknown', 'region': 'Unknown', 'country': 'Unknown', 'country_code': 'XX'}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(location_resolver, 'time', SimpleNamespace(monotonic=clock, perf_counter=time.perf_counter))
+    return clock
+
+
+class Lookup:
+    """Location source that counts calls and can be held until released"""
+
+    def __init__(self, results=None, release=None):
+        self.results = results or {}
+        self.release = release
+        self.calls = []
+
+    def __call__(self, ip):
+        self.calls.append(ip)
+        if self.release is not None:
+            self.release.wait(5)
+        result = self.results.get(ip)
+        if isinstance(result, Exception):
+            raise result
+        return dict(result) if result else None
+
+
+def test_results_are_cached_until_the_ttl(clock):
+    lookup = Lookup({'1.1.1.1': INDIA})
+    resolver = LocationResolver(lookup, UNKNOWN, ttl_seconds=60)
+    assert resolver.get('1.1.1.1') == INDIA
+    assert resolver.cached('1.1.1.1') == INDIA
+    assert lookup.calls == ['1.1.1.1']
+
+    clock.now += 61
+    assert resolver.cached('1.1.1.1') is None
+    assert resolver.get('1.1.1.1') == INDIA
+    assert len(lookup.calls) == 2
+    assert (resolver.metrics()['hits'], resolver.metrics()['misses']) == (1, 3)
+
+
+def test_failures_get_the_fallback_for_a_shorter_time(clock):
+    lookup = Lookup({'2.2.2.2': RuntimeError('timeout')})
+    resolver = LocationResolver(lookup, UNKNOWN, ttl_seconds=3600, failure_ttl_seconds=10)
+    assert resolver.get('2.2.2.2') == UNKNOWN
+    assert resolver.get('3.3.3.3') == UNKNOWN   # no result
+    assert resolver.get('2.2.2.2') == UNKNOWN
+    assert len(lookup.calls) == 2
+    assert resolver.metrics()['failures'] == 2
+
+    clock.now += 11
+    resolver.get('2.2.2.2')
+    assert len(lookup.calls) == 3
+
+
+def test_cache_size_is_bounded():
+    resolver = LocationResolver(Lookup({}), UNKNOWN, cache_size=2)
+    for ip in ('1.0.0.1', '1.0.0.2', '1.0.0.3'):
+        resolver.get(ip)
+    assert resolver.metrics()['cached'] == 2
+    assert resolver.cached('1.0.0.1') is None
+
+
+def test_concurrent_resolves_of_one_ip_share_a_lookup():
+    release = threading.Event()
+    lookup = Lookup({'1.1.1.1': INDIA}, release=release)
+    resolver = LocationResolver(lookup, UNKNOWN, workers=2)
+    results = []
+    done = threading.Event()
+
+    def callback(location):
+        results.append(location)
+        if len(results) == 3:
+            done.set()
+
+    for _ in range(3):
+        assert resolver.resolve('1.1.1.1', callback) is True
+    release.set()
+    assert done.wait(5)
+    assert results == [INDIA] * 3
+    assert lookup.calls == ['1.1.1.1']
+    assert resolver.metrics()['merged'] == 2
+
+    # Cached now: the callback runs on the caller's thread
+    resolver.resolve('1.1.1.1', results.append)
+    assert len(results) == 4
+
+
+def test_resolve_is_rejected_when_the_pool_is_saturated():
+    release = threading.Event()
+    resolver = LocationResolver(Lookup({}, release=release), UNKNOWN, workers=1, max_in_flight=2)
+    try:
+        assert resolver.resolve('1.0.0.1') and resolver.resolve('1.0.0.2')
+        assert resolver.resolve('1.0.0.3') is False
+        assert resolver.metrics()['rejected'] == 1
+    finally:
+        release.set()
+
+
+def test_sweep_backfills_pending_events():
+    db = mongomock.MongoClient().db
+    db.page_views.insert_many([
+        {'ip': '1.1.1.1', 'visitor_id': 'a', 'timestamp': T0, 'location': dict(PENDING_LOCATION)},
+        {'ip': '9.9.9.9', 'visitor_id': 'b', 'timestamp': T0, 'location': dict(PENDING_LOCATION)},
+        {'ip': '1.1.1.1', 'visitor_id': 'a', 'timestamp': T0, 'location': dict(INDIA)},
+    ])
+    db.visitors.insert_one({'visitor_id': 'a', 'ip': '1.1.1.1', 'location': dict(PENDING_LOCATION)})
+    lookup = Lookup({'1.1.1.1': INDIA})
+    resolver = LocationResolver(lookup, UNKNOWN)
+    backfill = LocationBackfill(db.page_views, db.visitors, batch_size=100, flush_interval=3600)
+
+    assert sweep_pending(db, resolver, backfill) == 3
+    assert sorted(lookup.calls) == ['1.1.1.1', '9.9.9.9']   # the visitor's IP was cached
+    assert not any(is_pending(doc['location']) for doc in db.page_views.find())
+    assert db.page_views.count_documents({'location.country': 'India'}) == 2
+    assert db.page_views.count_documents({'location.country': 'Unknown'}) == 1
+    visitor = db.visitors.find_one({'visitor_id': 'a'})
+    assert visitor['location'] == INDIA and 'updated_at' in visitor
+    backfill.close()
+
+
+def test_a_failed_group_requeues_only_itself():
+    db = mongomock.MongoClient().db
+    view_id = db.page_views.insert_one({'visitor_id': 'a', 'timestamp': T0,
+                                        'location': dict(PENDING_LOCATION)}).inserted_id
+    db.visitors.insert_one({'visitor_id': 'a', 'location': dict(PENDING_LOCATION)})
+    backfill = LocationBackfill(db.page_views, db.visitors, batch_size=100, flush_interval=3600,
+                                rollups=RollupWriter(db.analytics_rollups))
+    backfill.add_page_views([{'_id': view_id, 'timestamp': T0}], INDIA)
+    backfill.add_visitors(['a'], INDIA)
+
+    update_many = db.visitors.update_many
+
+    def unavailable(*args, **kwargs):
+        raise ConnectionError('database unavailable')
+    db.visitors.update_many = unavailable
+    assert backfill.flush() == 1                       # the page view group
+    assert backfill.metrics()['queue_depth'] == 1      # only the visitor is retried
+    assert backfill.failed_flushes == 1
+    hour = db.analytics_rollups.find_one({'_id': 'hour:2026-03-01T10'})
+    assert hour['views_by']['country']['India'] == 1   # its move was recorded
+
+    db.visitors.update_many = update_many
+    assert backfill.flush() == 1
+    assert db.visitors.find_one({'visitor_id': 'a'})['location'] == INDIA
+    assert db.analytics_rollups.find_one({'_id': TOTAL_ID})['countries']['India'] == 1
+    assert db.analytics_rollups.find_one({'_id': 'hour:2026-03-01T10'})['views_by']['country']['India'] == 1
+    backfill.close()
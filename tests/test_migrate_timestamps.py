@@ -0,0 +1,58 @@
+"""ISO-string -> datetime timestamp backfill (backend_auth/migrate_timestamps.py)"""
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import migrate_timestamps
+from migrate_timestamps import CHECKPOINT_COLLECTION, migrate_collection
+
+mongomock = pytest.importorskip('mongomock')
+
+FIELDS = ['timestamp', 'session_start']
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+def test_strings_become_utc_datetimes(db):
+    db.page_views.insert_many([
+        {'page': '/a', 'timestamp': '2026-03-01T10:15:00', 'session_start': '2026-03-01T10:00:00Z'},
+        {'page': '/b', 'timestamp': '2026-03-01T15:45:00+05:30', 'session_start': datetime(2026, 3, 1, 10)},
+        {'page': '/c', 'timestamp': 'garbage'},
+        {'page': '/d', 'timestamp': datetime(2026, 3, 1, 10, 15)},
+    ])
+    assert migrate_collection(db, 'page_views', FIELDS, pause=0, assume_utc=True) == 2
+
+    views = {doc['page']: doc for doc in db.page_views.find()}
+    assert views['/a']['timestamp'] == datetime(2026, 3, 1, 10, 15)
+    assert views['/a']['session_start'] == datetime(2026, 3, 1, 10)
+    assert views['/b']['timestamp'] == datetime(2026, 3, 1, 10, 15)
+    assert views['/c']['timestamp'] == 'garbage'   # left for a human
+    assert db[CHECKPOINT_COLLECTION].find_one({'_id': 'timestamps:page_views'})['done'] is True
+
+    # Finished collections are skipped until --restart
+    db.page_views.insert_one({'page': '/e', 'timestamp': '2026-03-01T10:15:00Z'})
+    assert migrate_collection(db, 'page_views', FIELDS, pause=0) == 0
+    assert migrate_collection(db, 'page_views', FIELDS, pause=0, restart=True) == 1
+
+
+def test_an_interrupted_run_resumes_after_its_last_batch(db, monkeypatch):
+    db.page_views.insert_many([{'page': f'/{i}', 'timestamp': f'2026-03-01T10:{i:02d}:00Z'} for i in range(5)])
+
+    def stop(seconds):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(migrate_timestamps, 'time', SimpleNamespace(sleep=stop))
+    with pytest.raises(KeyboardInterrupt):
+        migrate_collection(db, 'page_views', FIELDS, batch_size=2, pause=1)
+    assert db.page_views.count_documents({'timestamp': {'$type': 'string'}}) == 3
+
+    # The second run starts after the checkpoint instead of rescanning
+    scanned = []
+    find = db.page_views.find
+    monkeypatch.setattr(db.page_views, 'find', lambda query, *a, **k: scanned.append(query) or find(query, *a, **k))
+    assert migrate_collection(db, 'page_views', FIELDS, batch_size=2, pause=0) == 3
+    assert '_id' in scanned[0]
+    assert db.page_views.count_documents({'timestamp': {'$type': 'string'}}) == 0
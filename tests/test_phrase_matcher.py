@@ -0,0 +1,47 @@
+"""Aho-Corasick phrase matcher (backend_auth/phrase_matcher.py)"""
+import random
+
+from phrase_matcher import PhraseMatcher
+
+
+def brute_force_best(phrases, text):
+    """Longest contained phrase, first added on ties (the scan PhraseMatcher replaced)"""
+    best = None
+    for phrase, value in phrases:
+        if phrase and phrase in text and (best is None or len(phrase) > len(best[0])):
+            best = (phrase, value)
+    return best[1] if best else None
+
+
+def test_longest_phrase_wins():
+    matcher = PhraseMatcher([('who are you', 'short'), ('who are you really', 'long')])
+    assert matcher.best('so who are you really') == 'long'
+    assert matcher.best('who are you') == 'short'
+    assert matcher.best('who are') is None
+
+
+def test_first_phrase_wins_on_equal_length():
+    matcher = PhraseMatcher([('abc', 1), ('bcd', 2), ('abc', 3)])
+    assert matcher.best('xabcdx') == 1
+    assert matcher.best('bcd abc') == 1
+
+
+def test_overlapping_phrases_through_failure_links():
+    matcher = PhraseMatcher([('he', 'he'), ('she', 'she'), ('his', 'his'), ('hers', 'hers')])
+    assert sorted(matcher.find_all('ushers')) == [(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')]
+    assert matcher.best('ushers') == 'hers'
+
+
+def test_empty_matcher_and_empty_phrases():
+    assert PhraseMatcher().best('anything') is None
+    assert len(PhraseMatcher([('', 'skipped'), ('a', 'kept')])) == 1
+
+
+def test_same_answers_as_a_scan():
+    rng = random.Random(7)
+    alphabet = 'abc '
+    phrases = [(''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 6))), i) for i in range(200)]
+    matcher = PhraseMatcher(phrases)
+    for _ in range(500):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        assert matcher.best(text) == brute_force_best(phrases, text), text
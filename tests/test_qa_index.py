@@ -0,0 +1,118 @@
+"""In-memory Q&A index (backend_auth/qa_index.py)"""
+import threading
+
+import pytest
+
+from qa_index import QAIndex, bump_version, normalize_text, read_version
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture
+def collections():
+    db = mongomock.MongoClient().db
+    return db.custom_qa, db.qa_meta
+
+
+def make_index(collections, questions, **kwargs):
+    qas, meta = collections
+    for question, answer in questions:
+        qas.insert_one({'question': question, 'answer': answer})
+    index = QAIndex(qas, meta, poll_interval=3600, **kwargs)
+    index.load()
+    return index
+
+
+def test_normalize_text():
+    assert normalize_text("  What's   UP?! ") == 'whats up'
+    assert normalize_text('snake_case, dots.') == 'snake case dots'
+
+
+@pytest.mark.parametrize('scorer', ['bm25', 'ratio'])
+def test_contained_question_wins_longest_first(collections, scorer):
+    index = make_index(collections, [
+        ('who are you', 'short'),
+        ('who are you really', 'long'),
+        ('skills', 'keyword'),
+    ], scorer=scorer)
+    assert index.match('tell me who are you really')[0] == 'long'
+    assert index.match('so who are you')[0] == 'short'
+
+
+def test_ties_go_to_the_oldest_question(collections):
+    index = make_index(collections, [('hello', 'first'), ('hello', 'second')])
+    assert index.match('hello there')[0] == 'first'
+
+
+def test_keyword_pass_and_no_match(collections):
+    index = make_index(collections, [('what are your skills', 'skills answer')])
+    assert index.match(normalize_text('What are your main skills?'))[0] == 'skills answer'
+    assert index.match('completely unrelated') is None
+
+
+def test_upsert_and_remove_patch_the_index(collections):
+    qas, _ = collections
+    index = make_index(collections, [('who are you', 'me')])
+    doc = {'_id': 'new-id', 'question': 'where do you live', 'answer': 'india'}
+    index.upsert(doc)
+    assert index.match('where do you live') == ('india', 'new-id')
+
+    index.upsert(dict(doc, answer='odisha'))
+    assert index.match('where do you live') == ('odisha', 'new-id')
+    assert len(index) == 2
+
+    index.remove('new-id')
+    assert index.match('where do you live') is None
+    assert index.get('new-id') is None
+
+
+def test_note_write_marks_the_index_stale_after_a_foreign_write(collections):
+    _, meta = collections
+    index = make_index(collections, [('who are you', 'me')])
+    assert index.version == 0
+
+    index.note_write(bump_version(meta))
+    assert index.version == 1
+
+    bump_version(meta)   # another worker
+    index.note_write(bump_version(meta))
+    assert index.version is None
+
+
+def test_refresh_if_stale_reloads_on_a_new_version(collections):
+    qas, meta = collections
+    index = make_index(collections, [('who are you', 'me')])
+    reloads = []
+    index.on_reload(lambda: reloads.append(True))
+
+    assert index.refresh_if_stale() is False
+    qas.insert_one({'question': 'what is your age', 'answer': '19'})
+    bump_version(meta)
+    assert index.refresh_if_stale() is True
+    assert index.version == read_version(meta)
+    assert index.match('what is your age')[0] == '19'
+    assert reloads == [True]
+
+
+def test_matches_are_not_blocked_by_a_write_in_progress(collections, monkeypatch):
+    index = make_index(collections, [('who are you', 'me')])
+    building = threading.Event()
+    release = threading.Event()
+    build_state = index._build_state
+
+    def slow_build(entries, next_seq):
+        building.set()
+        release.wait(5)
+        return build_state(entries, next_seq)
+    monkeypatch.setattr(index, '_build_state', slow_build)
+
+    writer = threading.Thread(target=index.upsert, args=({'_id': 'new', 'question': 'where do you live',
+                                                           'answer': 'india'},))
+    writer.start()
+    assert building.wait(5)
+    # The old state answers while the new one is being built
+    assert index.match('who are you')[0] == 'me'
+    assert index.match('where do you live') is None
+    release.set()
+    writer.join(5)
+    assert index.match('where do you live') == ('india', 'new')
@@ -0,0 +1,80 @@
+"""Admin Q&A routes (backend_auth/chatbot.py)"""
+import pytest
+from pymongo import ASCENDING
+
+from qa_index import fill_missing_question_keys
+
+mongomock = pytest.importorskip('mongomock')
+
+
+def add(client, headers, question, answer='answer'):
+    return client.post('/api/chatbot/qa', json={'question': question, 'answer': answer}, headers=headers)
+
+
+def test_duplicate_questions_are_rejected(client, admin_headers):
+    assert add(client, admin_headers, 'What are your skills?').status_code == 201
+    assert add(client, admin_headers, '  what are your SKILLS ').status_code == 409
+
+
+def test_missing_keys_are_filled_in_oldest_first():
+    collection = mongomock.MongoClient().db.custom_qa
+    # Sparse stands in for the partial index, which mongomock doesn't apply
+    collection.create_index([('question_key', ASCENDING)], unique=True, sparse=True)
+    collection.insert_many([
+        {'question': 'Where do you live?', 'answer': 'India'},
+        {'question': 'where do you live', 'answer': 'Odisha'},   # same key, newer
+        {'question': 'What is your age?', 'answer': '19', 'question_key': 'what is your age'},
+        {'question': 'what is your AGE', 'answer': '20'},
+    ])
+    filled, unkeyed = fill_missing_question_keys(collection)
+    assert filled == 1
+    assert sorted(collection.find_one({'_id': _id})['answer'] for _id in unkeyed) == ['20', 'Odisha']
+    assert collection.find_one({'answer': 'India'})['question_key'] == 'where do you live'
+    assert fill_missing_question_keys(collection) == (0, unkeyed)
+
+
+def test_a_legacy_question_blocks_duplicates_once_keyed(client, admin_headers, db):
+    db.custom_qa.insert_one({'question': 'Where do you live?', 'answer': 'India'})
+    fill_missing_question_keys(db.custom_qa)
+    assert add(client, admin_headers, 'Where do you LIVE').status_code == 409
+
+
+def test_qa_list_etag_and_304(app, client, admin_headers, db):
+    add(client, admin_headers, 'where do you live')
+    first = client.get('/api/chatbot/qa?limit=1')
+    etag = first.headers['ETag']
+    assert app.qa_index.epoch in etag
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    cached = client.get('/api/chatbot/qa?limit=1', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == etag
+    assert cached.headers['Cache-Control'] == 'no-cache'
+
+    assert client.get('/api/chatbot/qa?limit=2').headers['ETag'] != etag
+    add(client, admin_headers, 'what is your age')
+    assert client.get('/api/chatbot/qa?limit=1', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_a_reset_counter_does_not_reuse_etags(app, client, db):
+    etag = client.get('/api/chatbot/qa').headers['ETag']
+    db.qa_meta.drop()   # e.g. the database was restored from a backup
+    app.qa_index.load()
+    assert client.get('/api/chatbot/qa', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_qa_list_pages_by_cursor(client, admin_headers):
+    for question in ('one', 'two', 'three'):
+        add(client, admin_headers, question)
+    first = client.get('/api/chatbot/qa?limit=2&fields=question').json
+    assert [qa['question'] for qa in first['data']] == ['one', 'two']
+    assert set(first['data'][0]) == {'_id', 'question'}
+
+    second = client.get(f"/api/chatbot/qa?limit=2&after={first['next_cursor']}").json
+    assert [qa['question'] for qa in second['data']] == ['three']
+    assert second['next_cursor'] is None
+
+
+@pytest.mark.parametrize('query', ['limit=x', 'after=not-an-id', 'fields=question,secret'])
+def test_qa_list_rejects_bad_parameters(client, query):
+    assert client.get(f'/api/chatbot/qa?{query}').status_code == 400
@@ -0,0 +1,83 @@
+"""BM25 keyword scoring (backend_auth/qa_scoring.py)"""
+import math
+import random
+
+import pytest
+
+import qa_scoring
+from qa_scoring import BM25Scorer, tokenize
+
+DOCUMENTS = [
+    ('skills', tokenize('what are your skills')),
+    ('projects', tokenize('what projects have you worked on')),
+    ('contact', tokenize('how can i contact you')),
+    ('tech', tokenize('skill technology tech')),
+]
+
+
+def reference_scores(documents, query, k1=1.2, b=0.75):
+    """Textbook BM25, one document at a time"""
+    count = len(documents)
+    avg_length = sum(len(tokens) for _, tokens in documents) / count
+    scores = []
+    for _, tokens in documents:
+        score = 0.0
+        for term in set(query):
+            tf = tokens.count(term)
+            if not tf:
+                continue
+            df = sum(1 for _, other in documents if term in other)
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(tokens) / avg_length))
+        scores.append(score)
+    return scores
+
+
+def test_tokenize_keeps_whole_words_of_three_letters_or_more():
+    assert tokenize('start an art project_x') == ['start', 'art', 'project']
+
+
+def test_scores_match_the_reference():
+    scorer = BM25Scorer(DOCUMENTS)
+    query = tokenize('what skills and projects')
+    assert list(scorer.scores(query)) == pytest.approx(reference_scores(DOCUMENTS, query))
+
+
+def test_best_is_normalized_by_self_score():
+    scorer = BM25Scorer(DOCUMENTS)
+    assert scorer.best(tokenize('tell me your skills what are they'), 0.5) == ('skills', pytest.approx(1.0))
+    assert scorer.best(tokenize('start'), 0.0) is None   # no substring matches ("art")
+    assert scorer.best(tokenize('what'), 0.9) is None
+
+
+def test_ties_go_to_the_earliest_document():
+    scorer = BM25Scorer([('first', ['hello']), ('second', ['hello'])])
+    assert scorer.best(['hello'], 0.5)[0] == 'first'
+
+
+def test_pure_python_fallback_gives_the_same_answers(monkeypatch):
+    rng = random.Random(3)
+    words = [f'word{i}' for i in range(30)]
+    documents = [(i, rng.sample(words, rng.randint(1, 6))) for i in range(80)]
+    queries = [rng.sample(words, rng.randint(1, 5)) for _ in range(100)]
+
+    vectorized = BM25Scorer(documents)
+    expected = [vectorized.best(query, 0.3) for query in queries]
+    monkeypatch.setattr(qa_scoring, 'HAS_NUMPY', False)
+    plain = BM25Scorer(documents)
+    for query, result in zip(queries, expected):
+        got = plain.best(query, 0.3)
+        assert (got and got[0]) == (result and result[0])
+        if got:
+            assert got[1] == pytest.approx(result[1])
+
+
+def test_pruned_scorer_round_trips_through_its_arrays():
+    rng = random.Random(11)
+    words = [f'word{i}' for i in range(40)]
+    scorer = BM25Scorer([(i, rng.sample(words, rng.randint(1, 6))) for i in range(200)])
+    pruned = qa_scoring.PrunedBM25Scorer(scorer, 0.4)
+    copy = qa_scoring.PrunedBM25Scorer.from_arrays(scorer, 0.4, pruned.to_arrays())
+    for _ in range(100):
+        query = rng.sample(words, rng.randint(1, 5))
+        assert copy.best(query, 0.4) == pruned.best(query, 0.4) == scorer.best(query, 0.4)
@@ -0,0 +1,84 @@
+"""Client-side chatbot snapshot (backend_auth/qa_snapshot.py, /api/chatbot/snapshot)"""
+import gzip
+import json
+import random
+
+import pytest
+
+from qa_index import QAIndex, normalize_text
+from qa_scoring import tokenize
+
+mongomock = pytest.importorskip('mongomock')
+
+WORDS = ['skills', 'python', 'projects', 'contact', 'email', 'education', 'college', 'hobbies',
+         'music', 'favorite', 'language', 'where', 'live', 'you', 'your', 'what']
+EPSILON = 1e-12
+
+
+def client_match(snapshot, message_key):
+    """Python port of frontend/src/lib/chatbotSnapshot.js (bm25 scorer)"""
+    questions = snapshot['questions']
+    best = None
+    for position, question in enumerate(questions):
+        if question and question in message_key and (best is None or len(question) > len(questions[best])):
+            best = position
+    if best is not None:
+        return snapshot['answers'][best]
+
+    raw = [0.0] * len(questions)
+    for token in set(tokenize(message_key)):
+        positions, weights = snapshot['terms'].get(token, ([], []))
+        for position, weight in zip(positions, weights):
+            raw[position] += weight
+    best, best_score = None, 0.0
+    for position, score in enumerate(raw):
+        if score <= 0:
+            continue
+        normalized = score / snapshot['self_scores'][position]
+        if best is None or normalized > best_score + EPSILON or \
+                (abs(normalized - best_score) <= EPSILON and score > raw[best]):
+            best, best_score = position, normalized
+    if best is not None and best_score >= snapshot['min_score']:
+        return snapshot['answers'][best]
+    return None
+
+
+def test_snapshot_answers_like_the_server():
+    db = mongomock.MongoClient().db
+    rng = random.Random(11)
+    db.custom_qa.insert_many([
+        {'question': ' '.join(rng.sample(WORDS, rng.randint(1, 4))), 'answer': f'answer {i}'} for i in range(60)
+    ])
+    index = QAIndex(db.custom_qa, db.qa_meta, poll_interval=3600, fuzzy=False)
+    index.load()
+    snapshot = json.loads(json.dumps(index.snapshot()))
+    for _ in range(300):
+        message = normalize_text(' '.join(rng.choices(WORDS + ['other'], k=rng.randint(1, 6))))
+        result = index.match(message)
+        assert client_match(snapshot, message) == (result[0] if result else None), message
+
+
+def test_snapshot_endpoint(app, client, admin_headers):
+    client.post('/api/chatbot/qa', json={'question': 'where do you live', 'answer': 'India'}, headers=admin_headers)
+
+    plain = client.get('/api/chatbot/snapshot', headers={'Accept-Encoding': 'identity'})
+    assert plain.status_code == 200
+    snapshot = plain.json['snapshot']
+    assert snapshot['answers'] == ['India']
+    assert snapshot['version'] == client.post('/api/chatbot', json={'message': 'hi'}).json['version']
+
+    zipped = client.get('/api/chatbot/snapshot', headers={'Accept-Encoding': 'gzip'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.data) == plain.data
+    assert zipped.headers['ETag'] == plain.headers['ETag']
+
+    etag = plain.headers['ETag']
+    assert client.get('/api/chatbot/snapshot', headers={'If-None-Match': etag}).status_code == 304
+    builds = app.snapshot_cache.builds
+    client.get('/api/chatbot/snapshot')
+    assert app.snapshot_cache.builds == builds   # compiled once per version
+
+    client.post('/api/chatbot/qa', json={'question': 'what is your age', 'answer': '19'}, headers=admin_headers)
+    changed = client.get('/api/chatbot/snapshot', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.json['snapshot']['answers'] == ['India', '19']
@@ -0,0 +1,100 @@
+"""NDJSON import/export of Q&As (backend_auth/qa_transfer.py)"""
+import json
+from datetime import datetime
+
+import pytest
+
+import qa_transfer
+from qa_index import read_version
+from qa_transfer import ImportResult, export_ndjson, import_ndjson
+
+mongomock = pytest.importorskip('mongomock')
+
+CREATED = datetime(2025, 6, 1, 8, 30, 15, 250000)
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().db.custom_qa
+
+
+def lines(*docs):
+    return [json.dumps(doc) + '\n' for doc in docs]
+
+
+def test_export_import_round_trip(collection):
+    source = mongomock.MongoClient().db.source
+    source.insert_many([
+        {'question': 'What are your skills?', 'question_key': 'what are your skills', 'answer': 'Python',
+         'is_default': True, 'created_at': CREATED, 'updated_at': CREATED},
+        {'question': 'Où habites-tu ?', 'question_key': 'où habites tu', 'answer': 'Odisha',
+         'is_default': False, 'created_at': datetime(2025, 7, 1), 'updated_at': datetime(2025, 7, 2)},
+    ])
+    exported = list(export_ndjson(source))
+    assert json.loads(exported[0])['created_at'] == '2025-06-01T08:30:15.250000Z'
+
+    result = import_ndjson(collection, [line.encode('utf-8') for line in exported])
+    assert (result.inserted, result.updated, result.invalid) == (2, 0, [])
+    imported = {doc['question']: doc for doc in collection.find()}
+    assert imported['What are your skills?']['created_at'] == CREATED
+    assert imported['What are your skills?']['is_default'] is True
+    assert imported['Où habites-tu ?']['question_key'] == 'où habites tu'
+
+
+def test_reimport_updates_answers_instead_of_duplicating(collection):
+    import_ndjson(collection, lines({'question': 'Skills?', 'answer': 'Python'}))
+    result = import_ndjson(collection, lines({'question': 'skills', 'answer': 'Python, Go'}))
+    assert (result.inserted, result.updated) == (0, 1)
+    assert [doc['answer'] for doc in collection.find()] == ['Python, Go']
+
+
+def test_invalid_lines_are_reported(collection):
+    result = import_ndjson(collection, [
+        '{"question": "a valid one", "answer": "yes"}\n',
+        '\n',
+        'not json\n',
+        '["a list"]\n',
+        '{"question": "no answer"}\n',
+        '{"question": "?!", "answer": "x"}\n',
+        '{"question": "bad date", "answer": "x", "created_at": "last tuesday"}\n',
+        '{"question": "bad update", "answer": "x", "updated_at": 12}\n',
+    ])
+    assert result.inserted == 1
+    assert [number for number, _ in result.invalid] == [3, 4, 5, 6, 7, 8]
+    assert result.invalid[4][1] == 'created_at is not an ISO 8601 timestamp'
+    assert collection.count_documents({}) == 1
+
+
+def test_batches_written_before_a_failure_are_counted(collection, monkeypatch):
+    writes = []
+    original = qa_transfer._write_batch
+
+    def write_batch(collection, pending, result):
+        if writes:
+            raise ConnectionError('database unavailable')
+        writes.append(True)
+        original(collection, pending, result)
+    monkeypatch.setattr(qa_transfer, '_write_batch', write_batch)
+
+    result = ImportResult()
+    with pytest.raises(ConnectionError):
+        import_ndjson(collection, lines(*({'question': f'question {i}', 'answer': 'a'} for i in range(5))),
+                      batch_size=2, result=result)
+    assert result.inserted == 2
+
+
+def test_failed_import_route_still_reloads_the_index(app, client, admin_headers, monkeypatch):
+    version = read_version(app.db.qa_meta)
+    original = qa_transfer._write_batch
+
+    def write_batch(collection, pending, result):
+        original(collection, pending, result)
+        raise ConnectionError('connection lost after the write')
+    monkeypatch.setattr(qa_transfer, '_write_batch', write_batch)
+
+    body = ''.join(lines({'question': 'where do you live', 'answer': 'India'},
+                         {'question': 'what is your age', 'answer': '19'}))
+    response = client.post('/api/chatbot/qa/import', data=body, headers=admin_headers)
+    assert response.status_code == 500
+    assert read_version(app.db.qa_meta) == version + 1
+    assert client.post('/api/chatbot', json={'message': 'where do you live'}).json['response'] == 'India'
@@ -0,0 +1,108 @@
+"""Chatbot response cache (backend_auth/response_cache.py)"""
+import time
+
+from response_cache import ResponseCache
+
+
+def test_lru_eviction_keeps_recently_used_entries():
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    cache.put('a', 'A')
+    cache.put('b', 'B')
+    assert cache.get('a') == 'A'   # 'b' is now the least recently used
+    cache.put('c', 'C')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A' and cache.get('c') == 'C'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_the_ttl():
+    cache = ResponseCache(max_entries=10, ttl_seconds=0.01)
+    cache.put('a', 'A')
+    time.sleep(0.02)
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 0
+
+
+def test_clear_and_stats():
+    cache = ResponseCache(max_entries=10, ttl_seconds=60)
+    cache.put('a', 'A')
+    cache.get('a')
+    cache.get('missing')
+    cache.clear()
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['invalidations']) == (1, 2, 1)
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ResponseCache(max_entries=0)
+    cache.put('a', 'A')
+    assert cache.get('a') is None
+
+
+def ask(client, message):
+    return client.post('/api/chatbot', json={'message': message}).json['response']
+
+
+def test_an_unrelated_write_can_change_a_cached_answer(app, client, admin_headers):
+    """BM25 weights are corpus-wide: a new question that shares no word with the
+    message still changes its score, so every write must drop the cache"""
+    client.post('/api/chatbot/qa', json={'question': 'favorite color blue', 'answer': 'blue answer'},
+                headers=admin_headers)
+    assert ask(client, 'blue sky') == app.DEFAULT_RESPONSE
+
+    client.post('/api/chatbot/qa', json={'question': 'favorite color red', 'answer': 'red answer'},
+                headers=admin_headers)
+    assert ask(client, 'blue sky') == 'blue answer'
+
+
+def test_update_and_delete_clear_the_cache(app, client, admin_headers, db):
+    client.post('/api/chatbot/qa', json={'question': 'where do you live', 'answer': 'india'},
+                headers=admin_headers)
+    qa_id = str(db.custom_qa.find_one()['_id'])
+    assert ask(client, 'where do you live') == 'india'
+
+    client.put(f'/api/chatbot/qa/{qa_id}', json={'answer': 'odisha'}, headers=admin_headers)
+    assert ask(client, 'where do you live') == 'odisha'
+
+    client.delete(f'/api/chatbot/qa/{qa_id}', headers=admin_headers)
+    assert ask(client, 'where do you live') == app.DEFAULT_RESPONSE
+
+
+def test_a_new_word_fixes_a_cached_typo(app, client, admin_headers):
+    """Typo correction only knows words of stored questions: adding one must
+    replace the cached default answer"""
+    assert ask(client, 'your skils please') == app.DEFAULT_RESPONSE
+
+    client.post('/api/chatbot/qa', json={'question': 'your skills', 'answer': 'Python'},
+                headers=admin_headers)
+    assert ask(client, 'your skils please') == 'Python'
+
+
+def test_put_after_a_clear_is_dropped():
+    cache = ResponseCache(max_entries=4, ttl_seconds=60)
+    generation = cache.generation
+    cache.clear()
+    cache.put('a', 'stale', generation)
+    assert cache.get('a') is None
+    assert cache.stats()['discarded'] == 1
+    cache.put('a', 'fresh', cache.generation)
+    assert cache.get('a') == 'fresh'
+
+
+def test_a_write_between_match_and_put_is_not_cached_over(app, client, admin_headers, db, monkeypatch):
+    client.post('/api/chatbot/qa', json={'question': 'where do you live', 'answer': 'india'},
+                headers=admin_headers)
+    qa_id = str(db.custom_qa.find_one()['_id'])
+    find_best_qa = app.find_best_qa
+
+    def match_then_write(message_key):
+        result = find_best_qa(message_key)
+        client.put(f'/api/chatbot/qa/{qa_id}', json={'answer': 'odisha'}, headers=admin_headers)
+        return result
+    monkeypatch.setattr(app, 'find_best_qa', match_then_write)
+    assert app.generate_chatbot_response('where do you live') == 'india'   # computed before the write
+    monkeypatch.undo()
+
+    assert app.response_cache.get('where do you live') is None
+    assert ask(client, 'where do you live') == 'odisha'
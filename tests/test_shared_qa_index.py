@@ -0,0 +1,127 @@
+"""Memory-mapped chatbot index shared by workers (backend_auth/qa_index.py, qa_index_file.py)"""
+import os
+import random
+
+import pytest
+
+import qa_index
+from qa_index import QAIndex, SharedQAIndex, bump_version, normalize_text
+from qa_index_file import MappedQAIndexFile
+from qa_scoring import HAS_NUMPY, PrunedBM25Scorer
+
+mongomock = pytest.importorskip('mongomock')
+
+WORDS = ['skills', 'python', 'projects', 'contact', 'email', 'education', 'college', 'hobbies',
+         'music', 'favorite', 'language', 'experience', 'work', 'where', 'live', 'you', 'your', 'what']
+
+
+@pytest.fixture
+def collections():
+    db = mongomock.MongoClient().db
+    return db.custom_qa, db.qa_meta
+
+
+def fill(collections, count, seed=5):
+    rng = random.Random(seed)
+    qas, _ = collections
+    qas.insert_many([
+        {'question': ' '.join(rng.sample(WORDS, rng.randint(1, 5))), 'answer': f'answer {i}'}
+        for i in range(count)
+    ])
+    return rng
+
+
+def shared(collections, directory, **kwargs):
+    qas, meta = collections
+    index = SharedQAIndex(qas, meta, directory=str(directory), poll_interval=3600, **kwargs)
+    index.load()
+    return index
+
+
+@pytest.mark.parametrize('scorer', ['bm25', 'ratio'])
+def test_same_answers_as_the_in_memory_index(collections, tmp_path, scorer):
+    rng = fill(collections, 120)
+    qas, meta = collections
+    local = QAIndex(qas, meta, poll_interval=3600, scorer=scorer)
+    local.load()
+    mapped = shared(collections, tmp_path, scorer=scorer)
+
+    assert len(mapped) == len(local) == 120
+    for _ in range(300):
+        message = normalize_text(' '.join(rng.choices(WORDS + ['xyz', 'skils'], k=rng.randint(1, 6))))
+        assert mapped.match(message) == local.match(message), message
+
+
+@pytest.mark.skipif(not HAS_NUMPY, reason='pruning needs NumPy')
+def test_pruning_tables_are_read_from_the_file(collections, tmp_path, monkeypatch):
+    monkeypatch.setattr(qa_index, 'PRUNE_MIN_ENTRIES', 50)
+    rng = fill(collections, 120)
+    qas, meta = collections
+    local = QAIndex(qas, meta, poll_interval=3600)
+    local.load()
+    monkeypatch.setattr(qa_index, 'PrunedBM25Scorer', lambda *args: pytest.fail('pruned in the worker'))
+    mapped = shared(collections, tmp_path)
+
+    assert isinstance(MappedQAIndexFile(mapped.path).keyword_scorer, PrunedBM25Scorer)
+    for _ in range(300):
+        message = normalize_text(' '.join(rng.choices(WORDS + ['xyz'], k=rng.randint(1, 6))))
+        assert mapped.match(message) == local.match(message), message
+
+
+def test_typo_tables_are_read_from_the_file(collections, tmp_path, monkeypatch):
+    qas, meta = collections
+    qas.insert_many([{'question': 'skills', 'answer': 'Python'},
+                     {'question': 'where do you live', 'answer': 'India'}])
+    monkeypatch.setattr(qa_index, 'TrigramIndex', lambda *args: pytest.fail('built in the worker'))
+    mapped = shared(collections, tmp_path)
+    assert mapped.match('skils')[0] == 'Python'
+    assert mapped.match('wher do you liv')[0] == 'India'
+    assert shared(collections, tmp_path / 'plain', fuzzy=False).match('skils') is None
+
+
+def test_entries_are_found_by_id(collections, tmp_path):
+    qas, _ = collections
+    fill(collections, 10)
+    index = shared(collections, tmp_path)
+    for doc in qas.find():
+        entry = index.get(doc['_id'])
+        assert (entry['id'], entry['answer']) == (str(doc['_id']), doc['answer'])
+    assert index.get('000000000000000000000000') is None
+
+
+def test_workers_share_one_file_per_version(collections, tmp_path, monkeypatch):
+    qas, meta = collections
+    fill(collections, 5)
+    first = shared(collections, tmp_path)
+
+    monkeypatch.setattr(SharedQAIndex, '_build', lambda *args: pytest.fail('compiled twice'))
+    second = shared(collections, tmp_path)
+    assert second.path == first.path
+    monkeypatch.undo()
+
+    # A write in the first worker compiles the next version; the second maps it on its next poll
+    qas.insert_one({'question': 'where do you live', 'answer': 'india'})
+    first.note_write(bump_version(meta))
+    assert first.match('where do you live')[0] == 'india'
+    assert second.match('where do you live') is None
+    assert second.refresh_if_stale() is True
+    assert second.path == first.path
+    assert second.match('where do you live')[0] == 'india'
+
+
+def test_old_files_are_pruned(collections, tmp_path):
+    qas, meta = collections
+    index = shared(collections, tmp_path, keep_files=2)
+    for i in range(4):
+        qas.insert_one({'question': f'question {i}', 'answer': str(i)})
+        index.note_write(bump_version(meta))
+    files = [name for name in os.listdir(tmp_path) if name.endswith('.bin')]
+    assert len(files) == 2
+    assert os.path.basename(index.path) in files
+
+
+def test_foreign_files_are_rejected(tmp_path):
+    path = tmp_path / 'qa_index.x.1.bin'
+    path.write_bytes(b'NOTANIDX' + bytes(64))
+    with pytest.raises(ValueError):
+        MappedQAIndexFile(str(path))
@@ -0,0 +1,101 @@
+"""Stale-while-revalidate cache (backend_auth/swr_cache.py)"""
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import swr_cache
+from swr_cache import SWRCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(swr_cache, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+
+class Counter:
+    def __init__(self, release=None):
+        self.calls = 0
+        self.release = release
+
+    def __call__(self):
+        if self.release is not None:
+            self.release.wait(5)
+        self.calls += 1
+        return self.calls
+
+
+def wait_for(condition):
+    deadline = time.perf_counter() + 5
+    while not condition() and time.perf_counter() < deadline:
+        time.sleep(0.005)
+    assert condition()
+
+
+def test_fresh_values_are_served_from_the_cache(clock):
+    cache = SWRCache(Counter(), ttl_seconds=30, max_stale_seconds=300)
+    assert cache.get() == (1, 0.0)
+    clock.now += 10
+    assert cache.get() == (1, 10.0)
+    assert (cache.stats()['misses'], cache.stats()['hits']) == (1, 1)
+
+
+def test_stale_values_are_served_while_one_refresh_runs(clock):
+    release = threading.Event()
+    compute = Counter()
+    cache = SWRCache(compute, ttl_seconds=30, max_stale_seconds=300)
+    cache.get()
+
+    compute.release = release
+    clock.now += 60
+    assert cache.get() == (1, 60.0)
+    assert cache.get() == (1, 60.0)   # the refresh is already running
+    release.set()
+    wait_for(lambda: cache.stats()['refreshes'] == 2)
+    assert compute.calls == 2
+    assert cache.get()[0] == 2
+    assert cache.stats()['stale_hits'] == 2
+
+
+def test_too_old_values_are_recomputed_in_the_request(clock):
+    cache = SWRCache(Counter(), ttl_seconds=30, max_stale_seconds=300)
+    cache.get()
+    clock.now += 301
+    assert cache.get() == (2, 0.0)
+
+
+def test_concurrent_misses_share_one_computation():
+    release = threading.Event()
+    compute = Counter(release)
+    cache = SWRCache(compute, ttl_seconds=30, max_stale_seconds=300)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get()[0])) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: cache.stats()['shared_waits'] == 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == [1] * 5
+    assert compute.calls == 1
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    def fail():
+        raise RuntimeError('database down')
+    cache = SWRCache(fail, ttl_seconds=30, max_stale_seconds=300)
+    with pytest.raises(RuntimeError):
+        cache.get()
+    cache.compute = Counter()
+    assert cache.get() == (1, 0.0)
@@ -0,0 +1,64 @@
+"""UTC timestamp helpers (backend_auth/timestamps.py)"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import timestamps
+from timestamps import parse_timestamp, to_iso
+
+
+class Python310Datetime(datetime):
+    """datetime.fromisoformat as it behaves before Python 3.11 (no 'Z')"""
+
+    @classmethod
+    def fromisoformat(cls, value):
+        if value.endswith(('Z', 'z')):
+            raise ValueError(f'Invalid isoformat string: {value!r}')
+        return datetime.fromisoformat(value)
+
+
+def parse_as_python310(value, **kwargs):
+    """parse_timestamp against a pre-3.11 fromisoformat (only for the call, so to_iso is unaffected)"""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(timestamps, 'datetime', Python310Datetime)
+        return parse_timestamp(value, **kwargs)
+
+
+@pytest.fixture(params=['current', '3.10'])
+def parse(request):
+    """parse_timestamp, run against a pre-3.11 fromisoformat in the '3.10' case"""
+    return parse_timestamp if request.param == 'current' else parse_as_python310
+
+
+@pytest.mark.parametrize('moment', [
+    datetime(2026, 3, 1, 10, 15),
+    datetime(2026, 3, 1, 10, 15, 30, 123456),
+    datetime(1999, 12, 31, 23, 59, 59, 1),
+])
+def test_to_iso_round_trips(parse, moment):
+    assert to_iso(moment).endswith('Z')
+    assert parse(to_iso(moment)) == moment
+
+
+def test_browser_timestamps(parse):
+    # new Date().toISOString()
+    assert parse('2026-03-01T10:15:30.123Z') == datetime(2026, 3, 1, 10, 15, 30, 123000)
+    assert parse(' 2026-03-01T10:15:30z ') == datetime(2026, 3, 1, 10, 15, 30)
+
+
+def test_offsets_are_converted_to_utc():
+    assert parse_timestamp('2026-03-01T15:45:00+05:30') == datetime(2026, 3, 1, 10, 15)
+    assert to_iso(datetime(2026, 3, 1, 15, 45, tzinfo=timezone(timedelta(hours=5, minutes=30)))) \
+        == '2026-03-01T10:15:00Z'
+
+
+def test_naive_strings_are_local_time_unless_assume_utc():
+    local = datetime(2026, 3, 1, 10, 15)
+    assert parse_timestamp('2026-03-01T10:15:00', assume_utc=True) == local
+    expected = local.astimezone().astimezone(timezone.utc).replace(tzinfo=None)
+    assert parse_timestamp('2026-03-01T10:15:00') == expected
+
+
+@pytest.mark.parametrize('value', [None, '', 'Z', 'yesterday', 42, '2026-13-01T00:00:00Z'])
+def test_unparseable_values(value):
+    assert parse_timestamp(value) is None
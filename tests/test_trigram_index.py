@@ -0,0 +1,37 @@
+"""Typo correction by character trigrams (backend_auth/trigram_index.py)"""
+import random
+
+from trigram_index import TrigramIndex, trigrams
+
+WORDS = ['skills', 'skill', 'projects', 'project', 'contact', 'education', 'college', 'hobbies',
+         'python', 'experience', 'language', 'favorite', 'music']
+
+
+def test_trigrams_are_padded():
+    assert trigrams('ab') == {' ab', 'ab '}
+    assert len(trigrams('skills')) == 6
+
+
+def test_closest_word():
+    index = TrigramIndex(WORDS)
+    assert index.closest('skils') == 'skills'
+    assert index.closest('pyhton') is None     # swapped letters share too few trigrams
+    assert index.closest('python') == 'python'
+    assert index.correct_text('your skils in colege ok') == 'your skills in college ok'
+
+
+def test_min_similarity_and_alphabetical_ties():
+    assert TrigramIndex(['abcy', 'abcx']).closest('abcz') is None   # Dice 0.5
+    assert TrigramIndex(['abcy', 'abcx'], min_similarity=0.5).closest('abcz') == 'abcx'
+
+
+def test_prebuilt_tables_give_the_same_corrections():
+    index = TrigramIndex(WORDS)
+    copy = TrigramIndex.from_tables(list(WORDS), set(WORDS), dict(index.postings()))
+    rng = random.Random(2)
+    for _ in range(300):
+        word = list(rng.choice(WORDS))
+        del word[rng.randrange(len(word))]
+        word.insert(rng.randrange(len(word) + 1), rng.choice('aeiostx'))
+        word = ''.join(word)
+        assert copy.closest(word) == index.closest(word), word
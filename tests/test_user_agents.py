@@ -0,0 +1,73 @@
+"""Table-driven user-agent classifier (backend_auth/user_agents.py)"""
+import re
+
+import pytest
+
+import user_agents
+from bench_user_agents import CORPUS
+from user_agents import classify, parse_user_agent
+
+
+@pytest.mark.parametrize('ua, expected', [
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/124.0.0.0 Safari/537.36 Edg/124.0.0.0', ('Desktop', 'Edge', 'Windows')),
+    ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/124.0.0.0 Safari/537.36 OPR/110.0.0.0', ('Desktop', 'Opera', 'Windows')),
+    ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+     'Version/17.4.1 Safari/605.1.15', ('Desktop', 'Safari', 'macOS')),
+    ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Ubuntu Chromium/124.0.0.0 '
+     'Chrome/124.0.0.0 Safari/537.36', ('Desktop', 'Other', 'Linux')),
+    ('Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+     'CriOS/124.0.6367.88 Mobile/15E148 Safari/604.1', ('Mobile', 'Chrome', 'iOS')),
+    ('Mozilla/5.0 (iPad; CPU OS 17_4_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+     'Version/17.4.1 Mobile/15E148 Safari/604.1', ('Tablet', 'Safari', 'iOS')),
+    ('Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/124.0.6367.82 Mobile Safari/537.36', ('Mobile', 'Chrome', 'Android')),
+    ('Mozilla/5.0 (Linux; Android 13; SM-X710) AppleWebKit/537.36 (KHTML, like Gecko) '
+     'Chrome/124.0.0.0 Safari/537.36', ('Tablet', 'Chrome', 'Android')),
+    ('Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 '
+     'Mobile Safari/537.36 EdgA/124.0.0.0', ('Mobile', 'Edge', 'Android')),
+    ('Mozilla/5.0 (Android 13; Tablet; rv:125.0) Gecko/125.0 Firefox/125.0', ('Tablet', 'Firefox', 'Android')),
+    ('curl/8.4.0', ('Desktop', 'Other', 'Other')),
+    ('', ('Desktop', 'Other', 'Other')),
+])
+def test_classify(ua, expected):
+    assert classify(ua) == expected
+
+
+def substring_match(rules, ua, default):
+    """The rule tables applied with plain `in` checks"""
+    for label, found, excluded in rules:
+        if any(k in ua for k in found) and not any(k in ua for k in excluded):
+            return label
+    return default
+
+
+def test_one_regex_scan_agrees_with_substring_checks():
+    for ua in CORPUS:
+        lowered = ua.lower()
+        assert classify(ua) == (
+            substring_match(user_agents.DEVICE_RULES, lowered, user_agents.DEFAULT_DEVICE),
+            substring_match(user_agents.BROWSER_RULES, lowered, user_agents.DEFAULT_BROWSER),
+            substring_match(user_agents.OS_RULES, lowered, user_agents.DEFAULT_OS),
+        ), ua
+
+
+def test_trie_pattern_matches_exactly_its_words():
+    words = ['chrome', 'chromium', 'crios', 'edg/', 'edga/', 'mac os x']
+    pattern = re.compile(user_agents._trie_pattern(words))
+    for word in words:
+        assert pattern.fullmatch(word), word
+    for other in ('chrom', 'edg', 'chromiu', 'mac os'):
+        assert not pattern.fullmatch(other), other
+    assert pattern.findall('edga/ chromium chrome') == ['edga/', 'chromium', 'chrome']
+
+
+def test_parse_user_agent_and_cache_stats():
+    classify.cache_clear()
+    parsed = parse_user_agent('x' * 300)
+    assert parsed == {'device': 'Desktop', 'browser': 'Other', 'os': 'Other', 'raw': 'x' * 200}
+    assert parse_user_agent(None)['raw'] == ''
+    parse_user_agent('x' * 300)
+    stats = user_agents.cache_stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 2, 2)
@@ -0,0 +1,131 @@
+"""Coalesced visitor upserts (backend_auth/analytics_ingest.py)"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from analytics_ingest import VisitorCoalescer
+from analytics_rollups import TOTAL_ID, RollupWriter
+
+mongomock = pytest.importorskip('mongomock')
+
+T0 = datetime(2026, 3, 1, 10, 15)
+INDIA = {'city': 'Bhubaneswar', 'region': 'Odisha', 'country': 'India', 'country_code': 'IN'}
+JAPAN = {'city': 'Tokyo', 'region': 'Tokyo', 'country': 'Japan', 'country_code': 'JP'}
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient().db
+    db.visitors.create_index('visitor_id', unique=True)
+    return db
+
+
+def make_coalescer(db, **kwargs):
+    return VisitorCoalescer(db.visitors, batch_size=100, flush_interval=3600,
+                            rollups=RollupWriter(db.analytics_rollups), **kwargs)
+
+
+def insert_fields(timestamp):
+    return {'ip': '1.2.3.4', 'device': 'Desktop', 'browser': 'Firefox', 'os': 'Linux', 'first_visit': timestamp}
+
+
+def test_visits_fold_into_one_upsert_per_visitor(db):
+    coalescer = make_coalescer(db)
+    coalescer.record('a', T0, '/', INDIA, insert_fields(T0))
+    coalescer.record('a', T0 + timedelta(minutes=5), '/projects', INDIA, insert_fields(T0))
+    coalescer.record('a', T0 + timedelta(minutes=1), '/', INDIA, insert_fields(T0))
+    coalescer.record_many('b', [(T0, '/'), (T0, '/contact')], JAPAN, insert_fields(T0))
+    assert coalescer.flush() == 5
+
+    visitor = db.visitors.find_one({'visitor_id': 'a'})
+    assert visitor['visit_count'] == 3
+    assert visitor['last_visit'] == T0 + timedelta(minutes=5)
+    assert sorted(visitor['pages_visited']) == ['/', '/projects']
+    assert visitor['first_visit'] == T0
+    stats = coalescer.metrics()
+    assert (stats['operations'], stats['visits_per_operation']) == (2, 2.5)
+
+
+def test_later_flushes_update_the_existing_document(db):
+    coalescer = make_coalescer(db)
+    coalescer.record('a', T0, '/', INDIA, insert_fields(T0))
+    coalescer.flush()
+    later = T0 + timedelta(days=1)
+    coalescer.record('a', later, '/blog', JAPAN, insert_fields(later))
+    coalescer.flush()
+
+    visitor = db.visitors.find_one({'visitor_id': 'a'})
+    assert (visitor['visit_count'], visitor['first_visit'], visitor['last_visit']) == (2, T0, later)
+    assert visitor['location'] == JAPAN
+    assert db.visitors.count_documents({}) == 1
+
+
+def test_rollups_count_new_visitors_and_moves(db):
+    coalescer = make_coalescer(db)
+    coalescer.record('a', T0, '/', INDIA, insert_fields(T0))
+    coalescer.record('b', T0, '/', INDIA, insert_fields(T0))
+    coalescer.flush()
+    later = T0 + timedelta(days=1)
+    coalescer.record('a', later, '/', JAPAN, insert_fields(later))
+    coalescer.flush()
+
+    rollups = {doc['_id']: doc for doc in db.analytics_rollups.find()}
+    assert rollups[TOTAL_ID]['visitors'] == 2
+    assert rollups[TOTAL_ID]['countries'] == {'India': 1, 'Japan': 1}
+    assert rollups['day:2026-03-01']['active_visitors'] == 1
+    assert rollups['day:2026-03-02']['active_visitors'] == 1
+    assert rollups['hour:2026-03-01T10']['active_visitors'] == 1
+
+
+def test_two_workers_flushing_one_visitor_move_its_rollups_once(db):
+    coalescer, other = make_coalescer(db), make_coalescer(db)
+    coalescer.record('a', T0, '/', INDIA, insert_fields(T0))
+    coalescer.flush()
+    coalescer.record('a', T0 + timedelta(days=1), '/', INDIA, insert_fields(T0))
+    other.record('a', T0 + timedelta(days=2), '/', JAPAN, insert_fields(T0))
+
+    # The other worker writes between this one's read and its bulk_write
+    bulk_write = db.visitors.bulk_write
+
+    def racing_bulk_write(operations, **kwargs):
+        db.visitors.bulk_write = bulk_write
+        other.flush()
+        return bulk_write(operations, **kwargs)
+    db.visitors.bulk_write = racing_bulk_write
+    assert coalescer.flush() == 0   # lost the race: retried on the next flush
+    assert coalescer.flush() == 1
+
+    visitor = db.visitors.find_one({'visitor_id': 'a'})
+    assert (visitor['visit_count'], visitor['last_visit']) == (3, T0 + timedelta(days=2))
+    assert visitor['location'] == INDIA   # the retried update was written last
+    rollups = {doc['_id']: doc for doc in db.analytics_rollups.find()}
+    assert rollups[TOTAL_ID]['countries'] == {'India': 1, 'Japan': 0}
+    assert rollups['day:2026-03-01']['active_visitors'] == 0
+    assert rollups.get('day:2026-03-02', {}).get('active_visitors', 0) == 0
+    assert rollups['day:2026-03-03']['active_visitors'] == 1
+
+
+def test_requeue_merges_into_newer_visits(db):
+    coalescer = make_coalescer(db)
+    coalescer.record('a', T0, '/', INDIA, insert_fields(T0))
+    with coalescer._lock:
+        failed = coalescer._take_batch()
+    coalescer.record('a', T0 + timedelta(minutes=1), '/blog', INDIA, insert_fields(T0))
+    with coalescer._lock:
+        assert coalescer._requeue(failed) == 0
+    coalescer.flush()
+
+    visitor = db.visitors.find_one({'visitor_id': 'a'})
+    assert visitor['visit_count'] == 2
+    assert sorted(visitor['pages_visited']) == ['/', '/blog']
+
+
+def test_max_queue_bounds_distinct_visitors(db):
+    coalescer = make_coalescer(db, max_queue=1)
+    coalescer.record('a', T0, '/', INDIA, insert_fields(T0))
+    coalescer.record('a', T0, '/', INDIA, insert_fields(T0))   # same visitor: merged, no flush
+    assert coalescer.backpressure_waits == 0
+    coalescer.record('b', T0, '/', INDIA, insert_fields(T0))   # new visitor: caller flushes first
+    assert coalescer.backpressure_waits == 1
+    coalescer.flush()
+    assert db.visitors.count_documents({}) == 2
@@ -0,0 +1,91 @@
+"""Write-behind page view buffer (backend_auth/analytics_ingest.py)"""
+import os
+import threading
+import time
+
+import pytest
+
+from analytics_ingest import WriteBehindBuffer
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().db.page_views
+
+
+class FailingCollection:
+    """Stands in for a collection during a database outage"""
+    name = 'page_views'
+
+    def insert_many(self, documents, ordered=True):
+        raise ConnectionError('database unavailable')
+
+
+def test_flush_writes_in_batches(collection):
+    written = []
+    buffer = WriteBehindBuffer(collection, batch_size=3, flush_interval=3600, on_written=written.append)
+    for i in range(7):
+        buffer.submit({'n': i})
+    buffer.flush()
+
+    assert collection.count_documents({}) == 7
+    assert [len(batch) for batch in written] == [3, 3, 1]
+    stats = buffer.metrics()
+    assert (stats['enqueued'], stats['written'], stats['queue_depth']) == (7, 7, 0)
+
+
+def test_background_thread_flushes_a_full_batch(collection):
+    buffer = WriteBehindBuffer(collection, batch_size=2, flush_interval=3600)
+    buffer.submit_many([{'n': 1}, {'n': 2}])
+    deadline = time.monotonic() + 5
+    while collection.count_documents({}) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert collection.count_documents({}) == 2
+
+
+def test_full_queue_makes_the_caller_flush(collection):
+    buffer = WriteBehindBuffer(collection, batch_size=100, flush_interval=3600, max_queue=2)
+    assert all(buffer.submit({'n': i}) for i in range(5))
+    assert buffer.backpressure_waits >= 1
+    assert buffer.dropped == 0
+    buffer.flush()
+    assert collection.count_documents({}) == 5
+
+
+def test_a_full_queue_costs_the_caller_one_batch(collection):
+    callers = []
+    insert_many = collection.insert_many
+
+    def counting_insert_many(documents, ordered=True):
+        callers.append(threading.get_ident())
+        return insert_many(documents, ordered=ordered)
+    collection.insert_many = counting_insert_many
+
+    buffer = WriteBehindBuffer(collection, batch_size=2, flush_interval=3600, max_queue=6)
+    buffer._worker_pid = os.getpid()   # no background thread: only the caller writes
+    buffer.submit_many([{'n': i} for i in range(6)])
+    assert buffer.submit({'n': 6}) is True
+    assert callers == [threading.get_ident()]
+    assert buffer.metrics()['queue_depth'] == 5
+    assert buffer.backpressure_waits == 1
+
+
+def test_failed_flush_requeues_the_batch():
+    buffer = WriteBehindBuffer(FailingCollection(), batch_size=10, flush_interval=3600, max_queue=3)
+    buffer.submit_many([{'n': 1}, {'n': 2}])
+    assert buffer.flush() == 0
+    stats = buffer.metrics()
+    assert (stats['queue_depth'], stats['failed_flushes'], stats['dropped']) == (2, 1, 0)
+
+    buffer.max_queue = 1   # no room to put the whole batch back
+    buffer.flush()
+    assert (buffer.metrics()['queue_depth'], buffer.dropped) == (1, 1)
+
+
+def test_close_flushes_what_is_pending(collection):
+    buffer = WriteBehindBuffer(collection, batch_size=100, flush_interval=3600)
+    buffer.submit({'n': 1})
+    buffer.close()
+    assert collection.count_documents({}) == 1